@@ -1,19 +1,101 @@
 import xml.etree.ElementTree as ET
 import os
 import argparse
+import hashlib
+import html
+import io
+import json
+import math
+import mmap
 import re
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from collections import OrderedDict # To keep color order somewhat consistent
 
+try:
+    import yaml # Optional, only needed for YAML color profiles
+except ImportError:
+    yaml = None
+
+try:
+    from watchdog.observers import Observer # Optional, --watch polls the folders without it
+except ImportError:
+    Observer = None
+
 # --- Configuration ---
 DEFAULT_UNMAPPED_BRUSH = "Black" # Fallback if keeping named colors fails or unexpected errors
 # UPDATED: Increased max template colors
 MAX_TEMPLATE_COLORS = 12 # How many TemplateColorX options to offer
+AUTO_COLOR_MAX_DELTA_E = 3.0 # --auto-colors treats colors closer than this (CIELAB distance) as the same color
 
 # Preview Configuration
 PREVIEW_NAMESPACE_UTIL = "clr-namespace:WheelWizard.Styles.Util" # ADJUST THIS
 MAX_PREVIEW_ITEMS = 79
 
+# Parsing Configuration
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+STREAMING_THRESHOLD_BYTES = 1024 * 1024 # Larger SVGs (sprite sheets, design tool dumps) are read with iterparse
+PARSED_DOCUMENT_BUDGET_BYTES = 64 * 1024 * 1024 # Source bytes whose parsed documents batch mode keeps between stages
+HASH_CHUNK_BYTES = 1024 * 1024 # Files are hashed in chunks of this size, never read whole
+BAKED_PATH_PRECISION = 3 # Decimals of path data rewritten by flattening (shapes, transforms)
+
+# Geometry Deduplication Configuration
+GEOMETRY_IDENTITY_PRECISION = 4 # Outlines that match at this many decimals count as the same geometry
+SHARED_GEOMETRY_FILE_NAME = "SharedGeometry.axaml" # Geometries used by several folders, merge it before the icon dictionaries
+
+# Atlas Configuration
+ATLAS_TEMPLATE_COLORS = ["#F6F7F9", "#B4B8C5", "#575D72", "#3E424E", "#24252D"] # Preview palette: Neutral50/300/600/800/950
+ATLAS_MAX_DIMENSION = 2048 # Larger atlases are split into pages
+ATLAS_PADDING = 1 # Transparent pixels between tiles, so filtering never bleeds into a neighbour
+
+# Profile Report Configuration
+PROFILE_REPORT_TOP = 50 # Icons listed in the "heaviest" and "slowest" tables of the --profile report
+
+# Verification Configuration
+DEFAULT_MULTI_ICONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MultiIcons.axaml")
+VERIFY_SIZE = 64 # Pixel size icons and the plain conversions of their SVGs are rendered at for comparison
+VERIFY_CHANNEL_TOLERANCE = 48 # Largest per channel difference (0-255) that still counts as the same pixel
+VERIFY_MAX_MISMATCH = 0.01 # Fraction of differing pixels above which an icon fails
+
+# Watch Mode Configuration
+WATCH_DEBOUNCE_SECONDS = 0.15 # Rebuild once no SVG changed for this long (editors save in bursts)
+WATCH_POLL_INTERVAL = 0.25 # Seconds between folder scans when watchdog is not installed
+
+# Cache Configuration
+GENERATOR_VERSION = "8" # Bump whenever the generated XAML changes, this invalidates every cached fragment
+DEFAULT_CACHE_DIR_NAME = ".svg_to_axaml_cache"
+
+# Generation Options (command line flags override these)
+DEFAULT_OPTIONS = {
+    'minify_paths': False, # Re-encode path data as short as possible (rounded, relative where shorter, merged)
+    'precision': 2, # Decimals kept by the path minifier, points move at most 0.5 * 10^-precision units
+    'merge_drawings': False, # Combine adjacent, non-overlapping drawings with the same brush and pen
+}
+
+# Output Options (batch mode, these only change which files are written, not the icons)
+DEFAULT_OUTPUT_OPTIONS = {
+    'pack': False, # Also write a binary .iconpack per folder
+    'shard_size': 0, # Icons per shard dictionary, 0 writes one dictionary per folder
+    'manifest_format': 'json', # Key -> shard manifest written with shards: 'json' or 'csv'
+    'preview': True, # Include the Design.PreviewWith block
+    'dedup_geometry': False, # Emit repeated outlines once as StreamGeometry resources and reference them
+    'atlas_sizes': [], # Pixel sizes of pre-rasterized PNG atlases to write per folder
+    'atlas_colors': [], # Hex colors of TemplateColor1..N in the atlases, the rest use ATLAS_TEMPLATE_COLORS
+    'slot_index': False, # Also write <folder>.slots.json with the TemplateColor slot of every drawing's fill and pen
+}
+
 # --- Helper Functions ---
+NAMED_COLORS = { # The basic SVG/CSS color keywords, so kept named colors can be written as their hex value
+    'black': '#000000', 'silver': '#c0c0c0', 'gray': '#808080', 'grey': '#808080', 'white': '#ffffff',
+    'maroon': '#800000', 'red': '#ff0000', 'purple': '#800080', 'fuchsia': '#ff00ff', 'magenta': '#ff00ff',
+    'green': '#008000', 'lime': '#00ff00', 'olive': '#808000', 'yellow': '#ffff00', 'navy': '#000080',
+    'blue': '#0000ff', 'teal': '#008080', 'aqua': '#00ffff', 'cyan': '#00ffff', 'orange': '#ffa500',
+    'transparent': '#00000000',
+}
+
 def normalize_color(color_str):
     """Converts color to lowercase hex or name."""
     if not color_str:
@@ -26,70 +108,1316 @@ def normalize_color(color_str):
        color_str = f"#{color_str[1]*2}{color_str[2]*2}{color_str[3]*2}"
     return color_str
 
-def find_unique_colors_in_svgs(svg_folder):
-    """Scans all SVGs in a folder and returns a set of unique normalized colors."""
-    unique_colors = set()
-    namespaces = {'svg': 'http://www.w3.org/2000/svg'}
-    ET.register_namespace('', namespaces['svg'])
+def is_paint_color(color):
+    """True if a normalized paint value is a color, not 'none', 'inherit', 'currentcolor' or a url(#id) reference."""
+    return bool(color) and color not in ('none', 'inherit', 'currentcolor') and not color.startswith('url(')
+
+# --- Path Data Optimization ---
+PATH_PARAMETER_COUNTS = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+ARC_PARAMETER_PRECISION = 12 # Decimals of arc radii and rotation when rounding them would move the arc too far
+ARC_CHECK_SAMPLES = 64 # Points compared along an arc to decide whether its rounded form is close enough
+_PATH_NUMBER_RE = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+def tokenize_path_data(path_data):
+    """Splits SVG path data into (command, parameters) tuples, one per segment (implicit repeats are expanded).
+
+    Raises ValueError for malformed path data.
+    """
+    tokens = []
+    command = None
+    pos = 0
+    length = len(path_data)
+    while True:
+        while pos < length and (path_data[pos].isspace() or path_data[pos] == ','):
+            pos += 1
+        if pos >= length:
+            break
+
+        char = path_data[pos]
+        if char.upper() in PATH_PARAMETER_COUNTS:
+            command = char
+            pos += 1
+        elif command is None or command in 'Zz':
+            raise ValueError(f"Unexpected '{char}' at position {pos}")
+        elif command == 'M':
+            command = 'L' # Coordinates after a move are implicit line-to's
+        elif command == 'm':
+            command = 'l'
+
+        if command in 'Zz':
+            tokens.append(('Z', []))
+            continue
 
-    print("Scanning SVGs for unique colors...")
-    svg_files = [f for f in os.listdir(svg_folder) if f.lower().endswith('.svg')]
-    if not svg_files:
-        print("No SVG files found to scan.")
-        return set()
+        parameters = []
+        for index in range(PATH_PARAMETER_COUNTS[command.upper()]):
+            while pos < length and (path_data[pos].isspace() or path_data[pos] == ','):
+                pos += 1
+            if command in 'Aa' and index in (3, 4):
+                # Arc flags are single characters and may be written without separators
+                if pos >= length or path_data[pos] not in '01':
+                    raise ValueError(f"Invalid arc flag at position {pos}")
+                parameters.append(float(path_data[pos]))
+                pos += 1
+                continue
+            match = _PATH_NUMBER_RE.match(path_data, pos)
+            if not match:
+                raise ValueError(f"Expected a number for '{command}' at position {pos}")
+            parameters.append(float(match.group()))
+            pos = match.end()
+        tokens.append((command, parameters))
+    return tokens
+
+def path_tokens_to_absolute(tokens):
+    """Converts path tokens to absolute segments: M, L, C, S, Q, T, A (with absolute end points) and Z."""
+    segments = []
+    x = y = 0.0
+    start_x = start_y = 0.0
+    for command, parameters in tokens:
+        upper = command.upper()
+        relative = command != upper
+        if upper == 'Z':
+            segments.append(('Z',))
+            x, y = start_x, start_y
+            continue
 
-    for filename in svg_files:
-        svg_path = os.path.join(svg_folder, filename)
+        if upper == 'H':
+            new_x = parameters[0] + x if relative else parameters[0]
+            segments.append(('L', new_x, y))
+            x = new_x
+            continue
+        if upper == 'V':
+            new_y = parameters[0] + y if relative else parameters[0]
+            segments.append(('L', x, new_y))
+            y = new_y
+            continue
+        if upper == 'A':
+            end_x, end_y = parameters[5:7]
+            if relative:
+                end_x, end_y = end_x + x, end_y + y
+            segments.append(('A', *parameters[:5], end_x, end_y))
+            x, y = end_x, end_y
+            continue
+
+        points = list(parameters)
+        if relative:
+            for index in range(0, len(points), 2):
+                points[index] += x
+                points[index + 1] += y
+        segments.append((upper, *points))
+        x, y = points[-2], points[-1]
+        if upper == 'M':
+            start_x, start_y = x, y
+    return segments
+
+def optimize_path_segments(segments, precision):
+    """Merges collinear line segments and drops segments that draw nothing (within half a unit of precision).
+
+    A merged run keeps the points it dropped and only grows while every one of them stays within tolerance of the
+    new line, measured between the snapped end points serialize_path_segments will write, so the error never adds up.
+    """
+    tolerance = 0.5 * 10 ** -precision
+    optimized = []
+    x = y = 0.0
+    start_x = start_y = 0.0
+    dropped = [] # Interior points of the line run at the end of optimized
+    for index, segment in enumerate(segments):
+        command = segment[0]
+        next_command = segments[index + 1][0] if index + 1 < len(segments) else None
+
+        if command == 'M':
+            if optimized and optimized[-1][0] == 'M':
+                optimized.pop() # A move followed by another move draws nothing
+            x, y = start_x, start_y = segment[1], segment[2]
+            optimized.append(segment)
+            dropped = []
+            continue
+        if command == 'Z':
+            x, y = start_x, start_y
+            optimized.append(segment)
+            dropped = []
+            continue
+
+        if command == 'L' and next_command not in ('S', 'T'): # S/T reflect the previous segment, keep it intact
+            end_x, end_y = segment[1], segment[2]
+            if abs(end_x - x) <= tolerance and abs(end_y - y) <= tolerance:
+                continue # Zero length line
+            if next_command == 'Z' and abs(end_x - start_x) <= tolerance and abs(end_y - start_y) <= tolerance:
+                continue # The closing Z draws this line already
+            previous = optimized[-1] if optimized else None
+            if previous is not None and previous[0] == 'L' and len(optimized) > 1:
+                origin = optimized[-2]
+                origin_x, origin_y = (start_x, start_y) if origin[0] == 'Z' else origin[-2:]
+                chord = (round(origin_x, precision), round(origin_y, precision), round(end_x, precision), round(end_y, precision))
+                interior = dropped + [(x, y)]
+                if all(_is_collinear_continuation(chord[0], chord[1], px, py, chord[2], chord[3], tolerance)
+                       for px, py in interior):
+                    optimized[-1] = ('L', end_x, end_y)
+                    x, y = end_x, end_y
+                    dropped = interior
+                    continue
+
+        optimized.append(segment)
+        x, y = segment[-2], segment[-1]
+        dropped = []
+
+    if optimized and optimized[-1][0] == 'M':
+        optimized.pop() # A trailing move draws nothing
+    return optimized
+
+def _is_collinear_continuation(x0, y0, x1, y1, x2, y2, tolerance):
+    """True if (x1, y1) lies on the line from (x0, y0) to (x2, y2), between both ends."""
+    dx, dy = x2 - x0, y2 - y0
+    length = math.hypot(dx, dy)
+    if length <= tolerance:
+        return False
+    distance = abs(dx * (y1 - y0) - dy * (x1 - x0)) / length
+    along = (dx * (x1 - x0) + dy * (y1 - y0)) / length
+    return distance <= tolerance and 0 < along < length
+
+def format_path_number(value, precision):
+    """Formats a coordinate as short as possible: rounded, without trailing zeros or a leading zero."""
+    text = f"{value:.{precision}f}"
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text.startswith('0.'):
+        text = text[1:]
+    elif text.startswith('-0.'):
+        text = '-' + text[2:]
+    if text in ('-0', ''):
+        text = '0'
+    return text
+
+def _needs_separator(text, number):
+    """True if number can not directly follow text without being read as part of its last number."""
+    if number.startswith('-'):
+        return False
+    if number.startswith('.'):
+        last_number = re.split(r'[\sA-Za-z-]', text)[-1]
+        return '.' not in last_number
+    return True
+
+def _join_path_numbers(numbers):
+    """Joins formatted numbers, leaving out separators where the next sign or decimal point separates them."""
+    text = numbers[0]
+    for number in numbers[1:]:
+        text += ' ' + number if _needs_separator(text, number) else number
+    return text
+
+def arc_center_parameters(x0, y0, rx, ry, rotation, large_arc, sweep, x1, y1):
+    """Converts an SVG endpoint arc to (cx, cy, rx, ry, cos, sin, start angle, sweep angle), see SVG 1.1 appendix F.6.
+
+    Returns None for arcs that are drawn as a straight line (a zero radius) or not at all (equal end points).
+    """
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0 or (x0 == x1 and y0 == y1):
+        return None
+    cos, sin = math.cos(math.radians(rotation)), math.sin(math.radians(rotation))
+    dx, dy = (x0 - x1) / 2, (y0 - y1) / 2
+    px, py = cos * dx + sin * dy, -sin * dx + cos * dy
+    scale = (px * px) / (rx * rx) + (py * py) / (ry * ry)
+    if scale > 1: # Radii too small for the end points, scale them up
+        rx, ry = rx * math.sqrt(scale), ry * math.sqrt(scale)
+    numerator = rx * rx * ry * ry - rx * rx * py * py - ry * ry * px * px
+    denominator = rx * rx * py * py + ry * ry * px * px
+    factor = math.sqrt(max(0.0, numerator / denominator)) if denominator else 0.0
+    if bool(large_arc) == bool(sweep):
+        factor = -factor
+    cx_prime, cy_prime = factor * rx * py / ry, -factor * ry * px / rx
+    cx = cos * cx_prime - sin * cy_prime + (x0 + x1) / 2
+    cy = sin * cx_prime + cos * cy_prime + (y0 + y1) / 2
+    start = math.atan2((py - cy_prime) / ry, (px - cx_prime) / rx)
+    delta = math.atan2((-py - cy_prime) / ry, (-px - cx_prime) / rx) - start
+    if sweep and delta < 0:
+        delta += 2 * math.pi
+    elif not sweep and delta > 0:
+        delta -= 2 * math.pi
+    return cx, cy, rx, ry, cos, sin, start, delta
+
+def _ellipse_point(center, angle):
+    """Point at angle on the ellipse of arc_center_parameters."""
+    cx, cy, rx, ry, cos, sin = center[:6]
+    ex, ey = rx * math.cos(angle), ry * math.sin(angle)
+    return cos * ex - sin * ey + cx, sin * ex + cos * ey + cy
+
+def _arc_samples(arc, count=ARC_CHECK_SAMPLES):
+    """Points at evenly spaced fractions of an arc (x0, y0, rx, ry, rotation, large arc, sweep, x1, y1)."""
+    center = arc_center_parameters(*arc)
+    fractions = [index / count for index in range(count + 1)]
+    if center is None:
+        x0, y0, x1, y1 = arc[0], arc[1], arc[7], arc[8]
+        return [(x0 + (x1 - x0) * t, y0 + (y1 - y0) * t) for t in fractions]
+    return [_ellipse_point(center, center[6] + center[7] * t) for t in fractions]
+
+def _arc_deviation(original, candidate):
+    """Largest distance between matching points of two arcs.
+
+    Matching points by their fraction of the sweep is stricter than comparing shapes, so a passing candidate is
+    never further from the original than this.
+    """
+    return max(math.hypot(ax - bx, ay - by) for (ax, ay), (bx, by) in zip(_arc_samples(original), _arc_samples(candidate)))
+
+def arc_to_cubic_segments(arc, tolerance):
+    """Approximates an arc (x0, y0, rx, ry, rotation, large arc, sweep, x1, y1) with absolute 'C' segments.
+
+    The arc is split until every piece stays within tolerance of the exact ellipse.
+    """
+    center = arc_center_parameters(*arc)
+    if center is None:
+        return [('L', arc[7], arc[8])]
+    radius = max(center[2], center[3])
+    delta = center[7]
+    count = max(1, math.ceil(abs(delta) / (math.pi / 2)))
+    # The error of a cubic for a circular arc of angle a is about radius * 4 / 27 * sin(a / 4)^6 / cos(a / 4)^2
+    while count < 256 and radius * 4 / 27 * math.sin(abs(delta) / count / 4) ** 6 / math.cos(delta / count / 4) ** 2 > tolerance:
+        count *= 2
+    step = delta / count
+    handle = 4 / 3 * math.tan(step / 4)
+    cx, cy, rx, ry, cos, sin, start = center[:7]
+    segments = []
+    for index in range(count):
+        a1, a2 = start + step * index, start + step * (index + 1)
+        control1 = (math.cos(a1) - handle * math.sin(a1), math.sin(a1) + handle * math.cos(a1))
+        control2 = (math.cos(a2) + handle * math.sin(a2), math.sin(a2) - handle * math.cos(a2))
+        points = []
+        for ux, uy in (control1, control2, (math.cos(a2), math.sin(a2))):
+            ex, ey = rx * ux, ry * uy
+            points += [cos * ex - sin * ey + cx, sin * ex + cos * ey + cy]
+        segments.append(('C', *points))
+    segments[-1] = segments[-1][:5] + (arc[7], arc[8])
+    return segments
+
+def serialize_path_segments(segments, precision):
+    """Writes absolute segments as compact path data, choosing the shorter of absolute and relative per segment.
+
+    Points are snapped to the precision grid before relative offsets are taken, so rounding never accumulates:
+    every emitted point is within half a unit of the last decimal of its exact position. An arc can move much
+    further than its end points (when they are close to a diameter), so rounded arcs are checked against the exact
+    one and written with exact radii, or as cubic curves, when they would move further than a snapped point.
+    The control point S and T mirror is derived from two rounded points (or from the curves an arc became), so it
+    is checked the same way and the segment is written as a full C or Q when it would move further.
+    """
+    parts = []
+    last_command = None
+    x = y = 0.0
+    start_x = start_y = 0.0
+    exact_x = exact_y = exact_start_x = exact_start_y = 0.0 # Unrounded current point, arcs are checked against it
+    exact_control = None # ('C' or 'Q', x, y) of the last control point, the next S or T mirrors it
+    emitted_control = None # The same point as a parser reads it from the emitted data
+    arc_limit = math.hypot(0.5, 0.5) * 10 ** -precision
+
+    def snap(value):
+        return round(value, precision)
+
+    def emit(command, numbers):
+        nonlocal last_command
+        body = _join_path_numbers(numbers) if numbers else ''
+        if command == last_command and command not in ('M', 'm'):
+            # Repeated command letters can be left out, a separator is enough
+            parts.append(' ' + body if _needs_separator(parts[-1], body) else body)
+        else:
+            parts.append(command + body)
+        # Never rely on the implicit line-to after a move, not every path parser supports it
+        last_command = None if command in ('M', 'm', 'Z') else command
+
+    for segment in segments:
+        command = segment[0]
+        if command == 'Z':
+            emit('Z', [])
+            x, y = start_x, start_y
+            exact_x, exact_y = exact_start_x, exact_start_y
+            exact_control = emitted_control = None
+            continue
+
+        if command == 'A':
+            rx, ry, rotation, large_arc, sweep = segment[1:6]
+            end_x, end_y = snap(segment[6]), snap(segment[7])
+            exact_arc = (exact_x, exact_y) + tuple(segment[1:])
+            head = None
+            for parameter_precision in (precision, ARC_PARAMETER_PRECISION):
+                rounded = [round(value, parameter_precision) for value in (rx, ry, rotation)]
+                if _arc_deviation(exact_arc, (x, y, *rounded, large_arc, sweep, end_x, end_y)) <= arc_limit:
+                    head = [format_path_number(value, parameter_precision) for value in rounded]
+                    break
+            if head is None:
+                # Even exact radii can not follow an arc whose end points had to move, draw it with curves
+                # written at a finer grid; the final end point stays on the precision grid
+                curves = arc_to_cubic_segments(exact_arc, arc_limit / 10)
+                for index, curve in enumerate(curves):
+                    numbers = [format_path_number(value, precision + 2) for value in curve[1:5]]
+                    if index == len(curves) - 1:
+                        numbers += [format_path_number(end_x, precision), format_path_number(end_y, precision)]
+                    else:
+                        numbers += [format_path_number(value, precision + 2) for value in curve[5:]]
+                    emit('C', numbers)
+                # An S after these curves would mirror their last control point instead of starting at the end point
+                emitted_control = ('C', round(curves[-1][3], precision + 2), round(curves[-1][4], precision + 2))
+            else:
+                emitted_control = None
+                head += [str(int(large_arc)), str(int(sweep))]
+                absolute = head + [format_path_number(end_x, precision), format_path_number(end_y, precision)]
+                relative = head + [format_path_number(snap(end_x - x), precision), format_path_number(snap(end_y - y), precision)]
+                # Keep a plain separator around the flags, some parsers do not accept them packed
+                absolute_text = ' '.join(absolute)
+                relative_text = ' '.join(relative)
+                if len(relative_text) < len(absolute_text):
+                    emit('a', [relative_text])
+                else:
+                    emit('A', [absolute_text])
+            x, y = end_x, end_y
+            exact_x, exact_y = segment[6], segment[7]
+            exact_control = None
+            continue
+
+        if command in ('S', 'T'):
+            kind = 'C' if command == 'S' else 'Q'
+            exact_first = _mirrored_control(exact_control, kind, exact_x, exact_y)
+            emitted_first = _mirrored_control(emitted_control, kind, x, y)
+            if math.dist(exact_first, emitted_first) > arc_limit:
+                segment = (kind, *exact_first, *segment[1:])
+                command = kind
+
+        points = [snap(value) for value in segment[1:]]
+        end_x, end_y = points[-2], points[-1]
+        candidates = []
+        if command == 'L' and end_y == y and end_x != x:
+            candidates.append(('H', [end_x]))
+            candidates.append(('h', [snap(end_x - x)]))
+        elif command == 'L' and end_x == x:
+            candidates.append(('V', [end_y]))
+            candidates.append(('v', [snap(end_y - y)]))
+        candidates.append((command, points))
+        candidates.append((command.lower(), [snap(value - (x if index % 2 == 0 else y)) for index, value in enumerate(points)]))
+
+        best = None
+        for candidate_command, values in candidates:
+            numbers = [format_path_number(value, precision) for value in values]
+            cost = len(_join_path_numbers(numbers)) + (0 if candidate_command == last_command else 1)
+            if best is None or cost < best[0]:
+                best = (cost, candidate_command, numbers)
+        emit(best[1], best[2])
+
+        if command in ('C', 'S', 'Q'):
+            kind = 'Q' if command == 'Q' else 'C'
+            exact_control = (kind, segment[-4], segment[-3])
+            emitted_control = (kind, points[-4], points[-3])
+        elif command == 'T':
+            exact_control, emitted_control = ('Q', *exact_first), ('Q', *emitted_first)
+        else:
+            exact_control = emitted_control = None
+        x, y = end_x, end_y
+        exact_x, exact_y = segment[-2], segment[-1]
+        if command == 'M':
+            start_x, start_y = x, y
+            exact_start_x, exact_start_y = exact_x, exact_y
+    return ''.join(parts)
+
+def _mirrored_control(control, kind, x, y):
+    """First control point of an S (kind 'C') or T (kind 'Q') at (x, y): the previous control point of the same
+    kind mirrored through (x, y), or (x, y) itself after any other segment."""
+    if control is None or control[0] != kind:
+        return x, y
+    return 2 * x - control[1], 2 * y - control[2]
+
+def minify_path_data(path_data, precision):
+    """Rounds, merges and re-encodes SVG path data into the shortest equivalent Geometry string.
+
+    Every written point stays within 0.5 * 10^-precision units of the original per axis. Points that are not
+    written, along arcs and the control points S and T mirror, stay within the same distance of a snapped point
+    (sqrt(0.5) * 10^-precision).
+    """
+    segments = path_tokens_to_absolute(tokenize_path_data(path_data))
+    return serialize_path_segments(optimize_path_segments(segments, precision), precision)
+
+# --- Drawing Merging ---
+PEN_MITER_LIMIT = 10 # Avalonia's default Pen.MiterLimit, miter joins reach up to half of it times the thickness
+
+def path_bounds(segments):
+    """Returns a conservative (min x, min y, max x, max y) of absolute path segments, or None if there are no points.
+
+    Curves are bounded by their control points and arcs by their (possibly scaled up) radius, so the box may be
+    larger than the drawn shape but never smaller.
+    """
+    xs = []
+    ys = []
+    x = y = 0.0
+    start_x = start_y = 0.0
+    previous_control = None # Last control point, for the reflection of S/T
+    previous_command = None
+    for segment in segments:
+        command = segment[0]
+        if command == 'Z':
+            x, y = start_x, start_y
+            previous_command = command
+            continue
+
+        if command == 'A':
+            rx, ry = abs(segment[1]), abs(segment[2])
+            end_x, end_y = segment[6], segment[7]
+            xs.extend((x, end_x))
+            ys.extend((y, end_y))
+            if rx > 0 and ry > 0:
+                # Radii that are too small get scaled up until the end point is reachable
+                reach = max(rx, ry) * max(1.0, math.hypot(end_x - x, end_y - y) / (2 * min(rx, ry)))
+                xs.extend((x - 2 * reach, x + 2 * reach))
+                ys.extend((y - 2 * reach, y + 2 * reach))
+            x, y = end_x, end_y
+            previous_command = command
+            continue
+
+        points = list(segment[1:])
+        if command in ('S', 'T'):
+            reflects = ('C', 'S') if command == 'S' else ('Q', 'T')
+            if previous_command in reflects and previous_control is not None:
+                reflected = (2 * x - previous_control[0], 2 * y - previous_control[1])
+            else:
+                reflected = (x, y)
+            points = list(reflected) + points
+        xs.extend(points[0::2])
+        ys.extend(points[1::2])
+        if command in ('C', 'S', 'Q', 'T'):
+            previous_control = (points[-4], points[-3])
+        x, y = points[-2], points[-1]
+        if command == 'M':
+            start_x, start_y = x, y
+        previous_command = command
+
+    if not xs:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def _boxes_overlap(a, b):
+    """True if two boxes overlap or touch."""
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+def merge_drawings(drawings, svg_path):
+    """Merges runs of adjacent drawings with the same brush and pen into one drawing with a combined geometry.
+
+    Drawings are only merged when their (pen inflated) bounds do not touch, so neither the fill rule nor the
+    paint order can make the merged drawing look different.
+    """
+    merged = []
+    group = None # Current run: drawing record, list of member bounds
+    for drawing in drawings:
+        try:
+            segments = path_tokens_to_absolute(tokenize_path_data(drawing['geometry']))
+        except ValueError as e:
+            print(f"Warning: Not merging a path in {svg_path}, could not read its path data: {e}")
+            segments = None
+        bounds = path_bounds(segments) if segments else None
+
+        if bounds is not None and drawing['pen_brush']:
+            inflate = drawing['thickness'] * PEN_MITER_LIMIT / 2
+            bounds = (bounds[0] - inflate, bounds[1] - inflate, bounds[2] + inflate, bounds[3] + inflate)
+
+        style = (drawing['brush'], drawing['pen_brush'], drawing['thickness'])
+        if (group is not None and bounds is not None and group[0]['style'] == style
+                and not any(_boxes_overlap(bounds, member) for member in group[1])):
+            geometry = drawing['geometry'].strip()
+            if not geometry.startswith('M'):
+                # A leading relative move would continue from the previous path, write it out absolute
+                geometry = serialize_path_segments(segments, 10)
+            group[0]['geometry'] = group[0]['geometry'] + geometry
+            group[1].append(bounds)
+            continue
+
+        record = dict(drawing, style=style)
+        merged.append(record)
+        group = (record, [bounds]) if bounds is not None else None
+
+    for record in merged:
+        del record['style']
+    return merged
+
+# --- SVG Shapes and Transforms ---
+# Everything is flattened while parsing: shapes become path data and group/use transforms are baked into the
+# coordinates, so the generated icons never carry runtime Transform nodes.
+IDENTITY_TRANSFORM = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0) # (a, b, c, d, e, f): x' = a*x + c*y + e, y' = b*x + d*y + f
+SHAPE_TAGS = {'path', 'rect', 'circle', 'ellipse', 'line', 'polyline', 'polygon'}
+NON_RENDERED_TAGS = {'defs', 'symbol', 'clipPath', 'mask', 'marker', 'pattern', 'linearGradient', 'radialGradient',
+                     'filter', 'style', 'script', 'title', 'desc', 'metadata'}
+INHERITED_PROPERTIES = ('fill', 'stroke', 'stroke-width', 'fill-opacity', 'stroke-opacity', 'visibility', 'color')
+PRESENTATION_PROPERTIES = INHERITED_PROPERTIES + ('opacity', 'display')
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+_TRANSFORM_RE = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+
+def local_tag(tag):
+    """Splits an element tag into (namespaced, local name), e.g. '{http://www.w3.org/2000/svg}rect' -> (True, 'rect')."""
+    if tag.startswith('{'):
+        namespace, name = tag[1:].split('}', 1)
+        return namespace == SVG_NAMESPACE, name
+    return False, tag
+
+def multiply_transforms(outer, inner):
+    """Returns the transform applying inner first, then outer."""
+    a1, b1, c1, d1, e1, f1 = outer
+    a2, b2, c2, d2, e2, f2 = inner
+    return (a1 * a2 + c1 * b2, b1 * a2 + d1 * b2,
+            a1 * c2 + c1 * d2, b1 * c2 + d1 * d2,
+            a1 * e2 + c1 * f2 + e1, b1 * e2 + d1 * f2 + f1)
+
+def parse_transform(transform_str):
+    """Parses an SVG transform attribute (a list of transform functions) into one matrix."""
+    transform = IDENTITY_TRANSFORM
+    remainder = _TRANSFORM_RE.sub('', transform_str).replace(',', ' ').strip()
+    if remainder:
+        raise ValueError(f"Unsupported transform '{transform_str}'")
+    for name, arguments in _TRANSFORM_RE.findall(transform_str):
+        values = [float(value) for value in _PATH_NUMBER_RE.findall(arguments)]
+        if name == 'matrix' and len(values) == 6:
+            step = tuple(values)
+        elif name == 'translate' and len(values) in (1, 2):
+            step = (1.0, 0.0, 0.0, 1.0, values[0], values[1] if len(values) == 2 else 0.0)
+        elif name == 'scale' and len(values) in (1, 2):
+            step = (values[0], 0.0, 0.0, values[-1], 0.0, 0.0)
+        elif name == 'rotate' and len(values) in (1, 3):
+            angle = math.radians(values[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            step = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(values) == 3: # rotate(angle, cx, cy) = translate(cx, cy) rotate(angle) translate(-cx, -cy)
+                cx, cy = values[1:]
+                step = multiply_transforms(multiply_transforms((1.0, 0.0, 0.0, 1.0, cx, cy), step),
+                                           (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+        elif name == 'skewX' and len(values) == 1:
+            step = (1.0, 0.0, math.tan(math.radians(values[0])), 1.0, 0.0, 0.0)
+        elif name == 'skewY' and len(values) == 1:
+            step = (1.0, math.tan(math.radians(values[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            raise ValueError(f"Invalid {name}() in transform '{transform_str}'")
+        transform = multiply_transforms(transform, step)
+    return transform
+
+def transform_point(transform, x, y):
+    a, b, c, d, e, f = transform
+    return a * x + c * y + e, b * x + d * y + f
+
+def _transform_arc(transform, rx, ry, rotation):
+    """Returns the (rx, ry, rotation) of an arc's ellipse after the linear part of transform.
+
+    An ellipse stays an ellipse under any affine transform: its new radii and angle are the singular values
+    and the left singular vector angle of (transform * rotate(rotation) * scale(rx, ry)).
+    """
+    a, b, c, d = transform[:4]
+    cos, sin = math.cos(math.radians(rotation)), math.sin(math.radians(rotation))
+    m00, m01 = (a * cos + c * sin) * rx, (-a * sin + c * cos) * ry
+    m10, m11 = (b * cos + d * sin) * rx, (-b * sin + d * cos) * ry
+    e, f = (m00 + m11) / 2, (m00 - m11) / 2
+    g, h = (m10 + m01) / 2, (m10 - m01) / 2
+    q, r = math.hypot(e, h), math.hypot(f, g)
+    angle = (math.atan2(g, f) + math.atan2(h, e)) / 2
+    return q + r, abs(q - r), math.degrees(angle)
+
+def transform_path_segments(segments, transform):
+    """Applies a transform to absolute path segments (see path_tokens_to_absolute)."""
+    if transform == IDENTITY_TRANSFORM:
+        return segments
+    mirrored = transform[0] * transform[3] - transform[1] * transform[2] < 0
+    transformed = []
+    for segment in segments:
+        command = segment[0]
+        if command == 'Z':
+            transformed.append(segment)
+        elif command == 'A':
+            rx, ry, rotation, large_arc, sweep, end_x, end_y = segment[1:]
+            end = transform_point(transform, end_x, end_y)
+            new_rx, new_ry, new_rotation = _transform_arc(transform, abs(rx), abs(ry), rotation)
+            if new_rx < 1e-9 or new_ry < 1e-9: # A flattened ellipse is drawn as a straight line
+                transformed.append(('L', *end))
+            else:
+                transformed.append(('A', new_rx, new_ry, new_rotation, large_arc, int(sweep) ^ int(mirrored), *end))
+        else:
+            # S and T reflect their first control point, which an affine transform preserves
+            points = []
+            for index in range(1, len(segment), 2):
+                points.extend(transform_point(transform, segment[index], segment[index + 1]))
+            transformed.append((command, *points))
+    return transformed
+
+def parse_length(value, default=0.0):
+    """Parses a plain or px length attribute, other units and percentages are not supported."""
+    if value is None or not value.strip():
+        return default
+    value = value.strip()
+    if value.endswith('px'):
+        value = value[:-2]
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Unsupported length '{value}'") from None
+
+def parse_opacity(value):
+    """Parses an opacity value (number or percentage), clamped to 0..1. Missing means opaque."""
+    if value is None or not value.strip() or value.strip() == 'inherit':
+        return 1.0
+    value = value.strip()
+    try:
+        opacity = float(value[:-1]) / 100 if value.endswith('%') else float(value)
+    except ValueError:
+        raise ValueError(f"Invalid opacity '{value}'") from None
+    return min(max(opacity, 0.0), 1.0)
+
+def shape_segments(name, element):
+    """Returns the absolute path segments of a basic shape element, or None if it draws nothing."""
+    if name == 'rect':
+        x, y = parse_length(element.get('x')), parse_length(element.get('y'))
+        width, height = parse_length(element.get('width')), parse_length(element.get('height'))
+        if width <= 0 or height <= 0:
+            return None
+        rx_value, ry_value = element.get('rx'), element.get('ry')
+        rx = parse_length(rx_value if rx_value is not None else ry_value)
+        ry = parse_length(ry_value if ry_value is not None else rx_value)
+        rx, ry = min(max(rx, 0.0), width / 2), min(max(ry, 0.0), height / 2)
+        right, bottom = x + width, y + height
+        if rx == 0 or ry == 0:
+            return [('M', x, y), ('L', right, y), ('L', right, bottom), ('L', x, bottom), ('Z',)]
+        return [('M', x + rx, y), ('L', right - rx, y), ('A', rx, ry, 0, 0, 1, right, y + ry),
+                ('L', right, bottom - ry), ('A', rx, ry, 0, 0, 1, right - rx, bottom),
+                ('L', x + rx, bottom), ('A', rx, ry, 0, 0, 1, x, bottom - ry),
+                ('L', x, y + ry), ('A', rx, ry, 0, 0, 1, x + rx, y), ('Z',)]
+
+    if name in ('circle', 'ellipse'):
+        cx, cy = parse_length(element.get('cx')), parse_length(element.get('cy'))
+        if name == 'circle':
+            rx = ry = parse_length(element.get('r'))
+        else:
+            rx, ry = parse_length(element.get('rx')), parse_length(element.get('ry'))
+        if rx <= 0 or ry <= 0:
+            return None
+        return [('M', cx + rx, cy), ('A', rx, ry, 0, 0, 1, cx - rx, cy), ('A', rx, ry, 0, 0, 1, cx + rx, cy), ('Z',)]
+
+    if name == 'line':
+        return [('M', parse_length(element.get('x1')), parse_length(element.get('y1'))),
+                ('L', parse_length(element.get('x2')), parse_length(element.get('y2')))]
+
+    # polyline / polygon
+    values = [float(value) for value in _PATH_NUMBER_RE.findall(element.get('points', ''))]
+    points = list(zip(values[0::2], values[1::2]))
+    if len(points) < 2:
+        return None
+    segments = [('M', *points[0])] + [('L', *point) for point in points[1:]]
+    if name == 'polygon':
+        segments.append(('Z',))
+    return segments
+
+def parse_style(style_str):
+    """Parses a style attribute into a {property: value} dict."""
+    properties = {}
+    for declaration in (style_str or '').split(';'):
+        if ':' in declaration:
+            name, value = declaration.split(':', 1)
+            properties[name.strip()] = value.strip()
+    return properties
+
+def resolve_shape_state(parent_state, element):
+    """Returns the inherited drawing state of an element, or None if it is not displayed.
+
+    The state holds the accumulated transform and opacity and the inherited presentation properties.
+    Properties in the style attribute win over presentation attributes.
+    """
+    style = parse_style(element.get('style'))
+    properties = {name: style.get(name, element.get(name)) for name in PRESENTATION_PROPERTIES}
+    if (properties['display'] or '').strip() == 'none':
+        return None
+
+    state = dict(parent_state)
+    for name in INHERITED_PROPERTIES:
+        value = properties[name]
+        if value is not None and value.strip() != 'inherit':
+            state[name] = value.strip()
+    state['opacity'] = parent_state['opacity'] * parse_opacity(properties['opacity'])
+    transform_str = element.get('transform')
+    if transform_str:
+        state['transform'] = multiply_transforms(parent_state['transform'], parse_transform(transform_str))
+
+    use_width, use_height = state.pop('use-size', (None, None)) # Only for the element a <use> points at
+    if local_tag(element.tag)[1] in ('svg', 'symbol'):
+        if 'viewport' in parent_state: # A nested <svg> or the <symbol> a <use> points at
+            step, state['viewport'] = viewport_transform(element, parent_state['viewport'], use_width, use_height)
+            state['transform'] = multiply_transforms(state['transform'], step)
+        else: # The root <svg>, its user space is the output's
+            state['viewport'] = root_viewport(element)
+    return state
+
+def parse_view_box(value):
+    """Parses a viewBox attribute into (min x, min y, width, height), or None if it is not set."""
+    if value is None or not value.strip():
+        return None
+    numbers = [float(number) for number in _PATH_NUMBER_RE.findall(value)]
+    if len(numbers) != 4 or numbers[2] <= 0 or numbers[3] <= 0:
+        raise ValueError(f"Invalid viewBox '{value}'")
+    return tuple(numbers)
+
+def root_viewport(element):
+    """Size of the root viewport in user units (its viewBox, else its width and height), or None if unknown."""
+    try:
+        view_box = parse_view_box(element.get('viewBox'))
+        if view_box:
+            return view_box[2:]
+        width, height = parse_length(element.get('width'), None), parse_length(element.get('height'), None)
+    except ValueError:
+        return None
+    return (width, height) if width is not None and height is not None else None
+
+def viewport_transform(element, parent_viewport, width=None, height=None):
+    """Returns (transform, viewport size) mapping the user space of a nested <svg> or used <symbol> into its parent's.
+
+    The transform is the x/y offset followed by the viewBox scaling and preserveAspectRatio alignment, width and
+    height (of the <use>, else of the element) default to the parent viewport. Content outside the viewport is
+    not clipped.
+    """
+    width = parse_length(width if width is not None else element.get('width'), None)
+    height = parse_length(height if height is not None else element.get('height'), None)
+    if parent_viewport:
+        width = parent_viewport[0] if width is None else width
+        height = parent_viewport[1] if height is None else height
+    x, y = parse_length(element.get('x')), parse_length(element.get('y'))
+
+    view_box = parse_view_box(element.get('viewBox'))
+    if view_box is None:
+        viewport = (width, height) if width is not None and height is not None else None
+        return (1.0, 0.0, 0.0, 1.0, x, y), viewport
+    if width is None or height is None:
+        raise ValueError("its viewBox needs a width and height to scale to")
+    min_x, min_y, view_width, view_height = view_box
+    scale_x, scale_y = width / view_width, height / view_height
+    aspect = (element.get('preserveAspectRatio') or '').split()
+    if aspect[:1] == ['defer']:
+        aspect = aspect[1:]
+    align = aspect[0] if aspect else 'xMidYMid'
+    if align != 'none':
+        match = re.fullmatch(r'x(Min|Mid|Max)Y(Min|Mid|Max)', align)
+        if not match or aspect[1:] not in ([], ['meet'], ['slice']):
+            raise ValueError(f"Invalid preserveAspectRatio '{element.get('preserveAspectRatio')}'")
+        scale_x = scale_y = (max if aspect[1:] == ['slice'] else min)(scale_x, scale_y)
+        fractions = {'Min': 0.0, 'Mid': 0.5, 'Max': 1.0}
+        x += (width - view_width * scale_x) * fractions[match.group(1)]
+        y += (height - view_height * scale_y) * fractions[match.group(2)]
+    return (scale_x, 0.0, 0.0, scale_y, x - min_x * scale_x, y - min_y * scale_y), (view_width, view_height)
+
+def resolve_paint(state, name):
+    """Returns the fill or stroke of a state, with currentColor replaced by the inherited color property."""
+    value = state.get(name)
+    if normalize_color(value) == 'currentcolor':
+        return state.get('color', 'black') # Renderers draw an unset color as black
+    return value
+
+def root_shape_state():
+    """State of the root element, seeded with the SVG initial values of the properties it inherits down."""
+    return {'transform': IDENTITY_TRANSFORM, 'opacity': 1.0, 'fill': 'black', 'stroke-width': '1'}
+
+def build_shape(name, element, state, svg_path, warnings):
+    """Flattens a shape element into the model shape (path data, fill, stroke, stroke width, opacities).
+
+    Warnings are appended to the warnings list instead of printed, the caller prints them once parsing finished.
+    """
+    if state.get('visibility') in ('hidden', 'collapse'):
+        return None
+    transform = state['transform']
+
+    if name == 'path':
+        path_data = element.get('d')
+        if not path_data:
+            return None
+        path_data = re.sub(r'\s+', ' ', path_data).strip()
+        segments = None
+        if transform != IDENTITY_TRANSFORM:
+            try:
+                segments = path_tokens_to_absolute(tokenize_path_data(path_data))
+            except ValueError as e:
+                warnings.append(f"Warning: Skipping transformed path in {svg_path}, its path data is invalid: {e}")
+                return None
+    else:
+        segments = shape_segments(name, element)
+        if not segments:
+            return None
+    if segments is not None:
+        path_data = serialize_path_segments(transform_path_segments(segments, transform), BAKED_PATH_PRECISION)
+
+    fill, stroke = resolve_paint(state, 'fill'), resolve_paint(state, 'stroke')
+    if name == 'line':
+        fill = None # A line encloses no area, its inherited fill would only add an unused color
+    stroke_width = state.get('stroke-width')
+    if stroke_width and transform != IDENTITY_TRANSFORM:
+        a, b, c, d = transform[:4]
+        scale = math.sqrt(abs(a * d - b * c))
+        if normalize_color(stroke) not in (None, 'none') and (
+                abs(a * a + b * b - c * c - d * d) > 1e-9 or abs(a * c + b * d) > 1e-9):
+            warnings.append(f"Warning: Stroke of a non-uniformly transformed {name} in {svg_path} keeps a uniform width.")
+        stroke_width = format_path_number(parse_length(stroke_width, 1.0) * scale, BAKED_PATH_PRECISION)
+
+    return {
+        'tag': 'path',
+        'd': path_data,
+        'fill': fill,
+        'stroke': stroke,
+        'stroke_width': stroke_width,
+        'fill_opacity': state['opacity'] * parse_opacity(state.get('fill-opacity')),
+        'stroke_opacity': state['opacity'] * parse_opacity(state.get('stroke-opacity')),
+    }
+
+def warn_group_opacity(name, parent_state, state, shape_count, svg_path, warnings):
+    """Warns when a translucent group draws several shapes.
+
+    Its opacity is multiplied into every shape's brushes, while SVG fades the group as a whole after drawing it,
+    so where the shapes overlap the result differs (the shapes below show through).
+    """
+    if shape_count > 1 and parent_state['opacity'] > 0 and state['opacity'] < parent_state['opacity']:
+        warnings.append(f"Warning: Opacity of <{name}> in {svg_path} is applied to each of its {shape_count} shapes, "
+              f"where they overlap they blend differently than in the SVG.")
+
+def _use_reference(element):
+    href = element.get('href') or element.get(XLINK_HREF) or ''
+    return href[1:] if href.startswith('#') else None
+
+def _flatten_element(element, parent_state, elements_by_id, shapes, svg_path, warnings, used_ids=()):
+    """Appends (namespaced, shape) for every shape drawn by element and its descendants to shapes.
+
+    Warnings are appended to warnings (see build_shape).
+    """
+    namespaced, name = local_tag(element.tag)
+    try:
+        state = resolve_shape_state(parent_state, element)
+        if state is None:
+            return
+        if name == 'use':
+            reference = _use_reference(element)
+            target = elements_by_id.get(reference)
+            if target is None or reference in used_ids:
+                warnings.append(f"Warning: Skipping <use> of '{reference}' in {svg_path}, the element is missing or uses itself.")
+                return
+            offset = (1.0, 0.0, 0.0, 1.0, parse_length(element.get('x')), parse_length(element.get('y')))
+            state['transform'] = multiply_transforms(state['transform'], offset)
+            state['use-size'] = (element.get('width'), element.get('height'))
+            first_shape = len(shapes)
+            _flatten_element(target, state, elements_by_id, shapes, svg_path, warnings, used_ids + (reference,))
+            warn_group_opacity(name, parent_state, state, len(shapes) - first_shape, svg_path, warnings)
+        elif name in SHAPE_TAGS:
+            shape = build_shape(name, element, state, svg_path, warnings)
+            if shape:
+                shapes.append((namespaced, shape))
+        else: # Groups, <a>, nested <svg> and the <symbol> a <use> points at (their viewport is in state)
+            first_shape = len(shapes)
+            for child in element:
+                if local_tag(child.tag)[1] not in NON_RENDERED_TAGS:
+                    _flatten_element(child, state, elements_by_id, shapes, svg_path, warnings, used_ids)
+            warn_group_opacity(name, parent_state, state, len(shapes) - first_shape, svg_path, warnings)
+    except ValueError as e:
+        warnings.append(f"Warning: Skipping <{name}> in {svg_path}: {e}")
+
+def _select_shapes(shapes):
+    """Namespaced shapes first, plain (namespace-less) shapes only as a fallback."""
+    namespaced_shapes = [shape for namespaced, shape in shapes if namespaced]
+    return namespaced_shapes or [shape for namespaced, shape in shapes if not namespaced]
+
+# --- SVG Parsing (single pass) ---
+def _count_color(color_usage, color, role):
+    if is_paint_color(color):
+        usage = color_usage.setdefault(color, {'fill': 0, 'stroke': 0})
+        usage[role] += 1
+
+def _collect_element_colors(elem, color_usage):
+    """Counts the normalized fill/stroke colors of an element (attributes and style) in color_usage."""
+    for attribute in ('fill', 'stroke'):
+        _count_color(color_usage, normalize_color(elem.get(attribute)), attribute)
+
+    # Rudimentary style attribute parsing
+    style_str = elem.get('style', '')
+    if not style_str:
+        return
+    # Look for fill: #xxxxxx or fill: name
+    fill_match = re.search(r'fill:\s*([^;]+)', style_str)
+    if fill_match:
+        _count_color(color_usage, normalize_color(fill_match.group(1)), 'fill')
+    # Look for stroke: #xxxxxx or stroke: name
+    stroke_match = re.search(r'stroke:\s*([^;]+)', style_str)
+    if stroke_match:
+        _count_color(color_usage, normalize_color(stroke_match.group(1)), 'stroke')
+
+def _collect_resolved_colors(shapes, color_usage):
+    """Counts shape colors that discovery did not see on any element, those reached through currentColor."""
+    for _, shape in shapes:
+        for role in ('fill', 'stroke'):
+            color = normalize_color(shape[role])
+            if color not in color_usage:
+                _count_color(color_usage, color, role)
+
+def parse_svg_document(svg_path, data=None, streaming=None):
+    """Reads and parses an SVG once into the intermediate model (shapes, fills, strokes, widths and colors).
+
+    When the file content was already read (e.g. to hash it), pass it as data to avoid reading it again.
+    streaming selects the iterparse reader (True) or the tree reader (False), by default files larger than
+    STREAMING_THRESHOLD_BYTES are streamed. Both readers produce the same document.
+    """
+    if streaming is None:
         try:
-            tree = ET.parse(svg_path)
-            root = tree.getroot()
-            # Find colors in paths, circles, rects, etc. (adjust if needed)
-            elements_with_color = root.findall('.//*[@fill]', namespaces) + \
-                                  root.findall('.//*[@stroke]', namespaces)
-            # Also check root element style attributes
-            elements_with_style = root.findall('.//*[@style]', namespaces)
-
-            for elem in elements_with_color:
-                 fill = normalize_color(elem.get('fill'))
-                 stroke = normalize_color(elem.get('stroke'))
-                 if fill and fill != 'none':
-                     unique_colors.add(fill)
-                 if stroke and stroke != 'none':
-                     unique_colors.add(stroke)
-
-            # Rudimentary style attribute parsing
-            for elem in elements_with_style:
-                 style_str = elem.get('style', '')
-                 # Look for fill: #xxxxxx or fill: name
-                 fill_match = re.search(r'fill:\s*([^;]+)', style_str)
-                 if fill_match:
-                     fill = normalize_color(fill_match.group(1))
-                     if fill and fill != 'none':
-                        unique_colors.add(fill)
-                 # Look for stroke: #xxxxxx or stroke: name
-                 stroke_match = re.search(r'stroke:\s*([^;]+)', style_str)
-                 if stroke_match:
-                     stroke = normalize_color(stroke_match.group(1))
-                     if stroke and stroke != 'none':
-                         unique_colors.add(stroke)
-
-        except ET.ParseError as e:
-            print(f"Warning: Could not parse {filename} during color scan: {e}")
-        except FileNotFoundError:
-            print(f"Warning: File {filename} not found during color scan.")
-        except Exception as e:
-             print(f"Warning: An unexpected error occurred scanning {filename}: {e}")
+            size = len(data) if data is not None else os.path.getsize(svg_path)
+        except OSError:
+            size = 0
+        streaming = size > STREAMING_THRESHOLD_BYTES
+
+    source = io.BytesIO(data) if data is not None else svg_path
+    warnings = [] # Printed once reading finished, a streamed read may take a second pass
+    error = None
+    try:
+        read_svg = _read_svg_streaming if streaming else _read_svg_tree
+        color_usage, shapes = read_svg(source, svg_path, warnings)
+    except ET.ParseError as e:
+        error = f"Error parsing SVG file {svg_path}: {e}"
+    except FileNotFoundError:
+        error = f"Error: SVG file not found at {svg_path}"
+    for warning in warnings:
+        print(warning)
+    if error:
+        print(error)
+        return None
 
+    return {'source': svg_path, 'colors': set(color_usage), 'color_usage': color_usage, 'shapes': shapes}
 
+def _read_svg_tree(source, svg_path, warnings):
+    """Builds the full ElementTree and returns (color usage, shapes), appending its warnings to warnings."""
+    namespaces = {'svg': SVG_NAMESPACE}
+    ET.register_namespace('', namespaces['svg'])
+    tree = ET.parse(source)
+    root = tree.getroot()
+
+    # Colors of every descendant element, used for color discovery
+    color_usage = {}
+    for elem in root.iter():
+        if elem is not root:
+            _collect_element_colors(elem, color_usage)
+
+    # Flatten every drawn shape (namespaced first, plain as a fallback)
+    elements_by_id = {elem.get('id'): elem for elem in root.iter() if elem.get('id')}
+    shapes = []
+    _flatten_element(root, root_shape_state(), elements_by_id, shapes, svg_path, warnings)
+    _collect_resolved_colors(shapes, color_usage)
+    return color_usage, _select_shapes(shapes)
+
+def _read_svg_streaming(source, svg_path, warnings):
+    """Reads the SVG in a forward pass with iterparse and returns (color usage, shapes), warnings go to warnings.
+
+    Every element is cleared and detached from its parent once it ends, so memory stays bounded by the
+    nesting depth instead of the file size. Only elements a <use> can point at are kept (see
+    _stream_svg_elements). A <use> of a drawn group that was already discarded needs a second pass that keeps
+    it, only the warnings of the last pass are kept.
+    """
+    wanted_ids = set()
+    while True:
+        del warnings[:] # A second pass repeats the warnings of the first
+        result, missing_ids = _stream_svg_elements(source, svg_path, wanted_ids, warnings)
+        if result is not None:
+            return result
+        wanted_ids |= missing_ids
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+def _stream_svg_elements(source, svg_path, wanted_ids, warnings):
+    """The iterparse pass of _read_svg_streaming, appending its warnings to warnings.
+
+    Elements with an id are kept (not cleared) when they are not drawn in place (inside <defs>, <symbol> or a
+    hidden subtree), when they are a single shape, or when they are in wanted_ids. Every <use> is expanded from
+    those at the end of the file, so references to later elements resolve too. Returns ((color usage, shapes),
+    None), or (None, ids) when a <use> points at drawn groups that were discarded: read again with them wanted.
+    """
+    color_usage = {}
+    shapes = [] # (namespaced, shape), None where a <use> is expanded at the end
+    uses = [] # (copy of the <use> element, parent state) per None in shapes
+    elements_by_id = {}
+    discarded_ids = set()
+    open_elements = []
+    states = [] # Drawing state per open element, None inside non-rendered or hidden subtrees
+    kept = [] # Per open element, whether it stays in memory for <use>
+    first_shapes = [] # Number of shapes when each open element started
+    groups = [] # (name, parent state, state, first shape, end shape) of drawn groups, checked once uses are expanded
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            namespaced, name = local_tag(elem.tag)
+            if open_elements: # Skip the root, like the tree reader does
+                _collect_element_colors(elem, color_usage)
+
+            parent_state = states[-1] if states else root_shape_state()
+            state = None
+            if parent_state is not None and name not in NON_RENDERED_TAGS:
+                try:
+                    state = resolve_shape_state(parent_state, elem)
+                    if state is not None and name in SHAPE_TAGS:
+                        shape = build_shape(name, elem, state, svg_path, warnings)
+                        if shape:
+                            shapes.append((namespaced, shape))
+                    elif state is not None and name == 'use':
+                        shapes.append(None)
+                        uses.append((ET.Element(elem.tag, dict(elem.attrib)), parent_state))
+                except ValueError as e:
+                    warnings.append(f"Warning: Skipping <{name}> in {svg_path}: {e}")
+
+            element_id = elem.get('id')
+            keep = bool(kept and kept[-1]) or bool(element_id) and (
+                state is None or name in SHAPE_TAGS or element_id in wanted_ids)
+            if element_id:
+                if keep:
+                    elements_by_id[element_id] = elem
+                else:
+                    discarded_ids.add(element_id)
+            open_elements.append(elem)
+            states.append(state)
+            kept.append(keep)
+            first_shapes.append(len(shapes))
+            continue
+
+        open_elements.pop()
+        state = states.pop()
+        keep = kept.pop()
+        first_shape = first_shapes.pop()
+        name = local_tag(elem.tag)[1]
+        if state is not None and name not in SHAPE_TAGS and name != 'use': # A <use> warns when it is expanded
+            groups.append((name, states[-1] if states else root_shape_state(), state, first_shape, len(shapes)))
+        if keep and kept and kept[-1]:
+            continue # Part of a kept ancestor
+        if not keep:
+            elem.clear()
+        if open_elements:
+            open_elements[-1].remove(elem)
+
+    # Drawn groups a <use> points at (directly or through kept elements) that were discarded
+    missing_ids = set()
+    pending = [_use_reference(use) for use, _ in uses]
+    visited = set()
+    while pending:
+        reference = pending.pop()
+        if reference in visited:
+            continue
+        visited.add(reference)
+        if reference in elements_by_id:
+            pending.extend(_use_reference(child) for child in elements_by_id[reference].iter()
+                           if local_tag(child.tag)[1] == 'use')
+        elif reference in discarded_ids:
+            missing_ids.add(reference)
+    if missing_ids - wanted_ids:
+        return None, missing_ids
+
+    expanded = []
+    expanded_starts = [] # Index in expanded of every entry of shapes
+    pending_uses = iter(uses)
+    for entry in shapes:
+        expanded_starts.append(len(expanded))
+        if entry is None:
+            use, parent_state = next(pending_uses)
+            _flatten_element(use, parent_state, elements_by_id, expanded, svg_path, warnings)
+        else:
+            expanded.append(entry)
+    expanded_starts.append(len(expanded))
+    for name, parent_state, state, first_shape, end_shape in groups:
+        warn_group_opacity(name, parent_state, state, expanded_starts[end_shape] - expanded_starts[first_shape],
+                           svg_path, warnings)
+    _collect_resolved_colors(expanded, color_usage)
+    # Namespaced shapes first, plain shapes as a fallback (same as the tree reader)
+    return (color_usage, _select_shapes(expanded)), None
+
+def parse_svg_folder(svg_folder, svg_files, streaming=None):
+    """Parses every SVG file of a folder once, returning (filename, document) pairs for the readable ones."""
+    documents = []
+    for filename in svg_files:
+        document = parse_svg_document(os.path.join(svg_folder, filename), streaming=streaming)
+        if document is not None:
+            documents.append((filename, document))
+    return documents
+
+def find_unique_colors_in_svgs(documents):
+    """Returns the sorted unique normalized colors found in the parsed SVG documents."""
+    unique_colors = set()
+    for document in documents:
+        unique_colors.update(document['colors'])
+    return sort_unique_colors(unique_colors)
+
+def sort_unique_colors(unique_colors):
+    """Sorts a set of unique colors for consistent order - hex codes first, then names."""
     print(f"Found {len(unique_colors)} unique colors.")
-    # Sort for consistent order - hex codes first, then names
     sorted_colors = sorted(list(unique_colors), key=lambda c: (not c.startswith('#'), c))
     return sorted_colors # Return a list for ordered processing
 
+# --- Color Mapping ---
+def map_color_choice(color, template_num, quiet=False, keep_named=False):
+    """Returns the brush value for a color mapped to TemplateColor{template_num}, or kept as-is when template_num is 0.
+
+    With keep_named (profiles, --auto-colors), kept named colors are written as their hex value and a name
+    without a known value is an error, instead of falling back to the default brush.
+    """
+    if template_num == 0:
+        if color.startswith('#'):
+            if not quiet:
+                print(f"  Keeping '{color}' -> {color.upper()}")
+            return color.upper() # Keep original hex
+        if keep_named:
+            if color not in NAMED_COLORS:
+                raise ValueError(f"Can not keep the named color '{color}', its value is unknown. "
+                                 f"Map it to a template color or use its hex value in the profile.")
+            if not quiet:
+                print(f"  Keeping '{color}' -> {NAMED_COLORS[color].upper()}")
+            return NAMED_COLORS[color].upper()
+        # Keeping named colors directly can be less reliable than hex.
+        # Map named colors kept via '0' to the default brush for safety.
+        # If you trust your named colors (like 'white', 'black'), you could try:
+        # return color.capitalize()
+        if not quiet:
+            print(f"  Warning: Keeping named color '{color}' directly might not work reliably.")
+            print(f"  Mapping '{color}' (requested keep) -> {DEFAULT_UNMAPPED_BRUSH}")
+        return DEFAULT_UNMAPPED_BRUSH
+
+    if not quiet:
+        print(f"  Mapping '{color}' -> TemplateColor{template_num}")
+    return f"{{StaticResource TemplateColor{template_num}}}"
+
+def build_color_map(choices, quiet=False, keep_named=False):
+    """Turns {color: template number} choices into the {color: brush value} map used for generation."""
+    return {color: map_color_choice(color, template_num, quiet, keep_named) for color, template_num in choices.items()}
+
+# --- Color Map Profiles ---
+def _parse_template_choice(value, color, profile_path):
+    """Reads a profile value: a template number, 'TemplateColorN', or 'keep' (= 0)."""
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text == 'keep':
+            return 0
+        if text.startswith('templatecolor') and text[len('templatecolor'):].isdigit():
+            value = int(text[len('templatecolor'):])
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= MAX_TEMPLATE_COLORS:
+        raise ValueError(f"Invalid template number '{value}' for color '{color}' in {profile_path}. "
+                         f"Use 0/'keep' or a number between 1 and {MAX_TEMPLATE_COLORS}.")
+    return value
+
+def load_color_profile(profile_path):
+    """Loads a JSON or YAML color-map profile into {family: {color: template number}}.
+
+    A profile is either one flat {color: template number} map that applies to every folder, or a map of icon
+    families (folder names) to such maps, optionally with a "default" family used for folders not listed.
+    """
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        if profile_path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError(f"PyYAML is required to read {profile_path} (pip install pyyaml)")
+            raw_profile = yaml.safe_load(f) or {}
+        else:
+            raw_profile = json.load(f)
+    if not isinstance(raw_profile, dict):
+        raise ValueError(f"{profile_path} does not contain a color map")
+
+    if not any(isinstance(value, dict) for value in raw_profile.values()):
+        raw_profile = {'default': raw_profile}
+
+    profile = {}
+    for family, raw_map in raw_profile.items():
+        if not isinstance(raw_map, dict):
+            raise ValueError(f"Family '{family}' in {profile_path} is not a color map")
+        profile[family] = {normalize_color(str(color)): _parse_template_choice(value, color, profile_path)
+                           for color, value in raw_map.items()}
+    return profile
+
+def save_color_profile(profile_path, family_choices):
+    """Writes {family: {color: template number}} as a profile that --color-profile can load again."""
+    profile = {family: dict(sorted(choices.items())) for family, choices in sorted(family_choices.items())}
+    if profile_path.lower().endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise ValueError(f"PyYAML is required to write {profile_path} (pip install pyyaml)")
+        text = yaml.safe_dump(profile, sort_keys=True)
+    else:
+        text = json.dumps(profile, indent=2) + "\n"
+    with open(profile_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    print(f"Saved color profile to: {profile_path}")
+
+# --- Automatic Palette Clustering ---
+def hex_to_lab(color):
+    """Converts a #rrggbb color to CIELAB (D65), where distances roughly match perceived differences."""
+    def linearize(channel):
+        return channel / 12.92 if channel <= 0.04045 else ((channel + 0.055) / 1.055) ** 2.4
+    r, g, b = (linearize(int(color[i:i + 2], 16) / 255) for i in (1, 3, 5))
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047
+    y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883
+
+    def f(t):
+        return t ** (1 / 3) if t > 0.008856 else 7.787 * t + 16 / 116
+    fx, fy, fz = f(x), f(y), f(z)
+    return (116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz))
+
+def auto_assign_colors(colors, family_usage, reserved_slots=()):
+    """Clusters near-identical colors and assigns the clusters to free template slots by role.
+
+    family_usage maps each color to {'icons', 'fill', 'stroke'} counts. Colors used by more icons get the lower
+    slots, and fills come before strokes (so the shared face fill/border end up in slots 1 and 2, the part's own
+    colors after them). Returns ({color: template number}, outliers): outliers are named colors and clusters
+    that do not fit in the remaining slots.
+    """
+    def uses(color):
+        usage = family_usage.get(color, {})
+        return usage.get('fill', 0) + usage.get('stroke', 0)
+
+    outliers = [c for c in colors if not re.fullmatch(r'#[0-9a-f]{6}', c)]
+    candidates = sorted((c for c in colors if c not in outliers), key=lambda c: (-uses(c), c))
+
+    # Greedy clustering, every color joins the first cluster whose most used color is close enough
+    clusters = [] # (representative lab, [colors])
+    for color in candidates:
+        lab = hex_to_lab(color)
+        for representative, members in clusters:
+            if math.dist(lab, representative) <= AUTO_COLOR_MAX_DELTA_E:
+                members.append(color)
+                break
+        else:
+            clusters.append((lab, [color]))
+
+    def role_key(cluster):
+        members = cluster[1]
+        icons = max(family_usage.get(c, {}).get('icons', 0) for c in members)
+        fills = sum(family_usage.get(c, {}).get('fill', 0) for c in members)
+        strokes = sum(family_usage.get(c, {}).get('stroke', 0) for c in members)
+        return (-icons, strokes > fills, -(fills + strokes), members[0])
+
+    free_slots = [slot for slot in range(1, MAX_TEMPLATE_COLORS + 1) if slot not in reserved_slots]
+    assigned = {}
+    for index, (_, members) in enumerate(sorted(clusters, key=role_key)):
+        if index >= len(free_slots):
+            outliers.extend(members)
+            continue
+        for color in members:
+            assigned[color] = free_slots[index]
+        merged = f" (merged {', '.join(members[1:])})" if len(members) > 1 else ""
+        print(f"  Auto: '{members[0]}'{merged} -> TemplateColor{free_slots[index]}")
+    return assigned, outliers
+
+def resolve_color_choices(colors, family_usage, profile_choices=None, auto=False, prompt=True):
+    """Decides the template number of every color of one icon family.
+
+    Profile entries win, --auto-colors clusters the rest, and only what is left (outliers, or everything when
+    neither is used) is asked for. Without prompting, left over colors are an error unless auto mode keeps them.
+    """
+    profile_choices = profile_choices or {}
+    choices = {color: profile_choices[color] for color in colors if color in profile_choices}
+    remaining = [color for color in colors if color not in choices]
+
+    if remaining and auto:
+        assigned, remaining = auto_assign_colors(remaining, family_usage, set(choices.values()) - {0})
+        choices.update(assigned)
+        if remaining and not prompt:
+            for color in remaining:
+                print(f"  Auto: outlier '{color}' keeps its own color")
+                choices[color] = 0
+            remaining = []
+
+    if remaining:
+        if not prompt:
+            raise ValueError(f"No color mapping for: {', '.join(remaining)}")
+        choices.update(prompt_color_choices(remaining))
+    return {color: choices[color] for color in colors}
+
 # UPDATED: build_interactive_color_map
 def build_interactive_color_map(colors_to_map):
     """Interactively asks the user to map detected colors."""
-    dynamic_color_map = {}
+    return build_color_map(prompt_color_choices(colors_to_map), quiet=True)
+
+def prompt_color_choices(colors_to_map):
+    """Interactively asks the user for the template number of every color."""
+    choices = {}
     print("\n--- Interactive Color Mapping ---")
     # UPDATED: Instructions reflect new range and no skip option
     print(f"Enter a number (1-{MAX_TEMPLATE_COLORS}) to map to the corresponding TemplateColor.")
@@ -98,7 +1426,7 @@ def build_interactive_color_map(colors_to_map):
 
     if not colors_to_map:
         print("No colors found to map.")
-        return {}
+        return choices
 
     for color in colors_to_map:
         while True:
@@ -107,30 +1435,20 @@ def build_interactive_color_map(colors_to_map):
 
             # REMOVED: Skip ('s') option
             # if user_input == 's':
-            #     dynamic_color_map[color] = DEFAULT_UNMAPPED_BRUSH # Map to default Brush *value*
+            #     choices[color] = DEFAULT_UNMAPPED_BRUSH # Map to default Brush *value*
             #     print(f"  Mapping '{color}' -> {DEFAULT_UNMAPPED_BRUSH}")
             #     break
 
             if user_input == '0':
-                if color.startswith('#'):
-                    dynamic_color_map[color] = color.upper() # Keep original hex
-                    print(f"  Keeping '{color}' -> {color.upper()}")
-                else:
-                    # Keeping named colors directly can be less reliable than hex.
-                    # Map named colors kept via '0' to the default brush for safety.
-                    # If you trust your named colors (like 'white', 'black'), you could try:
-                    # dynamic_color_map[color] = color.capitalize()
-                    print(f"  Warning: Keeping named color '{color}' directly might not work reliably.")
-                    print(f"  Mapping '{color}' (requested keep) -> {DEFAULT_UNMAPPED_BRUSH}")
-                    dynamic_color_map[color] = DEFAULT_UNMAPPED_BRUSH
+                choices[color] = 0
+                map_color_choice(color, 0) # Confirms the choice
                 break
             elif user_input.isdigit():
                 template_num = int(user_input)
                 # UPDATED: Check range 1 to MAX_TEMPLATE_COLORS
                 if 1 <= template_num <= MAX_TEMPLATE_COLORS:
-                    avalonia_resource = f"{{StaticResource TemplateColor{template_num}}}"
-                    dynamic_color_map[color] = avalonia_resource
-                    print(f"  Mapping '{color}' -> TemplateColor{template_num}")
+                    choices[color] = template_num
+                    map_color_choice(color, template_num) # Confirms the choice
                     break
                 else:
                     # UPDATED: Error message reflects new range
@@ -141,7 +1459,7 @@ def build_interactive_color_map(colors_to_map):
 
     print("---------------------------------")
     print("Color mapping complete.")
-    return dynamic_color_map
+    return choices
 
 def get_avalonia_brush_attribute(svg_color, color_map):
     """Gets the Avalonia Brush attribute string based on the dynamic mapping."""
@@ -163,113 +1481,50 @@ def get_avalonia_brush_attribute(svg_color, color_map):
         return f'Brush="{DEFAULT_UNMAPPED_BRUSH}"'
 
 
-# --- Core XAML Generation Function ---
-# Needs to accept the dynamic_color_map
-def generate_xaml_for_svg(svg_path, output_key, dynamic_color_map):
-    """Parses an SVG and generates the Avalonia DrawingImage XAML using the dynamic map."""
-    try:
-        namespaces = {'svg': 'http://www.w3.org/2000/svg'}
-        ET.register_namespace('', namespaces['svg'])
-        tree = ET.parse(svg_path)
-        root = tree.getroot()
-    except ET.ParseError as e:
-        print(f"Error parsing SVG file {svg_path}: {e}")
-        return None
-    except FileNotFoundError:
-        print(f"Error: SVG file not found at {svg_path}")
-        return None
+def apply_brush_opacity(brush, opacity, svg_path):
+    """Bakes an opacity below 1 into a literal hex brush as #AARRGGBB.
 
-    geometry_drawings = []
-    # Combine search for different element types if needed (paths are most common)
-    elements_to_process = root.findall('.//svg:path[@d]', namespaces)
-    if not elements_to_process:
-         elements_to_process = root.findall('.//path[@d]') # Try without namespace if needed
-
-    # --- Add other shapes if necessary ---
-    # elements_to_process.extend(root.findall('.//svg:rect', namespaces))
-    # elements_to_process.extend(root.findall('.//svg:circle', namespaces))
-    # ... you'd need to adapt geometry extraction for these ...
-
-    if not elements_to_process:
-         # Allow processing even if no paths, in case other shapes are added later
-         # print(f"Warning: No <path> elements with 'd' attribute found in {svg_path}")
-         pass # Continue to check for other potential elements if logic were added
-
-    # --- Logic to handle other shapes (rect, circle, etc.) would go here ---
-    # Example for rect (needs x, y, width, height extraction)
-    # rects = root.findall('.//svg:rect', namespaces)
-    # if not rects: rects = root.findall('.//rect')
-    # elements_to_process.extend(rects)
-    #
-    # circles = root.findall('.//svg:circle', namespaces)
-    # if not circles: circles = root.findall('.//circle')
-    # elements_to_process.extend(circles)
-    # --- End Example ---
-
-    if not elements_to_process:
-         print(f"Warning: No processable geometry elements (path, rect, circle, etc.) found in {svg_path}")
-         return None # Return None if absolutely nothing was found
+    Template colors and named colors can not carry it, they are drawn opaque with a warning.
+    """
+    if brush is None or opacity >= 1.0:
+        return brush
+    hex_match = re.fullmatch(r'#([0-9a-fA-F]{6})', brush)
+    if hex_match:
+        return f"#{round(opacity * 255):02x}{hex_match.group(1)}"
+    print(f"Warning: Opacity {opacity:g} in {svg_path} can not be baked into brush '{brush}', it is drawn opaque.")
+    return brush
 
-    indent = "            " # 12 spaces
+# --- Core XAML Generation Functions ---
+def build_drawings(document, dynamic_color_map, options=None):
+    """Turns the shapes of a parsed SVG document into drawing records (geometry, brush, pen brush, thickness)."""
+    options = options or DEFAULT_OPTIONS
+    svg_path = document['source']
+    drawings = []
 
-    for element in elements_to_process:
-        geometry_attribute = None
+    for shape in document['shapes']:
         # --- Geometry Extraction ---
-        tag_name = element.tag.split('}')[-1] # Get tag name without namespace
-
-        if tag_name == 'path':
-            path_data = element.get('d')
-            if not path_data: continue
-            path_data = re.sub(r'\s+', ' ', path_data).strip()
-            path_data_xaml = path_data.replace('"', '"') # Use XML entity for quotes in data
-            geometry_attribute = f'Geometry="{path_data_xaml}"'
-
-        # --- Add logic here to extract geometry for other shapes if needed ---
-        # elif tag_name == 'rect':
-        #     try:
-        #         x = float(element.get('x', 0))
-        #         y = float(element.get('y', 0))
-        #         w = float(element.get('width'))
-        #         h = float(element.get('height'))
-        #         # Basic RectangleGeometry - Avalonia might prefer Path syntax for complex transforms
-        #         geometry_attribute = f'Geometry="M{x},{y} L{x+w},{y} L{x+w},{y+h} L{x},{y+h} Z"'
-        #     except (ValueError, TypeError, AttributeError) as e:
-        #          print(f"Warning: Skipping rect in {svg_path} due to invalid attributes: {e}")
-        #          continue
-        # elif tag_name == 'circle':
-        #      try:
-        #         cx = float(element.get('cx'))
-        #         cy = float(element.get('cy'))
-        #         r = float(element.get('r'))
-        #         if r <= 0: continue # Skip circles with no radius
-        #         # EllipseGeometry for circle
-        #         geometry_attribute = f'Geometry="M{cx-r},{cy} A{r},{r} 0 1 0 {cx+r},{cy} A{r},{r} 0 1 0 {cx-r},{cy} Z"'
-        #      except (ValueError, TypeError, AttributeError) as e:
-        #           print(f"Warning: Skipping circle in {svg_path} due to invalid attributes: {e}")
-        #           continue
-        # Add elif for ellipse, polygon, polyline etc. if required
-
-        else:
-            # Only warn if it's an element we *might* have expected (like if we added rect logic but it failed)
-            # Or just ignore unknown elements silently. Let's ignore for now.
-            # print(f"Warning: Skipping unsupported element type '{tag_name}' in {svg_path}")
-             continue
-
-        if not geometry_attribute: # Skip if geometry couldn't be extracted
+        if shape['tag'] != 'path' or not shape['d']:
             continue
+        geometry = shape['d']
+        if options['minify_paths']:
+            try:
+                geometry = minify_path_data(geometry, options['precision'])
+            except ValueError as e:
+                print(f"Warning: Could not minify path data in {svg_path}, keeping it as-is: {e}")
 
-        # --- Style Extraction (Handles fill, stroke, stroke-width from attributes) ---
-        # TODO: Add parsing for 'style' attribute if needed (more complex)
-        fill_color = element.get('fill')
-        stroke_color = element.get('stroke')
-        stroke_width = element.get('stroke-width')
+        # --- Style Extraction (fill, stroke and stroke-width are resolved from attributes, style and groups) ---
+        fill_color = shape['fill']
+        stroke_color = shape['stroke']
+        stroke_width = shape['stroke_width']
 
         # Get Fill Brush
         brush_attribute = get_avalonia_brush_attribute(fill_color, dynamic_color_map)
-        brush_attribute_spaced = f" {brush_attribute}" if brush_attribute else ""
+        brush = brush_attribute.split('=', 1)[1].strip('"') if brush_attribute else None
+        brush = apply_brush_opacity(brush, shape.get('fill_opacity', 1.0), svg_path)
 
         # Get Pen (Stroke)
-        pen_xaml = ""
+        pen_brush = None
+        thickness = None
         normalized_stroke = normalize_color(stroke_color)
         if normalized_stroke and normalized_stroke != 'none' and stroke_width:
             try:
@@ -282,15 +1537,40 @@ def generate_xaml_for_svg(svg_path, output_key, dynamic_color_map):
             pen_brush_attribute = get_avalonia_brush_attribute(stroke_color, dynamic_color_map)
 
             if pen_brush_attribute:
-                pen_brush_value = pen_brush_attribute.split('=', 1)[1].strip('"')
-                pen_xaml = f"""
-{indent}    <GeometryDrawing.Pen>
-{indent}        <Pen Thickness="{thickness}" Brush="{pen_brush_value}"/>
-{indent}    </GeometryDrawing.Pen>"""
+                pen_brush = pen_brush_attribute.split('=', 1)[1].strip('"')
+                pen_brush = apply_brush_opacity(pen_brush, shape.get('stroke_opacity', 1.0), svg_path)
             else:
                  # This shouldn't happen easily without the 'skip' option, but good fallback.
                  print(f"Warning: Could not determine Pen brush for stroke '{stroke_color}' in {svg_path}. Stroke ignored.")
+                 thickness = None
+
+        drawings.append({'geometry': geometry, 'brush': brush, 'pen_brush': pen_brush, 'thickness': thickness})
+
+    return drawings
+
+def render_drawing_image(output_key, drawings, geometry_keys=None):
+    """Renders drawing records as an Avalonia DrawingImage XAML fragment.
+
+    Geometries found in geometry_keys (path data -> resource key) are referenced instead of inlined.
+    """
+    indent = "            " # 12 spaces
+    geometry_drawings = []
 
+    for drawing in drawings:
+        brush_attribute_spaced = f' Brush="{drawing["brush"]}"' if drawing['brush'] else ""
+        resource_key = geometry_keys.get(drawing['geometry']) if geometry_keys else None
+        if resource_key:
+            geometry_attribute = f'Geometry="{{StaticResource {resource_key}}}"'
+        else:
+            path_data_xaml = drawing['geometry'].replace('"', '&quot;') # Use XML entity for quotes in data
+            geometry_attribute = f'Geometry="{path_data_xaml}"'
+
+        pen_xaml = ""
+        if drawing['pen_brush']:
+            pen_xaml = f"""
+{indent}    <GeometryDrawing.Pen>
+{indent}        <Pen Thickness="{drawing['thickness']}" Brush="{drawing['pen_brush']}"/>
+{indent}    </GeometryDrawing.Pen>"""
 
         # Assemble Drawing XAML
         drawing_xaml = f"""
@@ -299,10 +1579,6 @@ def generate_xaml_for_svg(svg_path, output_key, dynamic_color_map):
 {indent}</GeometryDrawing>"""
         geometry_drawings.append(drawing_xaml)
 
-    if not geometry_drawings:
-        print(f"Warning: No drawable geometry found or converted for {svg_path}")
-        return None
-
     # Assemble the final DrawingImage
     xaml_template = f"""
     <DrawingImage x:Key="{output_key}">
@@ -311,6 +1587,29 @@ def generate_xaml_for_svg(svg_path, output_key, dynamic_color_map):
     </DrawingImage>"""
     return xaml_template
 
+def generate_drawings_for_svg(document, dynamic_color_map, options=None):
+    """Generates the (optimized) drawing records of a parsed SVG document, or None if there is nothing to draw."""
+    svg_path = document['source']
+    if not document['shapes']:
+         print(f"Warning: No processable geometry elements (path, rect, circle, etc.) found in {svg_path}")
+         return None # Return None if absolutely nothing was found
+
+    options = options or DEFAULT_OPTIONS
+    drawings = build_drawings(document, dynamic_color_map, options)
+    if not drawings:
+        print(f"Warning: No drawable geometry found or converted for {svg_path}")
+        return None
+    if options['merge_drawings']:
+        drawings = merge_drawings(drawings, svg_path)
+    return drawings
+
+def generate_xaml_for_svg(document, output_key, dynamic_color_map, options=None):
+    """Generates the Avalonia DrawingImage XAML for a parsed SVG document using the dynamic map."""
+    drawings = generate_drawings_for_svg(document, dynamic_color_map, options)
+    if drawings is None:
+        return None
+    return render_drawing_image(output_key, drawings)
+
 
 # --- Helper Function (sanitize_key - unchanged) ---
 def sanitize_key(filename):
@@ -366,83 +1665,1838 @@ def generate_preview_xaml(resource_keys):
 """
     return preview_xaml
 
-# --- Main Execution ---
-if __name__ == "__main__":
+# --- Geometry Deduplication ---
+# Mii parts repeat the same outlines (face fill, face border, ...) in dozens of icons. Each inlined Geometry
+# string is parsed into its own StreamGeometry when the dictionary loads, so a repeated outline is emitted
+# once as a keyed StreamGeometry resource and every GeometryDrawing references it with StaticResource.
+def geometry_identity(geometry):
+    """Normalized path data, equal for the same outline regardless of number formatting or relative commands."""
+    try:
+        segments = path_tokens_to_absolute(tokenize_path_data(geometry))
+        return serialize_path_segments(segments, GEOMETRY_IDENTITY_PRECISION)
+    except ValueError:
+        return " ".join(geometry.split())
 
+def count_path_nodes(geometry):
+    """Number of path segments the geometry parser creates for this path data."""
+    try:
+        return len(path_tokens_to_absolute(tokenize_path_data(geometry)))
+    except ValueError:
+        return 0
+
+def render_geometry_resource(resource_key, geometry):
+    """Renders one shared geometry as a keyed StreamGeometry resource."""
+    return f'    <StreamGeometry x:Key="{resource_key}">{geometry}</StreamGeometry>'
+
+def plan_geometry_dedup(folder_entries):
+    """Finds the geometries worth sharing across the (folder key, folder name, [(key, drawings, fragment)]) of a batch.
+
+    A geometry is only shared when the references plus its resource are shorter than inlining it everywhere.
+    Geometries of one folder belong in that folder, geometries used by several folders in the shared dictionary.
+    Returns {'keys': {folder key: {path data: resource key}}, 'resources': {folder key or None: [(key, path data)]},
+    'shared': count, 'uses': count, 'saved_bytes': count, 'saved_nodes': count}.
+    """
+    folder_names = {folder: folder_name for folder, folder_name, _ in folder_entries}
+    usages = OrderedDict() # identity -> {'geometry': first path data, 'variants': set, 'folders': [], 'uses': n}
+    for folder, _, entries in folder_entries:
+        for _, drawings, _ in entries:
+            for drawing in drawings:
+                identity = geometry_identity(drawing['geometry'])
+                usage = usages.setdefault(identity, {'geometry': drawing['geometry'], 'variants': set(),
+                                                     'folders': [], 'uses': 0})
+                usage['variants'].add(drawing['geometry'])
+                usage['uses'] += 1
+                if folder not in usage['folders']:
+                    usage['folders'].append(folder)
+
+    plan = {'keys': {folder: {} for folder in folder_names}, 'resources': {},
+            'shared': 0, 'uses': 0, 'saved_bytes': 0, 'saved_nodes': 0}
+    for identity, usage in usages.items():
+        if usage['uses'] < 2:
+            continue
+        owner = usage['folders'][0] if len(usage['folders']) == 1 else None
+        prefix = folder_names[owner] if owner else 'Shared'
+        resource_key = f"{prefix}Geometry_{hashlib.sha1(identity.encode('utf-8')).hexdigest()[:10]}"
+        inline_length = len(usage['geometry'].replace('"', '&quot;'))
+        reference_length = len(f"{{StaticResource {resource_key}}}")
+        saved_bytes = (usage['uses'] * (inline_length - reference_length)
+                       - len(render_geometry_resource(resource_key, usage['geometry'])) - 1)
+        if saved_bytes <= 0:
+            continue
+        for folder in usage['folders']:
+            plan['keys'][folder].update((variant, resource_key) for variant in usage['variants'])
+        plan['resources'].setdefault(owner, []).append((resource_key, usage['geometry']))
+        plan['shared'] += 1
+        plan['uses'] += usage['uses']
+        plan['saved_bytes'] += saved_bytes
+        plan['saved_nodes'] += (usage['uses'] - 1) * count_path_nodes(usage['geometry'])
+    return plan
+
+def referenced_shared_geometry(shared_path, batch_paths):
+    """Returns the [(key, path data)] of the existing shared geometry dictionary that other dictionaries still need.
+
+    Dictionaries next to it that are not in batch_paths (e.g. folders deduplicated by an earlier run with another
+    set of folders) keep referencing it, so rewriting the shared dictionary has to keep their geometries.
+    """
+    if not os.path.exists(shared_path):
+        return []
+    try:
+        geometries = read_generated_dictionary(shared_path)[1]
+        referenced = set()
+        output_dir = os.path.dirname(shared_path)
+        for name in sorted(os.listdir(output_dir)):
+            path = os.path.join(output_dir, name)
+            if name.endswith('.axaml') and name != SHARED_GEOMETRY_FILE_NAME and os.path.normpath(path) not in batch_paths:
+                with open(path, encoding='utf-8') as f:
+                    referenced.update(_RESOURCE_REFERENCE_RE.findall(f.read()))
+    except (OSError, ET.ParseError) as e:
+        print(f"Warning: Could not read the existing {shared_path}: {e}")
+        return []
+    return [(key, geometry) for key, geometry in geometries.items() if key in referenced]
+
+def build_geometry_dictionary(description, resources):
+    """Assembles a ResourceDictionary holding only StreamGeometry resources."""
+    joined_resources = "\n".join(render_geometry_resource(key, geometry) for key, geometry in resources)
+    return f"""<ResourceDictionary xmlns="https://github.com/avaloniaui"
+                    xmlns:x="http://schemas.microsoft.com/winfx/2006/xaml">
+
+    <!-- Generated by svg_to_avalonia.py: {description} -->
+{joined_resources}
+</ResourceDictionary>
+"""
+
+# --- Binary Icon Pack ---
+# Layout (little-endian):
+#   header    magic "WWIP", version, reserved, key/drawing/string/brush counts, offsets of the four sections below
+#   brushes   per brush:  u16 byte length + UTF-8 brush value as written in the XAML (e.g. "{StaticResource TemplateColor1}")
+#   strings   (count + 1) u32 offsets into the blob that follows them, then the deduplicated UTF-8 path data blob
+#   keys      per icon:   u16 byte length + UTF-8 key, u32 index of its first drawing, u32 drawing count (dictionary order)
+#   drawings  per drawing: u32 path string index, u16 fill brush index, u16 pen brush index, f64 pen thickness
+# Brush index 0xFFFF means no brush/pen, the thickness is NaN without a pen.
+ICON_PACK_MAGIC = b"WWIP"
+ICON_PACK_VERSION = 1
+ICON_PACK_NO_BRUSH = 0xFFFF
+_PACK_HEADER = struct.Struct('<4sHHIIIIIIII')
+_PACK_DRAWING = struct.Struct('<IHHd')
+_PACK_U16 = struct.Struct('<H')
+_PACK_U32 = struct.Struct('<I')
+_PACK_KEY_RANGE = struct.Struct('<II')
+
+def build_icon_pack(entries):
+    """Encodes (key, drawing records) entries as a binary icon pack."""
+    strings = {}
+    brushes = {}
+    drawing_records = []
+    key_records = []
+
+    def brush_index(brush):
+        if not brush:
+            return ICON_PACK_NO_BRUSH
+        if brush not in brushes:
+            if len(brushes) >= ICON_PACK_NO_BRUSH:
+                raise ValueError("Too many distinct brushes for an icon pack")
+            brushes[brush] = len(brushes)
+        return brushes[brush]
+
+    for key, drawings in entries:
+        key_records.append((key, len(drawing_records), len(drawings)))
+        for drawing in drawings:
+            string_index = strings.setdefault(drawing['geometry'], len(strings))
+            thickness = drawing['thickness'] if drawing['pen_brush'] else float('nan')
+            drawing_records.append(_PACK_DRAWING.pack(string_index, brush_index(drawing['brush']),
+                                                      brush_index(drawing['pen_brush']), thickness))
+
+    brush_section = b"".join(_PACK_U16.pack(len(data)) + data for data in (b.encode('utf-8') for b in brushes))
+    string_blobs = [s.encode('utf-8') for s in strings]
+    string_offsets = [0]
+    for blob in string_blobs:
+        string_offsets.append(string_offsets[-1] + len(blob))
+    string_section = b"".join(_PACK_U32.pack(offset) for offset in string_offsets) + b"".join(string_blobs)
+    key_section = b"".join(_PACK_U16.pack(len(data)) + data + _PACK_KEY_RANGE.pack(first, count)
+                           for data, first, count in ((k.encode('utf-8'), f, c) for k, f, c in key_records))
+    drawing_section = b"".join(drawing_records)
+
+    brushes_offset = _PACK_HEADER.size
+    strings_offset = brushes_offset + len(brush_section)
+    keys_offset = strings_offset + len(string_section)
+    drawings_offset = keys_offset + len(key_section)
+    header = _PACK_HEADER.pack(ICON_PACK_MAGIC, ICON_PACK_VERSION, 0, len(key_records), len(drawing_records),
+                               len(strings), len(brushes), brushes_offset, strings_offset, keys_offset, drawings_offset)
+    return header + brush_section + string_section + key_section + drawing_section
+
+class IconPackReader:
+    """Memory-maps a binary icon pack and decodes icons lazily, by key."""
+
+    def __init__(self, pack_path):
+        self._file = open(pack_path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{pack_path} is empty, not an icon pack")
+        try:
+            self._read_index(pack_path)
+        except (struct.error, UnicodeDecodeError) as e:
+            self.close()
+            raise ValueError(f"{pack_path} is truncated or damaged: {e}")
+        except ValueError:
+            self.close()
+            raise
+
+    def _read_index(self, pack_path):
+        """Reads the header, the brush table and the key index, raising ValueError if they do not fit the file."""
+        if len(self._data) < _PACK_HEADER.size:
+            raise ValueError(f"{pack_path} is too short for an icon pack header")
+        (magic, version, _, key_count, self._drawing_count, self._string_count, brush_count, brushes_offset,
+         self._strings_offset, keys_offset, self._drawings_offset) = _PACK_HEADER.unpack_from(self._data, 0)
+        if magic != ICON_PACK_MAGIC or version != ICON_PACK_VERSION:
+            raise ValueError(f"{pack_path} is not a version {ICON_PACK_VERSION} icon pack")
+        if self._drawings_offset + self._drawing_count * _PACK_DRAWING.size > len(self._data):
+            raise ValueError(f"{pack_path} is truncated: its drawings end past the end of the file")
+
+        # Only the brush table and the key index are read up front, path data is decoded on demand
+        self._brushes = []
+        position = brushes_offset
+        for _ in range(brush_count):
+            (length,) = _PACK_U16.unpack_from(self._data, position)
+            self._brushes.append(self._data[position + 2:position + 2 + length].decode('utf-8'))
+            position += 2 + length
+
+        self._keys = {}
+        position = keys_offset
+        for _ in range(key_count):
+            (length,) = _PACK_U16.unpack_from(self._data, position)
+            key = self._data[position + 2:position + 2 + length].decode('utf-8')
+            first, count = self._keys[key] = _PACK_KEY_RANGE.unpack_from(self._data, position + 2 + length)
+            if first + count > self._drawing_count:
+                raise ValueError(f"{pack_path}: icon {key} refers to drawings past the end of the drawing table")
+            position += 2 + length + _PACK_KEY_RANGE.size
+        self._string_blob_offset = self._strings_offset + (self._string_count + 1) * _PACK_U32.size
+
+    def keys(self):
+        """Returns the icon keys in dictionary order."""
+        return list(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def _read_string(self, index):
+        start, end = struct.unpack_from('<II', self._data, self._strings_offset + index * _PACK_U32.size)
+        return self._data[self._string_blob_offset + start:self._string_blob_offset + end].decode('utf-8')
+
+    def get_drawings(self, key):
+        """Returns the drawing records of one icon, in the same form build_drawings produces them."""
+        first, count = self._keys[key]
+        drawings = []
+        for index in range(first, first + count):
+            string_index, brush, pen_brush, thickness = _PACK_DRAWING.unpack_from(
+                self._data, self._drawings_offset + index * _PACK_DRAWING.size)
+            has_pen = pen_brush != ICON_PACK_NO_BRUSH
+            if (string_index >= self._string_count
+                    or any(b != ICON_PACK_NO_BRUSH and b >= len(self._brushes) for b in (brush, pen_brush))):
+                raise ValueError(f"Drawing {index} of icon {key} refers to a missing string or brush")
+            drawings.append({
+                'geometry': self._read_string(string_index),
+                'brush': self._brushes[brush] if brush != ICON_PACK_NO_BRUSH else None,
+                'pen_brush': self._brushes[pen_brush] if has_pen else None,
+                'thickness': thickness if has_pen else None,
+            })
+        return drawings
+
+    def get_xaml(self, key):
+        """Renders one icon as the DrawingImage XAML fragment the .axaml output contains."""
+        return render_drawing_image(key, self.get_drawings(key))
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def verify_icon_pack(pack_path, dictionary_paths):
+    """Round-trip check: reads the pack and the written dictionaries back and compares the drawings of every icon.
+
+    dictionary_paths are the written .axaml files in key order, plus any geometry dictionaries they reference.
+    Returns a list of problems, empty when the pack holds exactly what the XAML output draws.
+    """
+    geometries = {}
+    images = OrderedDict()
+    for dictionary_path in dictionary_paths:
+        try:
+            _, dictionary_geometries, dictionary_images = read_generated_dictionary(dictionary_path)
+        except (OSError, ET.ParseError) as e:
+            return [f"{dictionary_path} can not be read back: {e}"]
+        geometries.update(dictionary_geometries)
+        images.update(dictionary_images)
+
+    problems = []
+    try:
+        reader = IconPackReader(pack_path)
+    except (OSError, ValueError) as e:
+        return [str(e)]
+    def comparable(drawings):
+        # A shared geometry resource holds the first of the variants written for that outline
+        return [dict(drawing, geometry=geometry_identity(drawing['geometry'])) for drawing in drawings]
+
+    with reader:
+        if reader.keys() != list(images):
+            problems.append("Key order differs from the XAML output")
+        for key, drawings in images.items():
+            if key not in reader:
+                problems.append(f"Missing key {key}")
+            elif comparable(reader.get_drawings(key)) != comparable(resolve_geometry_references(drawings, geometries)):
+                problems.append(f"Icon {key} differs from the XAML output")
+    return problems
+
+# --- Icon Rasterizer ---
+# A small scanline rasterizer for drawing records, so list and grid views can blit pre-rendered thumbnails.
+# Curves and arcs are flattened to polygons, each sub-scanline adds exact horizontal span coverage.
+RASTER_SUBSAMPLES = 4 # Sub-scanlines per pixel row (vertical anti-aliasing)
+RASTER_TOLERANCE = 0.2 # Maximum distance in pixels between a curve and its flattened polygon
+_TEMPLATE_BRUSH_RE = re.compile(r'\{(?:Static|Dynamic)Resource TemplateColor(\d+)\}')
+
+def _curve_steps(distance, tolerance):
+    return max(1, min(100, math.ceil(math.sqrt(distance / tolerance)))) if distance > 0 else 1
+
+def _arc_points(x0, y0, rx, ry, rotation, large_arc, sweep, x1, y1, tolerance):
+    """Flattens an SVG endpoint arc into points (without the start point)."""
+    center = arc_center_parameters(x0, y0, rx, ry, rotation, large_arc, sweep, x1, y1)
+    if center is None:
+        return [(x1, y1)]
+    start, delta = center[6], center[7]
+    radius = max(center[2], center[3])
+    step = 2 * math.acos(max(-1.0, 1 - tolerance / radius)) if radius > tolerance else math.pi / 2
+    count = max(1, min(200, math.ceil(abs(delta) / step)))
+    points = [_ellipse_point(center, start + delta * index / count) for index in range(1, count + 1)]
+    points[-1] = (x1, y1)
+    return points
+
+def flatten_path_data(path_data, tolerance):
+    """Flattens path data into polylines: a list of (points, closed) per sub path."""
+    subpaths = []
+    points = None
+    x = y = 0.0
+    last_control = None # (command family, reflected control point source)
+    for segment in path_tokens_to_absolute(tokenize_path_data(path_data)):
+        command = segment[0]
+        if command == 'M':
+            x, y = segment[1:3]
+            points = [(x, y)]
+            subpaths.append([points, False])
+            last_control = None
+            continue
+        if points is None: # Path data without a leading move starts at the origin
+            points = [(x, y)]
+            subpaths.append([points, False])
+        if command == 'Z':
+            subpaths[-1][1] = True
+            x, y = points[0]
+            points = [(x, y)]
+            subpaths.append([points, False])
+            last_control = None
+            continue
+
+        if command == 'L':
+            points.append(segment[1:3])
+            control = None
+        elif command in ('C', 'S'):
+            if command == 'C':
+                x1, y1, x2, y2, end_x, end_y = segment[1:]
+            else:
+                x2, y2, end_x, end_y = segment[1:]
+                x1, y1 = (2 * x - last_control[1][0], 2 * y - last_control[1][1]) if last_control and last_control[0] == 'C' else (x, y)
+            distance = max(math.hypot(x - 2 * x1 + x2, y - 2 * y1 + y2), math.hypot(x1 - 2 * x2 + end_x, y1 - 2 * y2 + end_y))
+            steps = _curve_steps(0.75 * distance, tolerance)
+            for index in range(1, steps + 1):
+                t = index / steps
+                mt = 1 - t
+                points.append((mt * mt * mt * x + 3 * mt * mt * t * x1 + 3 * mt * t * t * x2 + t * t * t * end_x,
+                               mt * mt * mt * y + 3 * mt * mt * t * y1 + 3 * mt * t * t * y2 + t * t * t * end_y))
+            control = ('C', (x2, y2))
+        elif command in ('Q', 'T'):
+            if command == 'Q':
+                x1, y1, end_x, end_y = segment[1:]
+            else:
+                end_x, end_y = segment[1:]
+                x1, y1 = (2 * x - last_control[1][0], 2 * y - last_control[1][1]) if last_control and last_control[0] == 'Q' else (x, y)
+            steps = _curve_steps(0.25 * math.hypot(x - 2 * x1 + end_x, y - 2 * y1 + end_y), tolerance)
+            for index in range(1, steps + 1):
+                t = index / steps
+                mt = 1 - t
+                points.append((mt * mt * x + 2 * mt * t * x1 + t * t * end_x, mt * mt * y + 2 * mt * t * y1 + t * t * end_y))
+            control = ('Q', (x1, y1))
+        else: # A
+            points.extend(_arc_points(x, y, *segment[1:], tolerance))
+            control = None
+        x, y = points[-1]
+        last_control = control
+    return [(subpath_points, closed) for subpath_points, closed in subpaths if len(subpath_points) > 1]
+
+def _stroke_polygons(subpaths, thickness):
+    """Outlines stroked polylines as counter-clockwise quads plus round joins, filled with the nonzero rule."""
+    half = thickness / 2
+    join_sides = 12
+    polygons = []
+    for points, closed in subpaths:
+        segments = list(zip(points, points[1:] + points[:1])) if closed else list(zip(points, points[1:]))
+        for (x0, y0), (x1, y1) in segments:
+            length = math.hypot(x1 - x0, y1 - y0)
+            if length == 0:
+                continue
+            nx, ny = -(y1 - y0) / length * half, (x1 - x0) / length * half
+            polygons.append([(x0 + nx, y0 + ny), (x1 + nx, y1 + ny), (x1 - nx, y1 - ny), (x0 - nx, y0 - ny)])
+        joints = points if closed else points[1:-1]
+        for jx, jy in joints:
+            polygons.append([(jx + half * math.cos(2 * math.pi * i / join_sides), jy + half * math.sin(2 * math.pi * i / join_sides))
+                             for i in range(join_sides)])
+    for polygon in polygons: # Same orientation everywhere, so nonzero filling gives the union
+        area = sum(ax * by - bx * ay for (ax, ay), (bx, by) in zip(polygon, polygon[1:] + polygon[:1]))
+        if area < 0:
+            polygon.reverse()
+    return polygons
+
+def rasterize_polygons(polygons, width, height, nonzero=False):
+    """Returns the coverage (0..1) of every pixel of a width x height grid, row by row."""
+    edges = []
+    for polygon in polygons:
+        for (x0, y0), (x1, y1) in zip(polygon, polygon[1:] + polygon[:1]):
+            if y0 == y1:
+                continue
+            direction = 1
+            if y0 > y1:
+                x0, y0, x1, y1, direction = x1, y1, x0, y0, -1
+            edges.append((y0, y1, x0, (x1 - x0) / (y1 - y0), direction))
+    coverage = [0.0] * (width * height)
+    if not edges:
+        return coverage
+    edges.sort()
+    weight = 1.0 / RASTER_SUBSAMPLES
+    first_row = max(0, int(math.floor(edges[0][0])))
+    last_row = min(height, int(math.ceil(max(edge[1] for edge in edges))))
+    active = []
+    next_edge = 0
+    for row in range(first_row, last_row):
+        row_offset = row * width
+        for sub in range(RASTER_SUBSAMPLES):
+            scan_y = row + (sub + 0.5) * weight
+            while next_edge < len(edges) and edges[next_edge][0] <= scan_y:
+                active.append(edges[next_edge])
+                next_edge += 1
+            active = [edge for edge in active if edge[1] > scan_y]
+            if not active:
+                continue
+            crossings = sorted((x0 + (scan_y - y0) * slope, direction) for y0, _, x0, slope, direction in active)
+            winding = 0
+            for index in range(len(crossings) - 1):
+                winding += crossings[index][1]
+                if (winding != 0) if nonzero else (winding % 2 != 0):
+                    _add_span(coverage, row_offset, width, crossings[index][0], crossings[index + 1][0], weight)
+    return coverage
+
+def _add_span(coverage, row_offset, width, start, end, weight):
+    start, end = max(start, 0.0), min(end, float(width))
+    if end <= start:
+        return
+    first, last = int(start), int(end)
+    if first == last:
+        coverage[row_offset + first] += (end - start) * weight
+        return
+    coverage[row_offset + first] += (first + 1 - start) * weight
+    for column in range(first + 1, last):
+        coverage[row_offset + column] += weight
+    if last < width:
+        coverage[row_offset + last] += (end - last) * weight
+
+def parse_brush_color(brush, template_colors):
+    """Resolves a generated brush to (r, g, b, a) in 0..1, template colors come from template_colors (hex list)."""
+    if not brush:
+        return None
+    template_match = _TEMPLATE_BRUSH_RE.fullmatch(brush)
+    if template_match:
+        index = int(template_match.group(1)) - 1
+        brush = template_colors[index] if index < len(template_colors) else DEFAULT_UNMAPPED_BRUSH
+    color = NAMED_COLORS.get(brush.lower(), brush.lower())
+    if not re.fullmatch(r'#([0-9a-f]{3}|[0-9a-f]{6}|[0-9a-f]{8})', color):
+        raise ValueError(f"Can not rasterize brush '{brush}'")
+    digits = color[1:]
+    if len(digits) == 3:
+        digits = ''.join(digit * 2 for digit in digits)
+    if len(digits) == 6:
+        digits = 'ff' + digits
+    alpha, red, green, blue = (int(digits[i:i + 2], 16) / 255 for i in range(0, 8, 2))
+    return red, green, blue, alpha
+
+def flatten_drawings(drawings, tolerance):
+    """Flattens the geometry of every drawing record once: [(drawing, sub paths)]."""
+    return [(drawing, flatten_path_data(drawing['geometry'], tolerance)) for drawing in drawings]
+
+def flattened_bounds(flattened):
+    """Bounds (min x, min y, max x, max y) of flattened drawings including half their pen thickness, or None."""
+    bounds = None
+    for drawing, subpaths in flattened:
+        pad = drawing['thickness'] / 2 if drawing['pen_brush'] and drawing['thickness'] else 0.0
+        for points, _ in subpaths:
+            xs = [x for x, _ in points]
+            ys = [y for _, y in points]
+            box = (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+            bounds = box if bounds is None else (min(bounds[0], box[0]), min(bounds[1], box[1]),
+                                                 max(bounds[2], box[2]), max(bounds[3], box[3]))
+    return bounds
+
+def rasterize_drawings(drawings, size, template_colors, bounds=None):
+    """Renders drawing records into a size x size RGBA image (bytes), fitted uniformly and centered like an
+    Image with Stretch="Uniform" does with a DrawingImage (whose bounds are the drawing bounds).
+
+    Fills use the even-odd rule, Avalonia's default for path data without an F1 prefix.
+    """
+    # Flatten once in icon units, fine enough for the largest scale this icon can get
+    flattened = flatten_drawings(drawings, RASTER_TOLERANCE / size)
+    bounds = bounds or flattened_bounds(flattened)
+    premultiplied = [0.0] * (size * size * 4)
+    if bounds is None:
+        return bytes(size * size * 4)
+    box_width, box_height = bounds[2] - bounds[0], bounds[3] - bounds[1]
+    scale = size / max(box_width, box_height, 1e-9)
+    offset_x = (size - box_width * scale) / 2 - bounds[0] * scale
+    offset_y = (size - box_height * scale) / 2 - bounds[1] * scale
+
+    def to_pixels(points):
+        return [(x * scale + offset_x, y * scale + offset_y) for x, y in points]
+
+    for drawing, subpaths in flattened:
+        layers = []
+        fill = parse_brush_color(drawing['brush'], template_colors)
+        if fill:
+            layers.append((fill, rasterize_polygons([to_pixels(points) for points, _ in subpaths], size, size)))
+        pen = parse_brush_color(drawing['pen_brush'], template_colors) if drawing['thickness'] else None
+        if pen:
+            pixel_paths = [(to_pixels(points), closed) for points, closed in subpaths]
+            outline = _stroke_polygons(pixel_paths, drawing['thickness'] * scale)
+            layers.append((pen, rasterize_polygons(outline, size, size, nonzero=True)))
+        for (red, green, blue, alpha), coverage in layers:
+            for pixel, amount in enumerate(coverage):
+                if amount <= 0:
+                    continue
+                source_alpha = min(amount, 1.0) * alpha
+                keep = 1 - source_alpha
+                index = pixel * 4
+                premultiplied[index] = red * source_alpha + premultiplied[index] * keep
+                premultiplied[index + 1] = green * source_alpha + premultiplied[index + 1] * keep
+                premultiplied[index + 2] = blue * source_alpha + premultiplied[index + 2] * keep
+                premultiplied[index + 3] = source_alpha + premultiplied[index + 3] * keep
+
+    rgba = bytearray(size * size * 4)
+    for index in range(0, len(rgba), 4):
+        alpha = premultiplied[index + 3]
+        if alpha > 0:
+            rgba[index] = min(255, round(premultiplied[index] / alpha * 255))
+            rgba[index + 1] = min(255, round(premultiplied[index + 1] / alpha * 255))
+            rgba[index + 2] = min(255, round(premultiplied[index + 2] / alpha * 255))
+            rgba[index + 3] = min(255, round(alpha * 255))
+    return bytes(rgba)
+
+def encode_png(width, height, rgba):
+    """Encodes 8-bit RGBA pixels as a PNG file."""
+    def chunk(kind, payload):
+        return struct.pack('>I', len(payload)) + kind + payload + struct.pack('>I', zlib.crc32(kind + payload))
+
+    stride = width * 4
+    raw = b''.join(b'\x00' + rgba[row * stride:(row + 1) * stride] for row in range(height))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 9))
+            + chunk(b'IEND', b''))
+
+# --- Icon Atlas ---
+def atlas_template_colors(custom_colors=None):
+    """TemplateColor1..N used for rasterizing: the given colors, then the preview palette."""
+    custom_colors = list(custom_colors or [])
+    return custom_colors + ATLAS_TEMPLATE_COLORS[len(custom_colors):]
+
+def build_icon_atlases(tiles, size):
+    """Packs size x size tiles ([(key, rgba)]) into grid atlas pages.
+
+    Returns ([(page index, png bytes)], {key: (page index, x, y)}).
+    """
+    cell = size + ATLAS_PADDING
+    columns = max(1, min(len(tiles), (ATLAS_MAX_DIMENSION + ATLAS_PADDING) // cell))
+    rows_per_page = max(1, (ATLAS_MAX_DIMENSION + ATLAS_PADDING) // cell)
+    per_page = columns * rows_per_page
+    pages = []
+    placements = {}
+    for page_index, first in enumerate(range(0, len(tiles), per_page)):
+        page_tiles = tiles[first:first + per_page]
+        rows = math.ceil(len(page_tiles) / columns)
+        width, height = columns * cell - ATLAS_PADDING, rows * cell - ATLAS_PADDING
+        pixels = bytearray(width * height * 4)
+        for index, (key, rgba) in enumerate(page_tiles):
+            x, y = (index % columns) * cell, (index // columns) * cell
+            for row in range(size):
+                start = ((y + row) * width + x) * 4
+                pixels[start:start + size * 4] = rgba[row * size * 4:(row + 1) * size * 4]
+            placements[key] = (page_index, x, y)
+        pages.append((page_index, encode_png(width, height, bytes(pixels))))
+    return pages, placements
+
+def atlas_page_path(output_path, size, page_index):
+    """Returns the path of one atlas page, e.g. MiiHair_Atlas64_00.png for MiiHair.axaml."""
+    return f"{os.path.splitext(output_path)[0]}_Atlas{size}_{page_index:02d}.png"
+
+def _rasterize_icon_task(task):
+    """(drawings, sizes, template colors) -> {size: RGBA bytes}."""
+    drawings, sizes, template_colors = task
+    return {size: rasterize_drawings(drawings, size, template_colors) for size in sizes}
+
+# --- Output Assembly ---
+def list_svg_files(svg_folder):
+    """Returns the sorted SVG filenames of a folder (sorted to ensure consistent processing order)."""
+    return sorted(f for f in os.listdir(svg_folder) if f.lower().endswith('.svg'))
+
+def default_output_path(input_folder, output_dir=None):
+    """Returns '<folder name>.axaml' next to the input folder, or inside output_dir when given."""
+    folder_name = os.path.basename(os.path.normpath(input_folder))
+    if output_dir:
+        parent_dir = output_dir
+    else:
+        parent_dir = os.path.dirname(os.path.normpath(input_folder)) or '.' # Handle case where input is just folder name
+    return os.path.join(parent_dir, f"{folder_name}.axaml")
+
+def build_resource_dictionary(folder_name, xaml_outputs, resource_keys, mapping_note, include_preview=True,
+                              geometry_resources=None):
+    """Assembles the final ResourceDictionary from the generated DrawingImage fragments.
+
+    geometry_resources ([(key, path data)]) are written first, so the icons after them can reference them.
+    """
+    preview_block = generate_preview_xaml(resource_keys) if include_preview else ""
+    joined_icon_xaml = "\n".join(xaml_outputs)
+    if geometry_resources:
+        geometry_block = "\n".join(render_geometry_resource(key, geometry) for key, geometry in geometry_resources)
+        joined_icon_xaml = geometry_block + "\n" + joined_icon_xaml
+
+    return f"""<ResourceDictionary xmlns="https://github.com/avaloniaui"
+                    xmlns:x="http://schemas.microsoft.com/winfx/2006/xaml"
+                    xmlns:util="{PREVIEW_NAMESPACE_UTIL}">
+
+    <!-- Generated by svg_to_avalonia.py from folder: {folder_name} -->
+    <!-- {mapping_note} -->
+{preview_block}
+{joined_icon_xaml}
+</ResourceDictionary>
+"""
+
+def shard_output_path(output_path, shard_index):
+    """Returns the path of one shard dictionary, e.g. MiiHair_03.axaml for MiiHair.axaml."""
+    base, extension = os.path.splitext(output_path)
+    return f"{base}_{shard_index:02d}{extension}"
+
+def build_shard_manifest(folder_name, shard_size, shards, manifest_format, geometry_files=()):
+    """Builds the manifest mapping every key to its shard file, shards is a list of (file name, keys).
+
+    geometry_files ([(file name, geometry keys)]) lists the geometry dictionaries the shards reference,
+    they have to be loaded before any shard. The CSV format tells both apart with its type column ('geometry'
+    rows come first, then 'icon' rows), the JSON format with its separate 'geometry' map.
+    """
+    if manifest_format == 'csv':
+        rows = [(key, file_name, 'geometry') for file_name, keys in geometry_files for key in keys]
+        rows += [(key, file_name, 'icon') for file_name, keys in shards for key in keys]
+        return "\n".join(["key,shard,type"] + [",".join(row) for row in rows]) + "\n"
+
+    manifest = {
+        'folder': folder_name,
+        'shard_size': shard_size,
+        'shards': [{'file': file_name, 'keys': keys} for file_name, keys in shards],
+        'keys': {key: file_name for file_name, keys in shards for key in keys},
+    }
+    if geometry_files:
+        manifest['geometry_files'] = [file_name for file_name, _ in geometry_files]
+        manifest['geometry'] = {key: file_name for file_name, keys in geometry_files for key in keys}
+    return json.dumps(manifest, indent=2) + "\n"
+
+def replace_file_atomically(output_path, data):
+    """Writes data to a temporary file next to output_path and swaps it in, so readers (the previewer, a running
+    app) never see a half written file."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    temp_path = os.path.join(os.path.dirname(output_path), f".{os.path.basename(output_path)}.{os.getpid()}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, output_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def template_slot(brush):
+    """Returns N for a TemplateColorN brush, 0 for literal colors and no brush."""
+    match = _TEMPLATE_BRUSH_RE.fullmatch(brush) if brush else None
+    return int(match.group(1)) if match else 0
+
+def build_slot_index(folder_name, entries):
+    """Builds the template color slot index of a folder from its (key, drawings, fragment) entries.
+
+    For every icon it lists [fill slot, pen slot] per GeometryDrawing in DrawingGroup order (0 = not recolored)
+    and the slots the icon uses at all, so recoloring can index Color1..N directly instead of searching resources.
+    """
+    icons = OrderedDict()
+    for key, drawings, _ in entries:
+        slots = [[template_slot(drawing['brush']), template_slot(drawing['pen_brush'])] for drawing in drawings]
+        icons[key] = {
+            'drawings': slots,
+            'slots': sorted({slot for pair in slots for slot in pair if slot}),
+        }
+    index = {'folder': folder_name, 'format_version': 1, 'max_template_colors': MAX_TEMPLATE_COLORS, 'icons': icons}
+    return json.dumps(index, indent=2) + "\n"
+
+def write_output_file(output_path, data, description):
+    """Writes a generated text or binary file, creating the output directory if needed. Returns True on success."""
+    try:
+        output_dir_check = os.path.dirname(output_path)
+        if output_dir_check:
+            os.makedirs(output_dir_check, exist_ok=True)
+        replace_file_atomically(output_path, data)
+        print(f"Successfully wrote {description} to: {output_path}")
+        return True
+    except OSError as e:
+        print(f"Error writing {description} {output_path}: {e}")
+    return False
+
+def write_resource_dictionary(output_path, final_xaml):
+    """Writes the ResourceDictionary, creating the output directory if needed. Returns True on success."""
+    try:
+        output_dir_check = os.path.dirname(output_path)
+        # Create output directory if it doesn't exist and is not the current directory
+        if output_dir_check and not os.path.exists(output_dir_check):
+             print(f"Creating output directory: {output_dir_check}")
+             os.makedirs(output_dir_check)
+
+        replace_file_atomically(output_path, final_xaml)
+        print(f"\nSuccessfully wrote Avalonia ResourceDictionary to: {output_path}")
+        return True
+    except IOError as e:
+        print(f"\nError writing output file {output_path}: {e}")
+    except OSError as e:
+         print(f"\nError creating output directory for {output_path}: {e}")
+    return False
+
+# --- Interactive Mode (one folder) ---
+def run_interactive(options=None, streaming=None):
+    """Converts a single folder, asking for the folder and every color mapping."""
     input_folder = ""
     while not os.path.isdir(input_folder):
         input_folder = input("Please enter the path to the folder containing SVG files: ").strip()
         if not os.path.isdir(input_folder):
             print(f"Error: '{input_folder}' is not a valid directory. Please try again.")
 
-    # --- 1. Find Unique Colors ---
-    unique_svg_colors = find_unique_colors_in_svgs(input_folder)
+    # --- Prepare Output Path ---
+    folder_name = os.path.basename(os.path.normpath(input_folder))
+    output_path = default_output_path(input_folder)
+
+    svg_files = list_svg_files(input_folder)
+    if not svg_files:
+        print("No SVG files found in the directory.")
+        return
+
+    # --- 1. Parse every SVG once and find unique colors ---
+    print("Scanning SVGs for unique colors...")
+    parsed_documents = parse_svg_folder(input_folder, svg_files, streaming)
+    unique_svg_colors = find_unique_colors_in_svgs(document for _, document in parsed_documents)
 
     # --- 2. Build Color Map Interactively ---
     # Pass the sorted list of unique colors
     interactive_color_map = build_interactive_color_map(unique_svg_colors)
 
-    # --- Prepare Output Path ---
-    folder_name = os.path.basename(os.path.normpath(input_folder))
-    parent_dir = os.path.dirname(input_folder) if os.path.dirname(input_folder) else '.' # Handle case where input is just folder name
-    output_filename = f"{folder_name}.axaml"
-    output_path = os.path.join(parent_dir, output_filename)
-
     print(f"\nProcessing SVGs in: {input_folder}")
     print(f"Output will be written to: {output_path}")
 
     all_xaml_outputs = []
     generated_keys = []
 
-    svg_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.svg')]
-
-    if not svg_files:
-        print("No SVG files found in the directory.")
-        exit(0)
-
-    svg_files.sort() # Ensure consistent processing order
-
-    # --- 3. Generate XAML using the Interactive Map ---
-    for filename in svg_files:
-        input_path = os.path.join(input_folder, filename)
+    # --- 3. Generate XAML from the parsed documents using the Interactive Map ---
+    for filename, document in parsed_documents:
         output_key = sanitize_key(filename)
         print(f"  Processing {filename} -> Key: {output_key}")
         # Pass the created interactive_color_map to the generation function
-        xaml_output = generate_xaml_for_svg(input_path, output_key, interactive_color_map)
+        xaml_output = generate_xaml_for_svg(document, output_key, interactive_color_map, options)
         if xaml_output:
             all_xaml_outputs.append(xaml_output)
             generated_keys.append(output_key)
 
     if not all_xaml_outputs:
         print("No valid XAML generated.")
-        exit(0)
+        return
 
     # --- 4. Generate Preview and Final Output ---
-    preview_block = generate_preview_xaml(generated_keys)
-    joined_icon_xaml = "\n".join(all_xaml_outputs)
+    final_xaml = build_resource_dictionary(folder_name, all_xaml_outputs, generated_keys,
+                                           "Color mappings were defined interactively during script execution.")
+    write_resource_dictionary(output_path, final_xaml)
+
+# --- Batch Mode (several folders, process pool) ---
+def find_svg_folders(root_folder):
+    """Returns the sorted sub folders of root_folder that contain at least one SVG file."""
+    folders = []
+    for entry in sorted(os.listdir(root_folder)):
+        folder = os.path.join(root_folder, entry)
+        if os.path.isdir(folder) and list_svg_files(folder):
+            folders.append(folder)
+    return folders
+
+# --- Incremental Rebuild Cache ---
+def content_hash(data):
+    """Returns the hex SHA-256 of some bytes (SVG content, color maps, ...)."""
+    return hashlib.sha256(data).hexdigest()
+
+def file_content_hash(file_path):
+    """Returns (hex SHA-256, size in bytes) of a file, read in chunks so large files are never held in memory."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def settings_hash(color_map, options):
+    """Returns a stable hash of a color map and the generation options."""
+    settings = {'color_map': color_map, 'options': options}
+    return content_hash(json.dumps(settings, sort_keys=True).encode('utf-8'))
+
+def fragment_cache_key(svg_hash, output_key, generation_hash):
+    """Key of a cached DrawingImage fragment: SVG content, resource key, color map/options and generator version."""
+    return content_hash(f"{GENERATOR_VERSION}\n{svg_hash}\n{output_key}\n{generation_hash}".encode('utf-8'))
+
+def folder_signature(file_hashes, generation_hash, mapping_note):
+    """Hash of everything that ends up in a folder's dictionary, used to skip unchanged folders."""
+    lines = [GENERATOR_VERSION, generation_hash, mapping_note] + [f"{name}:{h}" for name, h in file_hashes]
+    return content_hash("\n".join(lines).encode('utf-8'))
+
+def empty_folder_cache():
+    return {'generator_version': GENERATOR_VERSION, 'signature': None, 'outputs': {},
+            'colors': {}, 'fragments': {}}
+
+def folder_key(input_folder):
+    """Identifies a folder within a batch by its normalized absolute path (folders in different places can share a name)."""
+    return os.path.normcase(os.path.abspath(input_folder))
+
+def folder_cache_path(cache_dir, input_folder):
+    """Cache file of a folder: its name, to keep the cache readable, plus a hash of its folder_key."""
+    folder_name = os.path.basename(os.path.normpath(input_folder))
+    return os.path.join(cache_dir, f"{folder_name}_{content_hash(folder_key(input_folder).encode('utf-8'))[:12]}.json")
 
-    final_xaml = f"""<ResourceDictionary xmlns="https://github.com/avaloniaui"
-                    xmlns:x="http://schemas.microsoft.com/winfx/2006/xaml"
-                    xmlns:util="{PREVIEW_NAMESPACE_UTIL}">
+def load_folder_cache(cache_dir, input_folder):
+    """Loads the cache of one folder, or an empty one if it is missing, unreadable or from another generator version."""
+    if not cache_dir:
+        return empty_folder_cache()
+    cache_path = folder_cache_path(cache_dir, input_folder)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return empty_folder_cache()
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable cache {cache_path}: {e}")
+        return empty_folder_cache()
+    if cache.get('generator_version') != GENERATOR_VERSION:
+        return empty_folder_cache()
+    return cache
+
+def save_folder_cache(cache_dir, input_folder, cache):
+    """Writes the cache of one folder (only entries used by the current run are kept)."""
+    if not cache_dir:
+        return
+    cache_path = folder_cache_path(cache_dir, input_folder)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, sort_keys=True)
+    except OSError as e:
+        print(f"Warning: Could not write cache {cache_path}: {e}")
 
-    <!-- Generated by svg_to_avalonia.py from folder: {folder_name} -->
-    <!-- Color mappings were defined interactively during script execution. -->
-{preview_block}
-{joined_icon_xaml}
-</ResourceDictionary>
+def read_output_hash(output_path):
+    """Returns the content hash of an existing output file, or None if it does not exist."""
+    try:
+        return file_content_hash(output_path)[0]
+    except OSError:
+        return None
+
+# --- Conversion Profile ---
+def icon_profile_stats(document, drawings, fragment, normalize_seconds, emit_seconds):
+    """Cost figures of one generated icon: time spent, paths, path commands, XAML bytes and recolorable brushes."""
+    template_brushes = sum(1 for drawing in drawings for brush in (drawing['brush'], drawing['pen_brush'])
+                           if brush and _TEMPLATE_BRUSH_RE.fullmatch(brush))
+    return {
+        'normalize_seconds': normalize_seconds,
+        'emit_seconds': emit_seconds,
+        'paths': len(document['shapes']),
+        'drawings': len(drawings),
+        'commands': sum(count_path_nodes(drawing['geometry']) for drawing in drawings),
+        'output_bytes': len(fragment.encode('utf-8')),
+        'template_brushes': template_brushes, # Brushes MultiColoredIcon swaps when recoloring
+    }
+
+PROFILE_SUMMED_FIELDS = ('parse_seconds', 'normalize_seconds', 'emit_seconds', 'total_seconds', 'paths', 'drawings',
+                         'commands', 'output_bytes', 'template_brushes')
+
+def _profile_totals(records):
+    totals = {'icons': len(records)}
+    for field in PROFILE_SUMMED_FIELDS:
+        totals[field] = sum(record[field] for record in records)
+    return totals
+
+def build_profile_report(records, stage_seconds, options, output_options):
+    """Assembles the --profile report from per icon records (folder, file, key, timings and stats)."""
+    for record in records:
+        record['total_seconds'] = record['parse_seconds'] + record['normalize_seconds'] + record['emit_seconds']
+    folder_records = OrderedDict()
+    for record in records:
+        folder_records.setdefault(record['folder'], []).append(record)
+    return {
+        'generator_version': GENERATOR_VERSION,
+        'options': options,
+        'output_options': output_options,
+        'stages': stage_seconds,
+        'totals': _profile_totals(records),
+        'folders': [dict(folder=folder, **_profile_totals(folder_records[folder])) for folder in folder_records],
+        'heaviest': sorted(records, key=lambda r: (-r['output_bytes'], -r['commands'], r['key']))[:PROFILE_REPORT_TOP],
+        'slowest': sorted(records, key=lambda r: (-r['total_seconds'], r['key']))[:PROFILE_REPORT_TOP],
+        'icons': records,
+    }
+
+def render_profile_html(report):
+    """Renders the --profile report as a standalone HTML page."""
+    columns = [('folder', "Folder"), ('key', "Key"), ('output_bytes', "XAML bytes"), ('commands', "Path commands"),
+               ('drawings', "Drawings"), ('template_brushes', "Template brushes"), ('parse_seconds', "Parse ms"),
+               ('normalize_seconds', "Normalize ms"), ('emit_seconds', "Emit ms"), ('total_seconds', "Total ms")]
+
+    def cell(record, field):
+        value = record[field]
+        if field.endswith('_seconds'):
+            return f"{value * 1000:.2f}"
+        return html.escape(str(value))
+
+    def table(title, records, columns=columns):
+        header = "".join(f"<th>{label}</th>" for _, label in columns)
+        rows = "\n".join("<tr>" + "".join(f"<td>{cell(record, field)}</td>" for field, _ in columns) + "</tr>"
+                         for record in records)
+        return f"<h2>{title}</h2>\n<table>\n<tr>{header}</tr>\n{rows}\n</table>"
+
+    stage_rows = "\n".join(f"<tr><td>{html.escape(name)}</td><td>{seconds * 1000:.1f}</td></tr>"
+                           for name, seconds in report['stages'].items())
+    totals = report['totals']
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>svg_to_axaml conversion profile</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 2em; }}
+th, td {{ border: 1px solid #ccc; padding: 0.25em 0.6em; text-align: right; }}
+th:first-child, td:first-child, th:nth-child(2), td:nth-child(2) {{ text-align: left; }}
+</style>
+</head>
+<body>
+<h1>svg_to_axaml conversion profile</h1>
+<p>{totals['icons']} icons, {totals['output_bytes']} XAML bytes, {totals['commands']} path commands,
+{totals['template_brushes']} template brushes, generator version {html.escape(report['generator_version'])}.</p>
+<h2>Stages</h2>
+<table>
+<tr><th>Stage</th><th>Wall ms</th></tr>
+{stage_rows}
+</table>
+{table("Folders", report['folders'], [('folder', "Folder"), ('icons', "Icons")] + columns[2:])}
+{table(f"Heaviest icons (top {PROFILE_REPORT_TOP} by XAML bytes)", report['heaviest'])}
+{table(f"Slowest icons (top {PROFILE_REPORT_TOP} by conversion time)", report['slowest'])}
+</body>
+</html>
 """
 
+def write_profile_report(report_path, report):
+    """Writes the --profile report as HTML (.html/.htm) or JSON (anything else). Returns True on success."""
+    if os.path.splitext(report_path)[1].lower() in ('.html', '.htm'):
+        return write_output_file(report_path, render_profile_html(report), "profile report")
+    return write_output_file(report_path, json.dumps(report, indent=2) + "\n", "profile report")
+
+# --- Output Verification ---
+# --verify reads the written dictionaries back, checks their keys and resource references, and renders every
+# DrawingImage next to the plain conversion of its SVG (no minification, merging, deduplication or sharding).
+# That is an optimization equivalence check: both sides share the SVG reader and the rasterizer, so it catches
+# output modes that change what an icon draws, not errors in reading the SVG itself (shape flattening, style
+# inheritance, color mapping). It is no visual comparison against an independent SVG renderer.
+AVALONIA_NAMESPACE = "https://github.com/avaloniaui"
+XAML_KEY_ATTRIBUTE = "{http://schemas.microsoft.com/winfx/2006/xaml}Key"
+_RESOURCE_REFERENCE_RE = re.compile(r'\{(?:Static|Dynamic)Resource\s+([^}\s]+)\s*\}')
+
+def load_template_color_resources(multi_icons_path):
+    """Returns {'TemplateColorN': '#aarrggbb'} defined in MultiIcons.axaml."""
+    root = ET.parse(multi_icons_path).getroot()
+    return {elem.get(XAML_KEY_ATTRIBUTE): (elem.text or '').strip() for elem in root.iter()
+            if (elem.get(XAML_KEY_ATTRIBUTE) or '').startswith('TemplateColor')}
+
+def read_generated_dictionary(dictionary_path):
+    """Parses a generated dictionary into its keys (in order), geometry resources and DrawingImage drawing records."""
+    root = ET.parse(dictionary_path).getroot()
+    keys = []
+    geometries = {}
+    images = OrderedDict()
+    for elem in root.iter():
+        key = elem.get(XAML_KEY_ATTRIBUTE)
+        if key is None:
+            continue
+        keys.append(key)
+        if elem.tag == f"{{{AVALONIA_NAMESPACE}}}StreamGeometry":
+            geometries[key] = (elem.text or '').strip()
+        elif elem.tag == f"{{{AVALONIA_NAMESPACE}}}DrawingImage":
+            drawings = []
+            for drawing in elem.iter(f"{{{AVALONIA_NAMESPACE}}}GeometryDrawing"):
+                pen = drawing.find(f"{{{AVALONIA_NAMESPACE}}}GeometryDrawing.Pen/{{{AVALONIA_NAMESPACE}}}Pen")
+                drawings.append({
+                    'geometry': drawing.get('Geometry', ''),
+                    'brush': drawing.get('Brush'),
+                    'pen_brush': pen.get('Brush') if pen is not None else None,
+                    'thickness': float(pen.get('Thickness', '1')) if pen is not None else None,
+                })
+            images[key] = drawings
+    return keys, geometries, images
+
+def resolve_geometry_references(drawings, geometries):
+    """Replaces {StaticResource key} geometries of drawing records with the path data of geometries.
+
+    References that can not be resolved are left as they are.
+    """
+    resolved = []
+    for drawing in drawings:
+        reference = _RESOURCE_REFERENCE_RE.fullmatch(drawing['geometry'])
+        if reference and reference.group(1) in geometries:
+            drawing = dict(drawing, geometry=geometries[reference.group(1)])
+        resolved.append(drawing)
+    return resolved
+
+def compare_rasters(expected, actual):
+    """Returns the fraction of pixels whose premultiplied channels differ by more than VERIFY_CHANNEL_TOLERANCE."""
+    mismatched = 0
+    for index in range(0, len(expected), 4):
+        expected_alpha, actual_alpha = expected[index + 3], actual[index + 3]
+        if abs(expected_alpha - actual_alpha) > VERIFY_CHANNEL_TOLERANCE:
+            mismatched += 1
+            continue
+        for channel in range(3):
+            if abs(expected[index + channel] * expected_alpha - actual[index + channel] * actual_alpha) > VERIFY_CHANNEL_TOLERANCE * 255:
+                mismatched += 1
+                break
+    return mismatched / (len(expected) // 4)
+
+def verify_folder_outputs(folder_name, dictionary_paths, sources, color_map, template_colors, external_geometries,
+                          streaming=None):
+    """Checks the generated dictionaries of one folder against the plain conversion of its sources ([(key, svg path)]).
+
+    Returns {'folder', 'keys', 'icons', 'problems'}: keys defined (for the cross folder check), icons compared and
+    a list of problem descriptions.
+    """
+    problems = []
+    keys = []
+    geometries = dict(external_geometries)
+    images = OrderedDict()
+    for dictionary_path in dictionary_paths:
+        try:
+            dictionary_keys, dictionary_geometries, dictionary_images = read_generated_dictionary(dictionary_path)
+        except (OSError, ET.ParseError) as e:
+            problems.append(f"{dictionary_path}: can not be read back: {e}")
+            continue
+        keys.extend(dictionary_keys)
+        geometries.update(dictionary_geometries)
+        images.update(dictionary_images)
+        # Every resource reference must point at a template color or a generated geometry/icon
+        with open(dictionary_path, encoding='utf-8') as f:
+            text = f.read()
+        for reference in sorted(set(_RESOURCE_REFERENCE_RE.findall(text))):
+            if reference.startswith('TemplateColor') and reference not in template_colors:
+                problems.append(f"{dictionary_path}: {reference} is not defined in MultiIcons.axaml")
+
+    seen = set()
+    for key in keys:
+        if key in seen:
+            problems.append(f"{folder_name}: x:Key '{key}' is defined more than once")
+        seen.add(key)
+
+    palette = [template_colors.get(f"TemplateColor{slot}", DEFAULT_UNMAPPED_BRUSH)
+               for slot in range(1, MAX_TEMPLATE_COLORS + 1)]
+    compared = 0
+    for key, svg_path in sources:
+        document = parse_svg_document(svg_path, None, streaming)
+        expected_drawings = generate_drawings_for_svg(document, color_map, DEFAULT_OPTIONS) if document else None
+        if expected_drawings is None:
+            continue
+        if key not in images:
+            problems.append(f"{folder_name}: icon '{key}' of {os.path.basename(svg_path)} is missing")
+            continue
+        actual_drawings = []
+        for drawing in images.pop(key):
+            reference = _RESOURCE_REFERENCE_RE.fullmatch(drawing['geometry'])
+            if reference:
+                if reference.group(1) not in geometries:
+                    problems.append(f"{folder_name}: icon '{key}' references unknown geometry '{reference.group(1)}'")
+                    break
+                drawing = dict(drawing, geometry=geometries[reference.group(1)])
+            actual_drawings.append(drawing)
+        else:
+            try:
+                expected = rasterize_drawings(expected_drawings, VERIFY_SIZE, palette)
+                actual = rasterize_drawings(actual_drawings, VERIFY_SIZE, palette)
+            except ValueError as e:
+                problems.append(f"{folder_name}: icon '{key}' can not be rendered: {e}")
+                continue
+            compared += 1
+            mismatch = compare_rasters(expected, actual)
+            if mismatch > VERIFY_MAX_MISMATCH:
+                problems.append(f"{folder_name}: icon '{key}' differs from the plain conversion of "
+                                f"{os.path.basename(svg_path)} in {mismatch:.1%} of its pixels at {VERIFY_SIZE} px")
+    for key in images:
+        problems.append(f"{folder_name}: icon '{key}' has no source SVG")
+    return {'folder': folder_name, 'keys': keys, 'icons': compared, 'problems': problems}
+
+def verify_batch_outputs(jobs_list, jobs, multi_icons_path, streaming=None):
+    """Verifies the dictionaries of every folder in parallel. Returns True when no problems were found."""
     try:
-        output_dir_check = os.path.dirname(output_path)
-        # Create output directory if it doesn't exist and is not the current directory
-        if output_dir_check and not os.path.exists(output_dir_check):
-             print(f"Creating output directory: {output_dir_check}")
-             os.makedirs(output_dir_check)
+        template_colors = load_template_color_resources(multi_icons_path)
+    except (OSError, ET.ParseError) as e:
+        print(f"Error: Could not read the template colors from {multi_icons_path}: {e}")
+        return False
+
+    print(f"\nVerifying {len(jobs_list)} folders...")
+    tasks = []
+    for job in jobs_list:
+        output_dir = os.path.dirname(job['output_path'])
+        shared_path = os.path.join(output_dir, SHARED_GEOMETRY_FILE_NAME)
+        external_geometries = {}
+        if os.path.exists(shared_path):
+            try:
+                external_geometries = read_generated_dictionary(shared_path)[1]
+            except (OSError, ET.ParseError) as e:
+                print(f"Error: {shared_path} can not be read back: {e}")
+                return False
+        dictionary_paths = sorted(path for path in job['verify_paths']
+                                  if path.endswith('.axaml') and os.path.basename(path) != SHARED_GEOMETRY_FILE_NAME)
+        sources = []
+        for filename in job['files']:
+            fragment_key = fragment_cache_key(job['hashes'][filename], sanitize_key(filename), job['generation_hash'])
+            if fragment_key in job['cache']['fragments'] and job['cache']['fragments'][fragment_key] is None:
+                continue # Failed to parse, already reported and not part of the dictionary
+            sources.append((sanitize_key(filename), os.path.join(job['folder'], filename)))
+        tasks.append((job['name'], dictionary_paths, sources, job['color_map'], template_colors,
+                      external_geometries, streaming))
+
+    problems = []
+    defined_in = {}
+    icon_count = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(jobs, len(tasks)))) as pool:
+        for result in pool.map(_verify_folder_task, tasks):
+            problems.extend(result['problems'])
+            icon_count += result['icons']
+            for key in set(result['keys']):
+                if key in defined_in:
+                    problems.append(f"x:Key '{key}' is defined by both {defined_in[key]} and {result['folder']}")
+                defined_in[key] = result['folder']
+
+    for problem in problems:
+        print(f"Verification error: {problem}")
+    if problems:
+        print(f"Verification failed with {len(problems)} problems.")
+        return False
+    print(f"Verified {icon_count} icons in {len(tasks)} folders: keys are unique, references resolve and every icon "
+          f"draws the same as the plain conversion of its SVG at {VERIFY_SIZE} px.")
+    return True
+
+# --- Batch Mode Tasks (run in the process pool) ---
+def _parse_svg_task(task):
+    """(svg path, streaming, keep document) -> (color usage, parsed document if kept, seconds spent).
+
+    The color usage is None when the file can not be parsed.
+    """
+    svg_path, streaming, keep_document = task
+    start = time.perf_counter()
+    document = parse_svg_document(svg_path, None, streaming)
+    seconds = time.perf_counter() - start
+    if document is None:
+        return None, None, seconds
+    return document['color_usage'], document if keep_document else None, seconds
+
+def _verify_folder_task(task):
+    """Arguments of verify_folder_outputs -> its result."""
+    return verify_folder_outputs(*task)
+
+def _generate_fragment_task(task):
+    """(document or (svg path, content, streaming), key, color map, options, profile) -> {drawings, DrawingImage XAML}
+    or None. With profile, the result also holds the icon's cost figures under 'stats'."""
+    source, output_key, dynamic_color_map, options, profile = task
+    document = source if isinstance(source, dict) else parse_svg_document(*source)
+    if document is None:
+        return None
+    start = time.perf_counter()
+    drawings = generate_drawings_for_svg(document, dynamic_color_map, options)
+    if drawings is None:
+        return None
+    normalized = time.perf_counter()
+    fragment = render_drawing_image(output_key, drawings)
+    result = {'drawings': drawings, 'fragment': fragment}
+    if profile:
+        result['stats'] = icon_profile_stats(document, drawings, fragment, normalized - start,
+                                             time.perf_counter() - normalized)
+    return result
+
+def run_batch(input_folders, color_profile=None, jobs=None, output_dir=None, cache_dir=None, options=None,
+              output_options=None, streaming=None, auto_colors=False, prompt=True, save_profile=None,
+              remembered_choices=None, profile_report=None, verify=False, multi_icons_path=DEFAULT_MULTI_ICONS_PATH):
+    """Converts several folders without prompting for them, parsing and converting on a process pool.
+
+    Writes one .axaml per folder, or shards of it plus a key manifest, and optionally a binary .iconpack.
+    Keys keep the sorted filename order, so the output is identical across runs.
+    With a cache_dir, only SVGs whose content (or the color map) changed are parsed and converted again,
+    and folders whose dictionary would not change are skipped entirely.
+    With a color_profile and/or auto_colors every folder (icon family) gets its own color map, otherwise one
+    interactively built map is shared by all folders.
+    remembered_choices ({folder: {color: template number}}) carries color decisions between runs (watch mode),
+    only colors it does not know yet are resolved again. It is updated with the choices of this run.
+    With a profile_report path, every icon's conversion cost is measured and written as a JSON/HTML report
+    (pass no cache_dir, cached icons are not converted and so can not be measured).
+    With verify, the dictionaries of every folder are read back afterwards and compared with the plain
+    (unoptimized) conversion of their SVGs.
+    """
+    remembered_choices = remembered_choices if remembered_choices is not None else {}
+    options = options or DEFAULT_OPTIONS
+    output_options = output_options or DEFAULT_OUTPUT_OPTIONS
+    jobs_list = []
+    for input_folder in input_folders:
+        svg_files = list_svg_files(input_folder)
+        if not svg_files:
+            print(f"Warning: No SVG files found in {input_folder}, skipping.")
+            continue
+        folder_name = os.path.basename(os.path.normpath(input_folder))
+        hashes = {}
+        sizes = {}
+        for filename in svg_files:
+            hashes[filename], sizes[filename] = file_content_hash(os.path.join(input_folder, filename))
+        jobs_list.append({
+            'folder': input_folder,
+            'key': folder_key(input_folder),
+            'name': folder_name,
+            'files': svg_files,
+            'hashes': hashes,
+            'sizes': sizes,
+            'cache': load_folder_cache(cache_dir, input_folder),
+            'output_path': default_output_path(input_folder, output_dir),
+        })
+
+    if not jobs_list:
+        print("No SVG files found in any of the given folders.")
+        return False
+
+    jobs = jobs or os.cpu_count() or 1
+    svg_count = sum(len(job['files']) for job in jobs_list)
+    print(f"Converting {svg_count} SVGs from {len(jobs_list)} folders using {jobs} processes...")
+
+    stage_seconds = {}
+    stage_start = time.perf_counter()
+    parse_seconds = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # --- 1. Parse the SVGs whose colors are not cached yet (in parallel) ---
+        # Workers read the files themselves. Parsed documents come back for generation only while they fit the
+        # budget and were not streamed, the others return their colors and are parsed again when generating.
+        parse_targets = [(job, filename) for job in jobs_list for filename in job['files']
+                         if job['hashes'][filename] not in job['cache']['colors']]
+        parse_tasks = []
+        document_budget = PARSED_DOCUMENT_BUDGET_BYTES
+        for job, filename in parse_targets:
+            size = job['sizes'][filename]
+            streamed = streaming if streaming is not None else size > STREAMING_THRESHOLD_BYTES
+            keep_document = not streamed and size <= document_budget
+            if keep_document:
+                document_budget -= size
+            parse_tasks.append((os.path.join(job['folder'], filename), streaming, keep_document))
+        chunksize = max(1, len(parse_tasks) // (jobs * 4))
+        parsed_documents = {}
+        for (job, filename), (color_usage, document, seconds) in zip(parse_targets, pool.map(_parse_svg_task, parse_tasks, chunksize=chunksize)):
+            if color_usage is None:
+                parsed_documents[(job['key'], filename)] = None # Failed to parse
+            elif document is not None:
+                parsed_documents[(job['key'], filename)] = document
+            parse_seconds[(job['key'], filename)] = seconds
+            job['cache']['colors'][job['hashes'][filename]] = color_usage or {}
+
+        stage_seconds['parse'] = time.perf_counter() - stage_start
+
+        # --- 2. Decide the color map of every folder ---
+        stage_start = time.perf_counter()
+        for job in jobs_list:
+            family_usage = {}
+            for filename in job['files']:
+                for color, usage in job['cache']['colors'][job['hashes'][filename]].items():
+                    totals = family_usage.setdefault(color, {'icons': 0, 'fill': 0, 'stroke': 0})
+                    totals['icons'] += 1
+                    totals['fill'] += usage['fill']
+                    totals['stroke'] += usage['stroke']
+            job['color_usage'] = family_usage
+
+        if color_profile or auto_colors:
+            try:
+                profile = load_color_profile(color_profile) if color_profile else {}
+                for job in jobs_list:
+                    print(f"\n--- Color Mapping for {job['name']} ---")
+                    colors = sort_unique_colors(set(job['color_usage']))
+                    profile_choices = {**remembered_choices.get(job['name'], {}),
+                                       **profile.get(job['name'], profile.get('default', {}))}
+                    job['choices'] = resolve_color_choices(colors, job['color_usage'], profile_choices, auto_colors, prompt)
+            except (OSError, ValueError) as e:
+                print(f"Error resolving color mappings: {e}")
+                return False
+            sources = []
+            if color_profile:
+                sources.append(f"loaded from: {os.path.basename(color_profile)}")
+            if auto_colors:
+                sources.append("assigned automatically by palette clustering")
+            mapping_note = f"Color mappings were {' and '.join(sources)}"
+        else:
+            unique_svg_colors = sort_unique_colors(set(c for job in jobs_list for c in job['color_usage']))
+            shared_choices = {}
+            for choices in remembered_choices.values():
+                shared_choices.update(choices)
+            missing_colors = [color for color in unique_svg_colors if color not in shared_choices]
+            if missing_colors and not prompt:
+                print("Error: No color profile or --auto-colors given, the colors can only be mapped interactively.")
+                return False
+            if missing_colors:
+                shared_choices.update(prompt_color_choices(missing_colors))
+            for job in jobs_list:
+                job['choices'] = {color: shared_choices[color] for color in sort_unique_colors(set(job['color_usage']))}
+            mapping_note = "Color mappings were defined interactively during script execution."
+
+        for job in jobs_list:
+            try:
+                # Interactive prompts already announce that kept named colors become the default brush
+                job['color_map'] = build_color_map(job['choices'], quiet=True,
+                                                   keep_named=bool(color_profile or auto_colors))
+            except ValueError as e:
+                print(f"Error resolving color mappings for {job['name']}: {e}")
+                return False
+            job['generation_hash'] = settings_hash(job['color_map'], options)
+            remembered_choices[job['name']] = job['choices']
+        if save_profile:
+            try:
+                save_color_profile(save_profile, {job['name']: job['choices'] for job in jobs_list})
+            except (OSError, ValueError) as e:
+                print(f"Error saving color profile: {e}")
+                return False
+
+        stage_seconds['color_mapping'] = time.perf_counter() - stage_start
+
+        # --- 3. Skip folders whose output would not change ---
+        pending_jobs = []
+        for job in jobs_list:
+            output_settings = dict(output_options, output_path=job['output_path'])
+            if output_options['dedup_geometry']:
+                # Which geometries are shared depends on every folder of the batch
+                output_settings['batch_folders'] = [other['key'] for other in jobs_list]
+            output_settings = json.dumps(output_settings, sort_keys=True)
+            job['signature'] = folder_signature([(f, job['hashes'][f]) for f in job['files']], job['generation_hash'],
+                                                mapping_note + "\n" + output_settings)
+            cache = job['cache']
+            if (cache_dir and cache['signature'] == job['signature'] and cache['outputs']
+                    and all(h == read_output_hash(p) for p, h in cache['outputs'].items())):
+                print(f"Up to date: {job['folder']}")
+                job['verify_paths'] = list(cache['outputs'])
+            else:
+                pending_jobs.append(job)
+        if output_options['dedup_geometry'] and pending_jobs and len(pending_jobs) < len(jobs_list):
+            print("Geometry deduplication spans every folder, rebuilding all of them.")
+            pending_jobs = list(jobs_list)
+
+        # --- 4. Generate the missing XAML fragments (in parallel, results keep the task order) ---
+        stage_start = time.perf_counter()
+        generate_targets = []
+        generate_tasks = []
+        reused_count = 0
+        for job in pending_jobs:
+            job['fragment_keys'] = {}
+            for filename in job['files']:
+                output_key = sanitize_key(filename)
+                fragment_key = fragment_cache_key(job['hashes'][filename], output_key, job['generation_hash'])
+                job['fragment_keys'][filename] = fragment_key
+                if fragment_key in job['cache']['fragments']:
+                    reused_count += 1
+                    continue
+                document = parsed_documents.get((job['key'], filename), False)
+                if document is None:
+                    job['cache']['fragments'][fragment_key] = None # Failed to parse, nothing to generate
+                    continue
+                source = document or (os.path.join(job['folder'], filename), None, streaming)
+                generate_targets.append((job, fragment_key))
+                generate_tasks.append((source, output_key, job['color_map'], options, profile_report is not None))
+
+        chunksize = max(1, len(generate_tasks) // (jobs * 4))
+        for (job, fragment_key), result in zip(generate_targets, pool.map(_generate_fragment_task, generate_tasks, chunksize=chunksize)):
+            job['cache']['fragments'][fragment_key] = result
+
+        stage_seconds['generate'] = time.perf_counter() - stage_start
+
+    if cache_dir:
+        print(f"Reused {reused_count} cached fragments, generated {len(generate_tasks)}.")
+
+    # --- 5. Assemble and write the outputs of every changed folder ---
+    stage_start = time.perf_counter()
+    profile_records = []
+    for job in pending_jobs:
+        job['entries'] = [] # (key, drawings, fragment) in dictionary order
+        for filename in job['files']:
+            result = job['cache']['fragments'][job['fragment_keys'][filename]]
+            if result:
+                job['entries'].append((sanitize_key(filename), result['drawings'], result['fragment']))
+            if result and 'stats' in result:
+                profile_records.append({'folder': job['name'], 'file': filename, 'key': sanitize_key(filename),
+                                        'parse_seconds': parse_seconds.get((job['key'], filename), 0.0),
+                                        **result['stats']})
+
+    shared_path = None
+    if output_options['dedup_geometry'] and pending_jobs:
+        dedup_plan = plan_geometry_dedup([(job['key'], job['name'], job['entries']) for job in pending_jobs])
+        shared_path = os.path.join(os.path.dirname(pending_jobs[0]['output_path']), SHARED_GEOMETRY_FILE_NAME)
+        shared_resources = dedup_plan['resources'].get(None, [])
+        for job in pending_jobs:
+            job['geometry_keys'] = dedup_plan['keys'][job['key']]
+            job['geometry_resources'] = dedup_plan['resources'].get(job['key'], [])
+            used_keys = set(job['geometry_keys'].values())
+            job['shared_geometry'] = (os.path.basename(shared_path),
+                                      [key for key, _ in shared_resources if key in used_keys])
+        print(f"Geometry deduplication: {dedup_plan['shared']} geometries shared by {dedup_plan['uses']} drawings, "
+              f"saved {dedup_plan['saved_bytes']} bytes and {dedup_plan['saved_nodes']} path nodes.")
+        batch_paths = {os.path.normpath(path) for job in pending_jobs
+                       for path in [job['output_path'], *job['cache']['outputs']]}
+        shared_keys = {key for key, _ in shared_resources}
+        kept_resources = [(key, geometry) for key, geometry in referenced_shared_geometry(shared_path, batch_paths)
+                          if key not in shared_keys]
+        if shared_resources or kept_resources:
+            description = "geometries shared by " + ", ".join(job['name'] for job in pending_jobs)
+            if kept_resources:
+                description += f" (and {len(kept_resources)} used by dictionaries of other runs)"
+            shared_xaml = build_geometry_dictionary(description, shared_resources + kept_resources)
+            if not write_output_file(shared_path, shared_xaml, "shared geometry dictionary"):
+                return False
+            print(f"Note: Merge {SHARED_GEOMETRY_FILE_NAME} before the icon dictionaries that reference it.")
+        elif os.path.exists(shared_path):
+            try:
+                os.remove(shared_path)
+                print(f"Removed stale output: {shared_path}")
+            except OSError as e:
+                print(f"Warning: Could not remove stale output {shared_path}: {e}")
+
+    if output_options['atlas_sizes'] and pending_jobs:
+        print(f"Rasterizing atlas tiles at {', '.join(map(str, output_options['atlas_sizes']))} px...")
+        template_colors = atlas_template_colors(output_options['atlas_colors'])
+        raster_targets = [(job, key) for job in pending_jobs for key, _, _ in job['entries']]
+        raster_tasks = [(drawings, output_options['atlas_sizes'], template_colors)
+                        for job in pending_jobs for _, drawings, _ in job['entries']]
+        try:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                chunksize = max(1, len(raster_tasks) // (jobs * 4))
+                for (job, key), tiles in zip(raster_targets, pool.map(_rasterize_icon_task, raster_tasks, chunksize=chunksize)):
+                    job.setdefault('atlas_tiles', {})[key] = tiles
+        except ValueError as e:
+            print(f"Error rasterizing atlas tiles: {e}")
+            return False
+
+    success = True
+    for job in pending_jobs:
+        entries = job['entries']
+
+        # Only keep the entries of the current files in the cache
+        used_hashes = set(job['hashes'].values())
+        used_fragments = set(job['fragment_keys'].values())
+        cache = job['cache']
+        cache['colors'] = {h: c for h, c in cache['colors'].items() if h in used_hashes}
+        cache['fragments'] = {k: x for k, x in cache['fragments'].items() if k in used_fragments}
+        previous_outputs = cache['outputs']
+        cache['signature'] = None
+        cache['outputs'] = {}
+
+        if not entries:
+            print(f"No valid XAML generated for {job['folder']}.")
+            save_folder_cache(cache_dir, job['folder'], cache)
+            continue
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(final_xaml)
-        print(f"\nSuccessfully wrote Avalonia ResourceDictionary to: {output_path}")
-    except IOError as e:
-        print(f"\nError writing output file {output_path}: {e}")
-    except OSError as e:
-         print(f"\nError creating output directory for {output_path}: {e}")
\ No newline at end of file
+        written_paths = write_folder_outputs(job, entries, mapping_note, output_options)
+        job['verify_paths'] = written_paths or []
+        if written_paths is not None:
+            cache['signature'] = job['signature']
+            # The shared geometry dictionary counts as an output of every folder that references it, so a folder
+            # is rebuilt when it goes missing or another run rewrites it
+            output_paths = written_paths + ([shared_path] if job.get('shared_geometry', (None, []))[1] else [])
+            cache['outputs'] = {path: read_output_hash(path) for path in output_paths}
+            remove_stale_outputs(previous_outputs, output_paths)
+        else:
+            success = False
+        save_folder_cache(cache_dir, job['folder'], cache)
+    stage_seconds['write'] = time.perf_counter() - stage_start
+
+    if profile_report:
+        report = build_profile_report(profile_records, stage_seconds, options, output_options)
+        if not write_profile_report(profile_report, report):
+            return False
+        print(f"Profiled {len(profile_records)} icons, the heaviest ones are listed first in the report.")
+
+    if verify:
+        verify_jobs = [job for job in jobs_list if job.get('verify_paths')]
+        if len(verify_jobs) < len(jobs_list):
+            print("Warning: Folders without a written dictionary are not verified.")
+        if verify_jobs and not verify_batch_outputs(verify_jobs, jobs, multi_icons_path, streaming):
+            return False
+    return success
+
+def write_folder_outputs(job, entries, mapping_note, output_options):
+    """Writes the dictionary or shards (and icon pack) of one folder from its (key, drawings, fragment) entries.
+
+    Returns the written paths, or None if writing failed.
+    """
+    written_paths = []
+    geometry_keys = job.get('geometry_keys')
+    geometry_resources = job.get('geometry_resources')
+    fragments = [fragment for _, _, fragment in entries]
+    if geometry_keys:
+        fragments = [render_drawing_image(key, drawings, geometry_keys) for key, drawings, _ in entries]
+
+    shard_size = output_options['shard_size']
+    if shard_size > 0:
+        geometry_files = []
+        if geometry_resources:
+            geometry_path = os.path.splitext(job['output_path'])[0] + "_Geometry.axaml"
+            geometry_xaml = build_geometry_dictionary(f"geometries of folder: {job['name']}", geometry_resources)
+            if not write_output_file(geometry_path, geometry_xaml, "geometry dictionary"):
+                return None
+            written_paths.append(geometry_path)
+            geometry_files.append((os.path.basename(geometry_path), [key for key, _ in geometry_resources]))
+        if job.get('shared_geometry') and job['shared_geometry'][1]:
+            geometry_files.append(job['shared_geometry'])
+
+        shards = []
+        for shard_index, first in enumerate(range(0, len(entries), shard_size)):
+            shard_path = shard_output_path(job['output_path'], shard_index)
+            shard_keys = [key for key, _, _ in entries[first:first + shard_size]]
+            shard_xaml = build_resource_dictionary(f"{job['name']} (shard {shard_index})",
+                                                   fragments[first:first + shard_size], shard_keys,
+                                                   mapping_note, output_options['preview'])
+            if not write_output_file(shard_path, shard_xaml, "shard dictionary"):
+                return None
+            written_paths.append(shard_path)
+            shards.append((os.path.basename(shard_path), shard_keys))
+
+        manifest_format = output_options['manifest_format']
+        manifest_path = os.path.splitext(job['output_path'])[0] + f".manifest.{manifest_format}"
+        manifest = build_shard_manifest(job['name'], shard_size, shards, manifest_format, geometry_files)
+        if not write_output_file(manifest_path, manifest, "shard manifest"):
+            return None
+        written_paths.append(manifest_path)
+    else:
+        final_xaml = build_resource_dictionary(job['name'], fragments, [key for key, _, _ in entries], mapping_note,
+                                               output_options['preview'], geometry_resources)
+        if not write_resource_dictionary(job['output_path'], final_xaml):
+            return None
+        written_paths.append(job['output_path'])
+
+    if output_options['pack']:
+        pack_path = os.path.splitext(job['output_path'])[0] + ".iconpack"
+        if not write_output_file(pack_path, build_icon_pack([(key, drawings) for key, drawings, _ in entries]), "icon pack"):
+            return None
+        dictionary_paths = [path for path in written_paths if path.endswith('.axaml')]
+        if job.get('shared_geometry') and job['shared_geometry'][1]:
+            dictionary_paths.append(os.path.join(os.path.dirname(job['output_path']), job['shared_geometry'][0]))
+        problems = verify_icon_pack(pack_path, dictionary_paths)
+        for problem in problems:
+            print(f"Error: Icon pack {pack_path}: {problem}")
+        if problems:
+            return None
+        print(f"Verified icon pack: all {len(entries)} icons match the XAML output.")
+        written_paths.append(pack_path)
+
+    if output_options['slot_index']:
+        slots_path = os.path.splitext(job['output_path'])[0] + ".slots.json"
+        if not write_output_file(slots_path, build_slot_index(job['name'], entries), "template color slot index"):
+            return None
+        written_paths.append(slots_path)
+
+    if output_options['atlas_sizes']:
+        index = {'folder': job['name'], 'template_colors': atlas_template_colors(output_options['atlas_colors']),
+                 'sizes': {}}
+        for size in output_options['atlas_sizes']:
+            tiles = [(key, job['atlas_tiles'][key][size]) for key, _, _ in entries]
+            pages, placements = build_icon_atlases(tiles, size)
+            page_files = []
+            for page_index, png in pages:
+                page_path = atlas_page_path(job['output_path'], size, page_index)
+                if not write_output_file(page_path, png, f"{size} px atlas"):
+                    return None
+                written_paths.append(page_path)
+                page_files.append(os.path.basename(page_path))
+            index['sizes'][str(size)] = {
+                'files': page_files,
+                'icons': {key: {'file': page_files[page_index], 'x': x, 'y': y, 'width': size, 'height': size}
+                          for key, (page_index, x, y) in placements.items()},
+            }
+        index_path = os.path.splitext(job['output_path'])[0] + ".atlas.json"
+        if not write_output_file(index_path, json.dumps(index, indent=2) + "\n", "atlas index"):
+            return None
+        written_paths.append(index_path)
+    return written_paths
+
+def remove_stale_outputs(previous_outputs, written_paths):
+    """Deletes files a previous run generated that this run no longer writes (e.g. shards after a resize).
+
+    Files that were edited since they were generated are left alone, and so is the shared geometry dictionary,
+    which other folders may still reference (geometry deduplication replaces or removes it).
+    """
+    for path, generated_hash in previous_outputs.items():
+        if path in written_paths or os.path.basename(path) == SHARED_GEOMETRY_FILE_NAME:
+            continue
+        if read_output_hash(path) != generated_hash:
+            continue
+        try:
+            os.remove(path)
+            print(f"Removed stale output: {path}")
+        except OSError as e:
+            print(f"Warning: Could not remove stale output {path}: {e}")
+
+# --- Watch Mode ---
+class _SvgChangeHandler:
+    """watchdog event handler recording the time of the last change to an SVG file."""
+
+    def __init__(self, changed):
+        self.changed = changed # threading.Event set on every relevant change
+        self.last_change = 0.0
+
+    def dispatch(self, event):
+        paths = [getattr(event, 'src_path', ''), getattr(event, 'dest_path', '')]
+        if event.is_directory or not any(str(path).lower().endswith('.svg') for path in paths):
+            return
+        self.last_change = time.monotonic()
+        self.changed.set()
+
+def snapshot_svg_folders(input_folders):
+    """Returns {svg path: (modification time, size)} for polling."""
+    snapshot = {}
+    for input_folder in input_folders:
+        try:
+            for filename in list_svg_files(input_folder):
+                path = os.path.join(input_folder, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue # Deleted while scanning, the next scan sees it
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError as e:
+            print(f"Warning: Could not scan {input_folder}: {e}")
+    return snapshot
+
+def wait_for_svg_changes(input_folders, handler=None, snapshot=None):
+    """Blocks until SVGs changed and then stayed unchanged for WATCH_DEBOUNCE_SECONDS.
+
+    When polling, snapshot is the state the last build started from (taken before it ran, so saves during the
+    build count as changes). Returns the settled snapshot to compare the next wait against.
+    """
+    if handler:
+        handler.changed.wait()
+        # Clear first: a change during the debounce sets the event again and triggers the next rebuild
+        handler.changed.clear()
+        while time.monotonic() - handler.last_change < WATCH_DEBOUNCE_SECONDS:
+            time.sleep(WATCH_DEBOUNCE_SECONDS / 3)
+        return None
+
+    if snapshot is None:
+        snapshot = snapshot_svg_folders(input_folders)
+    while True:
+        time.sleep(WATCH_POLL_INTERVAL)
+        current = snapshot_svg_folders(input_folders)
+        if current == snapshot:
+            continue
+        # Wait for the burst of saves to settle
+        while True:
+            time.sleep(WATCH_DEBOUNCE_SECONDS)
+            settled = snapshot_svg_folders(input_folders)
+            if settled == current:
+                return settled
+            current = settled
+
+def run_watch(input_folders, **batch_options):
+    """Converts the folders once, then again after every burst of SVG changes until interrupted.
+
+    Color decisions are kept between rebuilds, so only new colors are asked for, and the rebuild cache makes
+    every rebuild regenerate just the changed icons.
+    """
+    remembered_choices = {}
+    # Start watching before the first build, so saves while it runs are not missed
+    handler = None
+    observer = None
+    snapshot = None
+    if Observer is not None:
+        handler = _SvgChangeHandler(threading.Event())
+        observer = Observer()
+        for input_folder in input_folders:
+            observer.schedule(handler, input_folder, recursive=False)
+        observer.start()
+    else:
+        snapshot = snapshot_svg_folders(input_folders)
+
+    try:
+        run_batch(input_folders, remembered_choices=remembered_choices, **batch_options)
+        if observer is not None:
+            print(f"\nWatching {len(input_folders)} folders for SVG changes (Ctrl+C to stop)...")
+        else:
+            print(f"\nWatching {len(input_folders)} folders for SVG changes by polling every {WATCH_POLL_INTERVAL} s "
+                  "(install watchdog for file system events, Ctrl+C to stop)...")
+        while True:
+            # The snapshot a rebuild starts from is taken before it reads any file
+            snapshot = wait_for_svg_changes(input_folders, handler, snapshot)
+            print("\nChanges detected, rebuilding...")
+            start = time.perf_counter()
+            if run_batch(input_folders, remembered_choices=remembered_choices, **batch_options):
+                print(f"Rebuilt in {time.perf_counter() - start:.2f} s.")
+            else:
+                print("Rebuild failed, waiting for the next change.")
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converts folders of SVG files into Avalonia ResourceDictionaries of DrawingImages. "
+                    "Without arguments, the script asks for a single folder interactively.")
+    parser.add_argument('folders', nargs='*', help="SVG folders to convert (batch mode)")
+    parser.add_argument('--root', help="Convert every sub folder of this directory that contains SVG files")
+    parser.add_argument('--color-profile', '--color-map', dest='color_profile',
+                        help="JSON/YAML color profile: {color: template number (0 = keep)}, or such maps per icon "
+                             "family (folder name) with an optional 'default'")
+    parser.add_argument('--auto-colors', action='store_true',
+                        help="Cluster near-identical colors and assign template slots by role, "
+                             "only asking about outliers (colors not in the profile)")
+    parser.add_argument('--no-prompt', action='store_true',
+                        help="Never ask for colors: unmapped colors are an error, --auto-colors outliers keep their color")
+    parser.add_argument('--save-profile', help="Save the resulting per-family color maps as a profile (JSON/YAML)")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and rebuild whenever SVGs in the folders change (debounced, cached)")
+    parser.add_argument('--profile', metavar='REPORT',
+                        help="Measure every icon (parse, normalize and emit time, paths, path commands, XAML bytes) "
+                             "and write a report listing the heaviest icons, HTML for .html, JSON otherwise. "
+                             "Converts everything, ignoring the cache")
+    parser.add_argument('--verify', action='store_true',
+                        help="After converting, read every dictionary back, check that keys are unique and references "
+                             f"resolve, and check that each icon draws the same as the plain conversion of its SVG "
+                             f"(rendered at {VERIFY_SIZE} px), so optimized output modes are equivalent")
+    parser.add_argument('--multi-icons', default=DEFAULT_MULTI_ICONS_PATH,
+                        help="MultiIcons.axaml defining the TemplateColorN resources (for --verify)")
+    parser.add_argument('--jobs', type=int, help="Number of worker processes (default: all cores)")
+    parser.add_argument('--output-dir', help="Directory for the generated .axaml files (default: next to each folder)")
+    parser.add_argument('--cache-dir', help=f"Incremental rebuild cache directory (default: {DEFAULT_CACHE_DIR_NAME} in the output directory)")
+    parser.add_argument('--no-cache', action='store_true', help="Convert every SVG again, ignoring and not writing the cache")
+    parser.add_argument('--stream', dest='streaming', action='store_const', const=True,
+                        help=f"Read every SVG with the streaming parser (default: only files over {STREAMING_THRESHOLD_BYTES // 1024} KB)")
+    parser.add_argument('--no-stream', dest='streaming', action='store_const', const=False,
+                        help="Always build the full element tree")
+    parser.add_argument('--minify-paths', action='store_true', help="Write shorter, faster to parse Geometry strings (rounded to --precision)")
+    parser.add_argument('--precision', type=int, default=DEFAULT_OPTIONS['precision'],
+                        help=f"Decimals kept by --minify-paths (default: {DEFAULT_OPTIONS['precision']}), "
+                             "points move at most half a unit of the last decimal")
+    parser.add_argument('--pack', action='store_true',
+                        help="Also write a compact binary .iconpack per folder (key index, shared path data, brush indices)")
+    parser.add_argument('--shard-size', type=int, default=0,
+                        help="Split each dictionary into shards of this many icons plus a key -> shard manifest")
+    parser.add_argument('--manifest-format', choices=['json', 'csv'],
+                        help="Format of the shard manifest (default: json)")
+    parser.add_argument('--no-preview', action='store_true', help="Leave out the Design.PreviewWith block")
+    parser.add_argument('--slot-index', action='store_true',
+                        help="Also write <folder>.slots.json listing the TemplateColor slot of every drawing's fill and pen")
+    parser.add_argument('--atlas-sizes',
+                        help="Comma separated pixel sizes (e.g. 32,64): also write pre-rasterized PNG atlases per folder "
+                             "plus a <folder>.atlas.json index of the tile coordinates")
+    parser.add_argument('--atlas-colors',
+                        help="Comma separated hex colors used for TemplateColor1..N in the atlases "
+                             f"(default: the preview palette {', '.join(ATLAS_TEMPLATE_COLORS)})")
+    parser.add_argument('--dedup-geometry', action='store_true',
+                        help="Emit outlines repeated across icons once as StreamGeometry resources, geometries used by "
+                             f"several folders go to {SHARED_GEOMETRY_FILE_NAME} (merge it before the icon dictionaries)")
+    parser.add_argument('--merge-drawings', action='store_true',
+                        help="Merge adjacent drawings with the same brush and pen into one geometry when they do not overlap")
+    args = parser.parse_args()
+    if args.precision < 0:
+        parser.error("--precision can not be negative.")
+    if args.shard_size < 0:
+        parser.error("--shard-size can not be negative.")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+    try:
+        atlas_sizes = sorted({int(size) for size in args.atlas_sizes.split(',')}) if args.atlas_sizes else []
+    except ValueError:
+        parser.error("--atlas-sizes must be a comma separated list of pixel sizes.")
+    if any(size <= 0 or size > ATLAS_MAX_DIMENSION for size in atlas_sizes):
+        parser.error(f"--atlas-sizes must be between 1 and {ATLAS_MAX_DIMENSION}.")
+    atlas_colors = [color.strip() for color in args.atlas_colors.split(',')] if args.atlas_colors else []
+    if not all(re.fullmatch(r'#([0-9a-fA-F]{6}|[0-9a-fA-F]{8})', color) for color in atlas_colors):
+        parser.error("--atlas-colors must be #RRGGBB or #AARRGGBB colors.")
+
+    options = dict(DEFAULT_OPTIONS, minify_paths=args.minify_paths, precision=args.precision,
+                   merge_drawings=args.merge_drawings)
+
+    output_options = dict(DEFAULT_OUTPUT_OPTIONS, pack=args.pack, shard_size=args.shard_size,
+                          manifest_format=args.manifest_format or DEFAULT_OUTPUT_OPTIONS['manifest_format'],
+                          preview=not args.no_preview,
+                          dedup_geometry=args.dedup_geometry, atlas_sizes=atlas_sizes, atlas_colors=atlas_colors,
+                          slot_index=args.slot_index)
+
+    if not args.folders and not args.root:
+        batch_flags = {'--watch': args.watch, '--profile': args.profile, '--verify': args.verify, '--pack': args.pack,
+                       '--shard-size': args.shard_size, '--manifest-format': args.manifest_format,
+                       '--dedup-geometry': args.dedup_geometry, '--atlas-sizes': atlas_sizes,
+                       '--atlas-colors': atlas_colors, '--slot-index': args.slot_index, '--no-preview': args.no_preview,
+                       '--color-profile': args.color_profile, '--auto-colors': args.auto_colors,
+                       '--no-prompt': args.no_prompt, '--save-profile': args.save_profile, '--jobs': args.jobs,
+                       '--output-dir': args.output_dir, '--cache-dir': args.cache_dir, '--no-cache': args.no_cache}
+        used_flags = [flag for flag, value in batch_flags.items() if value]
+        if used_flags:
+            parser.error(f"{', '.join(used_flags)} only work in batch mode, pass SVG folders or --root.")
+        run_interactive(options, args.streaming)
+        return
+    if args.watch and (args.no_cache or args.profile):
+        parser.error("--watch relies on the rebuild cache, it can not be combined with --no-cache or --profile.")
+
+    input_folders = list(args.folders)
+    if args.root:
+        if not os.path.isdir(args.root):
+            parser.error(f"'{args.root}' is not a valid directory.")
+        input_folders.extend(find_svg_folders(args.root))
+    for input_folder in input_folders:
+        if not os.path.isdir(input_folder):
+            parser.error(f"'{input_folder}' is not a valid directory.")
+    if not input_folders:
+        parser.error(f"No folders with SVG files found in '{args.root}'.")
+
+    cache_dir = None
+    if not args.no_cache and not args.profile: # Cached icons are not converted, so they could not be measured
+        cache_dir = args.cache_dir or os.path.join(
+            os.path.dirname(default_output_path(input_folders[0], args.output_dir)), DEFAULT_CACHE_DIR_NAME)
+
+    batch_options = dict(color_profile=args.color_profile, jobs=args.jobs, output_dir=args.output_dir,
+                         cache_dir=cache_dir, options=options, output_options=output_options, streaming=args.streaming,
+                         auto_colors=args.auto_colors, prompt=not args.no_prompt, save_profile=args.save_profile,
+                         profile_report=args.profile, verify=args.verify, multi_icons_path=args.multi_icons)
+    if args.watch:
+        run_watch(input_folders, **batch_options)
+    elif not run_batch(input_folders, **batch_options):
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import svg_to_axaml as converter
+
+# --- Configuration ---
+DEFAULT_SEED = 1234 # Same seed, same corpus, so results of different versions can be compared
+DEFAULT_FOLDERS = 2
+DEFAULT_FILES_PER_FOLDER = 1000
+DEFAULT_PATHS_PER_FILE = 8
+DEFAULT_SEGMENTS_PER_PATH = 60
+DEFAULT_COLORS = 40
+DEFAULT_GROUP_DEPTH = 3
+BENCHMARK_FORMAT_VERSION = 2 # Bump when the layout of the JSON report changes
+
+# --- Synthetic Corpus ---
+def _random_color(rng):
+    return f"#{rng.randrange(0x1000000):06x}"
+
+def _random_path_data(rng, segment_count):
+    """Long path data mixing absolute/relative lines, curves and arcs, like exported Mii parts."""
+    x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+    parts = [f"M{x:.3f} {y:.3f}"]
+    for _ in range(segment_count):
+        kind = rng.choice('LlCcQsA')
+        if kind in 'Ll':
+            parts.append(f"{kind}{rng.uniform(-20, 120):.3f},{rng.uniform(-20, 120):.3f}")
+        elif kind in 'Cc':
+            numbers = " ".join(f"{rng.uniform(-20, 120):.3f}" for _ in range(6))
+            parts.append(f"{kind}{numbers}")
+        elif kind == 'Q':
+            numbers = " ".join(f"{rng.uniform(-20, 120):.3f}" for _ in range(4))
+            parts.append(f"Q{numbers}")
+        elif kind == 's':
+            numbers = " ".join(f"{rng.uniform(-10, 10):.3f}" for _ in range(4))
+            parts.append(f"s{numbers}")
+        else:
+            parts.append(f"A{rng.uniform(1, 30):.3f} {rng.uniform(1, 30):.3f} {rng.uniform(0, 90):.1f} "
+                         f"{rng.randrange(2)} {rng.randrange(2)} {rng.uniform(0, 100):.3f} {rng.uniform(0, 100):.3f}")
+    parts.append("Z")
+    return "".join(parts)
+
+def build_synthetic_svg(rng, palette, paths_per_file, segments_per_path, group_depth):
+    """Returns the text of one SVG: paths wrapped in nested groups, fills and strokes from the palette."""
+    lines = ['<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100">']
+    for index in range(paths_per_file):
+        depth = rng.randrange(group_depth + 1)
+        lines.extend('  ' * (level + 1) + '<g>' for level in range(depth))
+        indent = '  ' * (depth + 1)
+        d = _random_path_data(rng, segments_per_path)
+        if index % 3 == 2:
+            lines.append(f'{indent}<path d="{d}" fill="none" stroke="{rng.choice(palette)}" stroke-width="{rng.uniform(0.5, 4):.2f}"/>')
+        elif index % 3 == 1:
+            lines.append(f'{indent}<path d="{d}" style="fill:{rng.choice(palette)}"/>')
+        else:
+            lines.append(f'{indent}<path d="{d}" fill="{rng.choice(palette)}"/>')
+        lines.extend('  ' * level + '</g>' for level in range(depth, 0, -1))
+    lines.append('</svg>')
+    return "\n".join(lines) + "\n"
+
+def generate_corpus(corpus_dir, folders=DEFAULT_FOLDERS, files_per_folder=DEFAULT_FILES_PER_FOLDER,
+                    paths_per_file=DEFAULT_PATHS_PER_FILE, segments_per_path=DEFAULT_SEGMENTS_PER_PATH,
+                    colors=DEFAULT_COLORS, group_depth=DEFAULT_GROUP_DEPTH, seed=DEFAULT_SEED):
+    """Writes folders of synthetic SVGs (BenchFamily00, BenchFamily01, ...) and returns their paths."""
+    rng = random.Random(seed)
+    palette = [_random_color(rng) for _ in range(colors)]
+    folder_paths = []
+    for folder_index in range(folders):
+        folder_path = os.path.join(corpus_dir, f"BenchFamily{folder_index:02d}")
+        os.makedirs(folder_path, exist_ok=True)
+        for file_index in range(files_per_folder):
+            svg_text = build_synthetic_svg(rng, palette, paths_per_file, segments_per_path, group_depth)
+            with open(os.path.join(folder_path, f"icon{file_index:05d}.svg"), 'w', encoding='utf-8') as f:
+                f.write(svg_text)
+        folder_paths.append(folder_path)
+    return folder_paths
+
+# --- Stage Timing ---
+class StageTimer:
+    """Measures wall time and peak memory of every stage, keyed by stage name.
+
+    Tracing allocations slows the stages down several times, so the same work runs twice: once timed without
+    tracemalloc, then with trace_memory set (and tracemalloc started) to measure memory. A stage's peak is counted
+    from the memory traced when it starts, so what earlier stages keep alive is not part of it.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.trace_memory = False
+
+    def run(self, name, function, *args):
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'peak_memory_bytes': 0, 'calls': 0})
+        if self.trace_memory:
+            start_memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = function(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            stage['peak_memory_bytes'] = max(stage['peak_memory_bytes'], peak - start_memory)
+            return result
+        start = time.perf_counter()
+        result = function(*args)
+        stage['seconds'] += time.perf_counter() - start
+        stage['calls'] += 1
+        return result
+
+def benchmark_folder(svg_folder, output_path, options, streaming=None):
+    """Converts one folder like batch mode does, but stage by stage, and returns the measurements.
+
+    The folder is converted twice, a timed pass and a memory traced pass (see StageTimer).
+    """
+    timer = StageTimer()
+    result = convert_folder_in_stages(svg_folder, output_path, options, streaming, timer)
+    timer.trace_memory = True
+    tracemalloc.start()
+    try:
+        convert_folder_in_stages(svg_folder, output_path, options, streaming, timer)
+    finally:
+        tracemalloc.stop()
+    result['stages'] = timer.stages
+    return result
+
+def convert_folder_in_stages(svg_folder, output_path, options, streaming, timer):
+    """Runs every stage of one folder's conversion through timer and returns the folder's sizes and counts."""
+    svg_files = converter.list_svg_files(svg_folder)
+
+    def scan_colors():
+        documents = converter.parse_svg_folder(svg_folder, svg_files, streaming)
+        color_usage = {}
+        for _, document in documents:
+            for color, usage in document['color_usage'].items():
+                totals = color_usage.setdefault(color, {'icons': 0, 'fill': 0, 'stroke': 0})
+                totals['icons'] += 1
+                totals['fill'] += usage['fill']
+                totals['stroke'] += usage['stroke']
+        return documents, color_usage
+
+    def map_colors(color_usage):
+        colors = converter.sort_unique_colors(set(color_usage))
+        choices = converter.resolve_color_choices(colors, color_usage, auto=True, prompt=False)
+        return converter.build_color_map(choices, quiet=True)
+
+    documents, color_usage = timer.run('color_scan', scan_colors)
+    color_map = timer.run('color_mapping', map_colors, color_usage)
+
+    xaml_outputs = []
+    resource_keys = []
+    icon_sizes = []
+    for filename, document in documents:
+        output_key = converter.sanitize_key(filename)
+        xaml_output = timer.run('generate_xaml', converter.generate_xaml_for_svg, document, output_key, color_map, options)
+        if xaml_output:
+            xaml_outputs.append(xaml_output)
+            resource_keys.append(output_key)
+            icon_sizes.append(len(xaml_output.encode('utf-8')))
+
+    timer.run('preview', converter.generate_preview_xaml, resource_keys)
+    final_xaml = converter.build_resource_dictionary(os.path.basename(svg_folder), xaml_outputs, resource_keys,
+                                                     "Color mappings were assigned automatically by palette clustering")
+    timer.run('write', converter.write_output_file, output_path, final_xaml, "benchmark dictionary")
+
+    output_bytes = os.path.getsize(output_path)
+    return {
+        'folder': os.path.basename(svg_folder),
+        'files': len(svg_files),
+        'icons': len(resource_keys),
+        'colors': len(color_usage),
+        'input_bytes': sum(os.path.getsize(os.path.join(svg_folder, f)) for f in svg_files),
+        'output_bytes': output_bytes,
+        'output_bytes_per_icon': output_bytes / len(resource_keys) if resource_keys else 0,
+        'largest_icon_bytes': max(icon_sizes, default=0),
+    }
+
+def summarize(folder_results):
+    """Adds up the stage measurements of every folder."""
+    stages = {}
+    for result in folder_results:
+        for name, stage in result['stages'].items():
+            total = stages.setdefault(name, {'seconds': 0.0, 'peak_memory_bytes': 0, 'calls': 0})
+            total['seconds'] += stage['seconds']
+            total['peak_memory_bytes'] = max(total['peak_memory_bytes'], stage['peak_memory_bytes'])
+            total['calls'] += stage['calls']
+    icons = sum(result['icons'] for result in folder_results)
+    output_bytes = sum(result['output_bytes'] for result in folder_results)
+    return {
+        'icons': icons,
+        'seconds': sum(stage['seconds'] for stage in stages.values()),
+        'peak_memory_bytes': max((stage['peak_memory_bytes'] for stage in stages.values()), default=0),
+        'output_bytes': output_bytes,
+        'output_bytes_per_icon': output_bytes / icons if icons else 0,
+        'stages': stages,
+    }
+
+def print_summary(summary):
+    print(f"\n{'Stage':<16}{'Seconds':>10}{'Peak MB':>10}{'Calls':>8}")
+    for name, stage in summary['stages'].items():
+        print(f"{name:<16}{stage['seconds']:>10.3f}{stage['peak_memory_bytes'] / 1048576:>10.1f}{stage['calls']:>8}")
+    print(f"{'total':<16}{summary['seconds']:>10.3f}{summary['peak_memory_bytes'] / 1048576:>10.1f}")
+    print(f"\n{summary['icons']} icons, {summary['output_bytes']} bytes written, "
+          f"{summary['output_bytes_per_icon']:.0f} bytes per icon")
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks svg_to_axaml.py stage by stage on a synthetic (or given) SVG corpus "
+                    "and writes the results as JSON.")
+    parser.add_argument('--corpus', help="Existing folder of SVG folders to benchmark instead of a synthetic corpus")
+    parser.add_argument('--keep-corpus', help="Generate the synthetic corpus into this directory and keep it")
+    parser.add_argument('--folders', type=int, default=DEFAULT_FOLDERS, help=f"Synthetic folders (default: {DEFAULT_FOLDERS})")
+    parser.add_argument('--files', type=int, default=DEFAULT_FILES_PER_FOLDER,
+                        help=f"SVGs per synthetic folder (default: {DEFAULT_FILES_PER_FOLDER})")
+    parser.add_argument('--paths', type=int, default=DEFAULT_PATHS_PER_FILE, help=f"Paths per SVG (default: {DEFAULT_PATHS_PER_FILE})")
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS_PER_PATH,
+                        help=f"Segments per path (default: {DEFAULT_SEGMENTS_PER_PATH})")
+    parser.add_argument('--colors', type=int, default=DEFAULT_COLORS, help=f"Palette size (default: {DEFAULT_COLORS})")
+    parser.add_argument('--group-depth', type=int, default=DEFAULT_GROUP_DEPTH,
+                        help=f"Maximum nesting of <g> around a path (default: {DEFAULT_GROUP_DEPTH})")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f"Corpus seed (default: {DEFAULT_SEED})")
+    parser.add_argument('--minify-paths', action='store_true', help="Benchmark with --minify-paths")
+    parser.add_argument('--merge-drawings', action='store_true', help="Benchmark with --merge-drawings")
+    parser.add_argument('--stream', dest='streaming', action='store_const', const=True, help="Read every SVG with the streaming parser")
+    parser.add_argument('--output', default="svg_to_axaml_bench.json", help="JSON results file (default: svg_to_axaml_bench.json)")
+    args = parser.parse_args()
+
+    options = dict(converter.DEFAULT_OPTIONS, minify_paths=args.minify_paths, merge_drawings=args.merge_drawings)
+
+    with tempfile.TemporaryDirectory(prefix="svg_to_axaml_bench_") as work_dir:
+        if args.corpus:
+            svg_folders = converter.find_svg_folders(args.corpus)
+            if not svg_folders:
+                parser.error(f"No folders with SVG files found in '{args.corpus}'.")
+        else:
+            corpus_dir = args.keep_corpus or os.path.join(work_dir, "corpus")
+            print(f"Generating synthetic corpus in: {corpus_dir}")
+            svg_folders = generate_corpus(corpus_dir, args.folders, args.files, args.paths, args.segments,
+                                          args.colors, args.group_depth, args.seed)
+
+        folder_results = []
+        for svg_folder in svg_folders:
+            print(f"Benchmarking: {svg_folder}")
+            output_path = converter.default_output_path(svg_folder, os.path.join(work_dir, "output"))
+            folder_results.append(benchmark_folder(svg_folder, output_path, options, args.streaming))
+
+    summary = summarize(folder_results)
+    print_summary(summary)
+
+    report = {
+        'format_version': BENCHMARK_FORMAT_VERSION,
+        'generator_version': converter.GENERATOR_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {'path': args.corpus} if args.corpus else {
+            'folders': args.folders, 'files_per_folder': args.files, 'paths_per_file': args.paths,
+            'segments_per_path': args.segments, 'colors': args.colors, 'group_depth': args.group_depth,
+            'seed': args.seed,
+        },
+        'options': options,
+        'streaming': args.streaming,
+        'summary': summary,
+        'folders': folder_results,
+    }
+    if not converter.write_output_file(args.output, json.dumps(report, indent=2) + "\n", "benchmark results"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,905 @@
+import contextlib
+import io
+import json
+import math
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from unittest import mock
+
+import svg_to_axaml as converter
+
+# Run with: python -m unittest test_svg_to_axaml (from this folder)
+
+# --- Helpers ---
+# Long enough that --dedup-geometry shares it between MiiNose00 and MiiNose02
+SHARED_OUTLINE = "M4 4 " + " ".join(f"L{4 + index * .5} {4 + (index * 7) % 20}" for index in range(48)) + " Z"
+SAMPLE_SVGS = {
+    "MiiNose00.svg": '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 32 32">'
+                     f'<path d="{SHARED_OUTLINE}" fill="#ff0000"/>'
+                     '<path d="M8 8 h16" stroke="#00ff00" stroke-width="2" fill="none"/></svg>',
+    "MiiNose01.svg": '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 32 32">'
+                     '<circle cx="16" cy="16" r="10" fill="#0000ff"/>'
+                     '<g transform="translate(2 3)"><rect x="4" y="4" width="8" height="6" fill="#ff0000"/></g></svg>',
+    "MiiNose02.svg": '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 32 32">'
+                     f'<path d="{SHARED_OUTLINE.replace("L", " L ")}" fill="#0000ff"/></svg>', # Same outline, other text
+}
+SAMPLE_COLOR_PROFILE = {"#ff0000": 1, "#00ff00": 2, "#0000ff": 0}
+
+def write_sample_folder(root, name="MiiNose", svgs=SAMPLE_SVGS):
+    """Writes svgs into root/name and returns the folder path."""
+    folder = os.path.join(root, name)
+    os.makedirs(folder, exist_ok=True)
+    for filename, content in svgs.items():
+        with open(os.path.join(folder, filename), 'w', encoding='utf-8') as f:
+            f.write(content)
+    return folder
+
+def run_quiet_batch(folders, output_dir, **batch_options):
+    """Runs a non-interactive batch with the sample color profile, returning (success, printed output)."""
+    profile_path = os.path.join(output_dir, "profile.json")
+    os.makedirs(output_dir, exist_ok=True)
+    with open(profile_path, 'w', encoding='utf-8') as f:
+        json.dump(SAMPLE_COLOR_PROFILE, f)
+    batch_options.setdefault('jobs', 1)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        success = converter.run_batch(folders, color_profile=profile_path, output_dir=output_dir, prompt=False,
+                                      **batch_options)
+    return success, output.getvalue()
+
+def drawing_image_fragments(xaml_text):
+    """Returns {key: fragment} of the DrawingImage fragments in a written dictionary, as render_drawing_image wrote them."""
+    return {match.group(1): match.group(0) for match in
+            re.finditer(r'\n    <DrawingImage x:Key="([^"]+)">.*?</DrawingImage>', xaml_text, re.DOTALL)}
+
+def polyline_distance(points, polylines):
+    """Largest distance from any of points to the closest segment of polylines."""
+    segments = [(a, b) for polyline, _ in polylines for a, b in zip(polyline, polyline[1:])]
+    worst = 0.0
+    for px, py in points:
+        best = math.inf
+        for (ax, ay), (bx, by) in segments:
+            dx, dy = bx - ax, by - ay
+            length = dx * dx + dy * dy
+            t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length)) if length else 0.0
+            best = min(best, math.hypot(px - ax - t * dx, py - ay - t * dy))
+        worst = max(worst, best)
+    return worst
+
+def path_distance(path_a, path_b, tolerance=1e-4):
+    """Symmetric distance between two paths, both flattened with tolerance."""
+    a = converter.flatten_path_data(path_a, tolerance)
+    b = converter.flatten_path_data(path_b, tolerance)
+    return max(polyline_distance([p for points, _ in a for p in points], b),
+               polyline_distance([p for points, _ in b for p in points], a))
+
+# --- Path Data Optimization ---
+class MinifyPathDataTests(unittest.TestCase):
+    def assert_within_precision(self, path_data, precision):
+        minified = converter.minify_path_data(path_data, precision)
+        # A snapped point may move half a unit of the last decimal on each axis
+        limit = math.hypot(0.5, 0.5) * 10 ** -precision + 2e-4
+        self.assertLessEqual(path_distance(path_data, minified), limit, f"{path_data!r} -> {minified!r}")
+        return minified
+
+    def test_lines_are_rounded_and_merged(self):
+        self.assertEqual(converter.minify_path_data("M 0 0 L 1.0001 0 L 2 0 L 2 3.14159", 2), "M0 0H2V3.14")
+
+    def test_relative_commands_do_not_accumulate_rounding(self):
+        path_data = "M0 0" + "l.0049 .0049" * 200
+        minified = self.assert_within_precision(path_data, 2)
+        end = converter.flatten_path_data(minified, 0.01)[0][0][-1]
+        self.assertAlmostEqual(end[0], 0.98, places=6)
+
+    def test_gentle_curves_drawn_as_lines_are_not_straightened(self):
+        points = [(index * .1, (index * .1) ** 2 / 100) for index in range(100)]
+        path_data = "M0 0" + "".join(f"L{x:.6f} {y:.6f}" for x, y in points[1:])
+        minified = self.assert_within_precision(path_data, 2)
+        self.assertLess(len(minified), len(path_data))
+
+    def test_arc_near_a_diameter_keeps_exact_radii(self):
+        minified = self.assert_within_precision("M0 0A10.004 10.004 0 0 1 20 0", 2)
+        self.assertIn("10.004", minified)
+
+    def test_arc_with_moved_end_points_falls_back_to_curves(self):
+        minified = self.assert_within_precision("M0.004 0A10.004 10.004 0 0 1 20.003 0", 2)
+        self.assertNotIn("A", minified.upper())
+
+    def test_smooth_curves_after_the_curve_fallback_keep_their_start(self):
+        minified = self.assert_within_precision("M0.004 0A10.004 10.004 0 0 1 20.003 0S30 10 40 0", 2)
+        self.assertNotIn("S", minified.upper())
+
+    def test_mirrored_control_points_do_not_accumulate_rounding(self):
+        self.assert_within_precision("M0 0Q1.004 3.004 2.006 0" + "".join(f"T{2.006 * index:.3f} .004" for index in range(2, 6)), 2)
+        self.assert_within_precision("M0 0C.004 1.006 1.004 1.006 1.006 .004S2.004 -1.004 2.006 .004"
+                                     "S3.004 1.006 3.006 .004", 2)
+
+    def test_ordinary_arcs_stay_arcs(self):
+        for path_data in ("M1 1a4 4 0 1 1 8 0a4 4 0 1 1 -8 0z",
+                          "M0 0A5.12345 3.2 30.123 1 0 7.1111 2.2222L1 1",
+                          "M10 10A0 5 0 0 1 13.333 14"):
+            minified = self.assert_within_precision(path_data, 2)
+            self.assertIn("A", minified.upper())
+
+    def test_arcs_at_every_precision(self):
+        for precision in range(0, 5):
+            for path_data in ("M3.14159 2.71828A7.5 2.25 45 0 1 12.3456 7.891",
+                              "M0 0A50.0001 50.0001 0 1 0 100 0"):
+                self.assert_within_precision(path_data, precision)
+
+
+# --- Drawing Merging ---
+def fill_drawing(geometry, brush="#FF0000"):
+    """A filled drawing record as generate_drawings_for_svg returns them."""
+    return {'geometry': geometry, 'brush': brush, 'pen_brush': None, 'thickness': None}
+
+class MergeDrawingsTests(unittest.TestCase):
+    def merge(self, drawings):
+        return converter.merge_drawings([dict(drawing) for drawing in drawings], "test.svg")
+
+    def test_separate_shapes_with_the_same_brush_are_merged(self):
+        drawings = [fill_drawing("M0 0 L4 0 L4 4 Z"), fill_drawing("M10 0 L14 0 L14 4 Z"), fill_drawing("M0 10 L4 10 L4 14 Z")]
+        merged = self.merge(drawings)
+        self.assertEqual(merged, [fill_drawing("M0 0 L4 0 L4 4 ZM10 0 L14 0 L14 4 ZM0 10 L4 10 L4 14 Z")])
+        self.assertEqual(converter.rasterize_drawings(merged, 16, []), converter.rasterize_drawings(drawings, 16, []))
+
+    def test_overlapping_shapes_are_not_merged(self):
+        # Merged, the even-odd fill rule would cut the overlap out
+        drawings = [fill_drawing("M0 0 L4 0 L4 4 L0 4 Z"), fill_drawing("M2 2 L6 2 L6 6 L2 6 Z")]
+        self.assertEqual(self.merge(drawings), drawings)
+
+    def test_touching_shapes_are_not_merged(self):
+        drawings = [fill_drawing("M0 0 L4 0 L4 4 Z"), fill_drawing("M4 0 L8 0 L8 4 Z")]
+        self.assertEqual(self.merge(drawings), drawings)
+
+    def test_only_adjacent_drawings_with_the_same_style_are_merged(self):
+        drawings = [fill_drawing("M0 0 L1 0 L1 1 Z"), fill_drawing("M5 0 L6 0 L6 1 Z", "#0000FF"), fill_drawing("M10 0 L11 0 L11 1 Z")]
+        self.assertEqual(self.merge(drawings), drawings) # The middle drawing has to stay painted in between
+        stroked = dict(fill_drawing("M20 0 L21 0"), pen_brush="#FF0000", thickness=1.0)
+        self.assertEqual(self.merge([fill_drawing("M0 0 L1 0 L1 1 Z"), stroked]), [fill_drawing("M0 0 L1 0 L1 1 Z"), stroked])
+
+    def test_pen_thickness_keeps_nearby_strokes_apart(self):
+        def stroke(geometry):
+            return {'geometry': geometry, 'brush': None, 'pen_brush': "#000000", 'thickness': 1.0}
+        # Miter joins can reach up to PEN_MITER_LIMIT / 2 thicknesses past the path
+        near = [stroke("M0 0 L4 0 L0 1"), stroke("M8 0 L12 0")]
+        self.assertEqual(self.merge(near), near)
+        far = [stroke("M0 0 L4 0 L0 1"), stroke("M20 0 L24 0")]
+        self.assertEqual(len(self.merge(far)), 1)
+
+    def test_relative_leading_moves_are_written_out_absolute(self):
+        merged = self.merge([fill_drawing("M0 0 L4 0 L4 4 Z"), fill_drawing("m10 0 l4 0 l0 4 z")])
+        self.assertEqual(len(merged), 1)
+        self.assertLess(path_distance(merged[0]['geometry'], "M0 0 L4 0 L4 4 Z M10 0 L14 0 L14 4 Z"), 1e-6)
+
+    def test_unreadable_path_data_is_left_alone(self):
+        drawings = [fill_drawing("M0 0 L4 0 L4 4 Z"), fill_drawing("M10 0 Q oops")]
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(self.merge(drawings), drawings)
+        self.assertIn("Not merging a path in test.svg", output.getvalue())
+
+
+# --- SVG Shapes and Transforms ---
+class SvgShapeTests(unittest.TestCase):
+    def parse(self, body, streaming=False):
+        """Parses an SVG with body inside its root element, returning (shapes, printed output)."""
+        with tempfile.NamedTemporaryFile('w', suffix='.svg', delete=False) as f:
+            f.write(f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 32 32">{body}</svg>')
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                document = converter.parse_svg_document(f.name, None, streaming)
+        finally:
+            os.remove(f.name)
+        return document['shapes'], output.getvalue()
+
+    def assert_same_outline(self, path_a, path_b):
+        self.assertLessEqual(path_distance(path_a, path_b), 1e-3, f"{path_a!r} != {path_b!r}")
+
+    def test_transforms_are_baked_into_the_path_data(self):
+        shapes, _ = self.parse('<g transform="translate(10 5)"><rect x="1" y="2" width="4" height="3" '
+                               'transform="scale(2)" fill="#ff0000"/></g>')
+        self.assertEqual(len(shapes), 1)
+        self.assert_same_outline(shapes[0]['d'], "M12 9H20V15H12Z")
+
+    def test_use_references_are_expanded_with_their_offset(self):
+        shapes, _ = self.parse('<defs><path id="p" d="M0 0L4 0L4 4Z"/></defs>'
+                               '<use href="#p" x="3" y="1" fill="#00ff00"/>')
+        self.assertEqual([shape['fill'] for shape in shapes], ["#00ff00"])
+        self.assert_same_outline(shapes[0]['d'], "M3 1L7 1L7 5Z")
+
+    def test_nested_svg_viewports_are_baked_into_the_path_data(self):
+        for streaming in (False, True):
+            with self.subTest(streaming=streaming):
+                shapes, _ = self.parse('<svg x="10" y="10"><rect width="1" height="1"/></svg>'
+                                       '<svg x="2" y="4" width="8" height="4" viewBox="0 0 4 4">'
+                                       '<rect width="4" height="4"/></svg>', streaming)
+                self.assert_same_outline(shapes[0]['d'], "M10 10H11V11H10Z")
+                self.assert_same_outline(shapes[1]['d'], "M4 4H8V8H4Z") # meet, centered horizontally
+
+    def test_use_sizes_the_symbol_viewport(self):
+        for streaming in (False, True):
+            with self.subTest(streaming=streaming):
+                shapes, _ = self.parse('<defs><symbol id="s" viewBox="1 1 2 2" preserveAspectRatio="none">'
+                                       '<rect x="1" y="1" width="2" height="2"/></symbol></defs>'
+                                       '<use href="#s" x="3" y="5" width="4" height="2"/>'
+                                       '<use href="#s"/>', streaming)
+                self.assert_same_outline(shapes[0]['d'], "M3 5H7V7H3Z")
+                self.assert_same_outline(shapes[1]['d'], "M0 0H32V32H0Z") # 100% of the root viewport
+
+    def test_percentage_viewport_sizes_are_skipped_with_a_warning(self):
+        shapes, output = self.parse('<svg width="50%" height="50%" viewBox="0 0 1 1"><rect width="1" height="1"/></svg>')
+        self.assertEqual(shapes, [])
+        self.assertIn("Skipping <svg>", output)
+
+    def test_circles_become_arcs_of_the_same_outline(self):
+        shapes, _ = self.parse('<circle cx="16" cy="16" r="10" fill="#0000ff"/>')
+        points = [p for points, _ in converter.flatten_path_data(shapes[0]['d'], 1e-3) for p in points]
+        for x, y in points:
+            self.assertAlmostEqual(math.hypot(x - 16, y - 16), 10, delta=1e-3)
+
+    def drawings(self, body):
+        shapes, _ = self.parse(body)
+        color_map = {"black": "#000000", "#ff0000": "{StaticResource TemplateColor1}"}
+        return converter.build_drawings({'source': "test.svg", 'shapes': shapes}, color_map)
+
+    def test_shapes_without_fill_are_filled_black(self):
+        drawings = self.drawings('<circle cx="4" cy="4" r="2"/><rect width="2" height="2"/><path d="M0 0H4V4Z"/>')
+        self.assertEqual([drawing['brush'] for drawing in drawings], ["#000000"] * 3)
+
+    def test_strokes_without_width_are_one_unit_wide(self):
+        drawings = self.drawings('<line x2="8" y2="8" stroke="#ff0000"/><polyline points="1,1 5,5 9,1" fill="none" stroke="#ff0000"/>')
+        self.assertEqual([(drawing['pen_brush'], drawing['thickness']) for drawing in drawings],
+                         [("{StaticResource TemplateColor1}", 1.0)] * 2)
+        self.assertIsNone(drawings[0]['brush'])
+
+    def test_group_opacity_is_multiplied_into_every_shape(self):
+        shapes, _ = self.parse('<g opacity="0.5"><rect width="4" height="4" fill="#ff0000" fill-opacity="0.5"/></g>')
+        self.assertAlmostEqual(shapes[0]['fill_opacity'], 0.25)
+
+    def test_translucent_groups_with_several_shapes_warn(self):
+        body = ('<g opacity="0.5"><rect width="6" height="6" fill="#ff0000"/><rect x="3" y="3" width="6" height="6" '
+                'fill="#ff0000"/></g><g opacity="0.5"><rect width="1" height="1" fill="#ff0000"/></g>')
+        for streaming in (False, True):
+            with self.subTest(streaming=streaming):
+                _, output = self.parse(body, streaming)
+                self.assertEqual(output.count("Warning: Opacity of <g>"), 1, output)
+
+    def test_streaming_second_pass_warns_once(self):
+        # The drawn group is discarded before the <use> of it is seen, so it is streamed again
+        body = ('<g opacity="0.5"><rect width="6" height="6" fill="#ff0000"/><rect x="3" y="3" width="6" height="6" '
+                'fill="#ff0000"/></g><g id="g"><rect width="1" height="1"/></g><use href="#g" x="4"/>')
+        shapes, output = self.parse(body, True)
+        self.assertEqual(len(shapes), 4)
+        self.assertEqual(output.count("Warning: Opacity of <g>"), 1, output)
+
+    def test_streaming_expands_use_without_the_tree_reader(self):
+        body = ('<use href="#later" x="1"/><defs><symbol id="s"><rect width="2" height="2"/><use href="#p" y="3"/></symbol>'
+                '<path id="p" d="M0 0H1V1Z" fill="#00ff00"/></defs><g display="none"><rect id="hidden" width="3" height="3"/></g>'
+                '<use href="#s" x="5" fill="#ff0000"/><g id="drawn"><circle r="1"/></g><use href="#drawn" y="8"/>'
+                '<use href="#hidden"/><g opacity="0.5"><use href="#s"/></g><rect id="later" width="4" height="1"/>')
+        expected, _ = self.parse(body, False)
+        with mock.patch.object(converter.ET, 'parse', side_effect=AssertionError("streaming read the whole tree")):
+            shapes, output = self.parse(body, True)
+        self.assertEqual(shapes, expected)
+        self.assertEqual(len(shapes), 9)
+        self.assertEqual(output.count("Warning: Opacity of <g>"), 1, output)
+
+    def test_streaming_and_tree_readers_agree(self):
+        body = ('<g transform="rotate(30 16 16)" fill="#ff0000"><rect width="8" height="4" rx="1"/>'
+                '<ellipse cx="5" cy="6" rx="3" ry="2" stroke="#00ff00" stroke-width="2"/></g>'
+                '<polyline points="1,1 5,5 9,1" fill="none" stroke="#0000ff"/><g display="none"><rect width="1" height="1"/></g>')
+        self.assertEqual(self.parse(body, False), self.parse(body, True))
+
+
+# --- Color Mapping ---
+class ColorMappingTests(unittest.TestCase):
+    def resolve_quietly(self, colors, usage, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return converter.resolve_color_choices(colors, usage, **kwargs)
+
+    def test_auto_outliers_keep_their_own_color(self):
+        usage = {"#ff0000": {'icons': 2, 'fill': 2, 'stroke': 0}, "white": {'icons': 1, 'fill': 1, 'stroke': 0}}
+        choices = self.resolve_quietly(["#ff0000", "white"], usage, auto=True, prompt=False)
+        self.assertEqual(choices, {"#ff0000": 1, "white": 0})
+        self.assertEqual(converter.build_color_map(choices, quiet=True, keep_named=True),
+                         {"#ff0000": "{StaticResource TemplateColor1}", "white": "#FFFFFF"})
+
+    def test_unknown_named_colors_can_not_be_kept(self):
+        with self.assertRaises(ValueError):
+            converter.build_color_map({"papayawhip": 0}, quiet=True, keep_named=True)
+
+    def test_interactive_keep_of_named_colors_is_unchanged(self):
+        self.assertEqual(converter.build_color_map({"white": 0}, quiet=True), {"white": converter.DEFAULT_UNMAPPED_BRUSH})
+
+    def test_batch_with_auto_colors_draws_named_outliers_in_their_color(self):
+        with tempfile.TemporaryDirectory() as root:
+            folder = write_sample_folder(root, "MiiFace", {
+                "MiiFace00.svg": '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 8 8">'
+                                 '<rect width="8" height="8" fill="white"/><rect width="4" height="4" fill="#ff0000"/></svg>'})
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                success = converter.run_batch([folder], jobs=1, output_dir=root, auto_colors=True, prompt=False)
+            self.assertTrue(success, output.getvalue())
+            with open(os.path.join(root, "MiiFace.axaml"), encoding='utf-8') as f:
+                xaml = f.read()
+            self.assertIn('Brush="#FFFFFF"', xaml)
+            self.assertNotIn('Brush="Black"', xaml)
+
+    def test_batch_with_auto_colors_resolves_paint_keywords(self):
+        with tempfile.TemporaryDirectory() as root:
+            folder = write_sample_folder(root, "MiiFace", {
+                "MiiFace00.svg": '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 8 8">'
+                                 '<linearGradient id="shade"/><g fill="#ff0000" color="#00ff00">'
+                                 '<rect width="8" height="8" fill="inherit"/>'
+                                 '<rect width="4" height="4" style="fill: currentColor"/>'
+                                 '<rect width="2" height="2" fill="url(#shade)"/></g></svg>'})
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                success = converter.run_batch([folder], jobs=1, output_dir=root, auto_colors=True, prompt=False)
+            self.assertTrue(success, output.getvalue())
+            self.assertNotIn("currentcolor", output.getvalue())
+            self.assertNotIn("inherit", output.getvalue())
+            with open(os.path.join(root, "MiiFace.axaml"), encoding='utf-8') as f:
+                xaml = f.read()
+            self.assertIn('Brush="{StaticResource TemplateColor1}"', xaml) # The color property, through currentColor
+            self.assertIn('Brush="{StaticResource TemplateColor2}"', xaml) # The group fill, through inherit
+
+
+# --- Binary Icon Pack ---
+class IconPackTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_pack(self, data, name="test.iconpack"):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def build_sample_outputs(self, **output_options):
+        folder = write_sample_folder(self.root)
+        output_dir = os.path.join(self.root, "out")
+        success, output = run_quiet_batch([folder], output_dir,
+                                          output_options=dict(converter.DEFAULT_OUTPUT_OPTIONS, pack=True, **output_options))
+        self.assertTrue(success, output)
+        return output_dir
+
+    def test_reader_matches_the_written_dictionary_text(self):
+        output_dir = self.build_sample_outputs()
+        with open(os.path.join(output_dir, "MiiNose.axaml"), encoding='utf-8') as f:
+            fragments = drawing_image_fragments(f.read())
+        self.assertEqual(list(fragments), ["MiiNose00", "MiiNose01", "MiiNose02"])
+        with converter.IconPackReader(os.path.join(output_dir, "MiiNose.iconpack")) as reader:
+            self.assertEqual(reader.keys(), list(fragments))
+            for key, fragment in fragments.items():
+                self.assertEqual(reader.get_xaml(key), fragment)
+
+    def test_reader_matches_deduplicated_and_sharded_output(self):
+        output_dir = self.build_sample_outputs(dedup_geometry=True, shard_size=2)
+        dictionary_paths = [os.path.join(output_dir, name) for name in sorted(os.listdir(output_dir))
+                            if name.endswith('.axaml')]
+        with open(os.path.join(output_dir, "MiiNose_00.axaml"), encoding='utf-8') as f:
+            self.assertIn('Geometry="{StaticResource MiiNoseGeometry_', f.read())
+        pack_path = os.path.join(output_dir, "MiiNose.iconpack")
+        self.assertEqual(converter.verify_icon_pack(pack_path, dictionary_paths), [])
+        with converter.IconPackReader(pack_path) as reader:
+            # The pack inlines the path data the dictionaries share as a StreamGeometry
+            self.assertNotIn("Geometry=\"{StaticResource", reader.get_xaml("MiiNose00"))
+
+    def test_verify_reports_a_pack_that_differs_from_the_xaml(self):
+        output_dir = self.build_sample_outputs()
+        dictionary_path = os.path.join(output_dir, "MiiNose.axaml")
+        pack_path = os.path.join(output_dir, "MiiNose.iconpack")
+        with converter.IconPackReader(pack_path) as reader:
+            entries = [(key, reader.get_drawings(key)) for key in reader.keys()]
+        entries[1][1][0]['brush'] = "Black"
+        self.write_pack(converter.build_icon_pack(entries[::-1]), "MiiNose.iconpack")
+        os.replace(os.path.join(self.root, "MiiNose.iconpack"), pack_path)
+        self.assertEqual(converter.verify_icon_pack(pack_path, [dictionary_path]),
+                         ["Key order differs from the XAML output", "Icon MiiNose01 differs from the XAML output"])
+
+    def test_empty_pack_round_trips(self):
+        with converter.IconPackReader(self.write_pack(converter.build_icon_pack([]))) as reader:
+            self.assertEqual(reader.keys(), [])
+            self.assertNotIn("MiiNose00", reader)
+
+    def test_drawings_round_trip(self):
+        drawings = [{'geometry': "M0 0L1 1", 'brush': "{StaticResource TemplateColor1}", 'pen_brush': None, 'thickness': None},
+                    {'geometry': "M0 0L1 1", 'brush': None, 'pen_brush': "#ff00ff00", 'thickness': 0.25},
+                    {'geometry': "M2 2Z", 'brush': "Black", 'pen_brush': "Black", 'thickness': 3.0}]
+        with converter.IconPackReader(self.write_pack(converter.build_icon_pack([("A", drawings), ("B", [])]))) as reader:
+            self.assertEqual(reader.keys(), ["A", "B"])
+            self.assertEqual(reader.get_drawings("A"), drawings)
+            self.assertEqual(reader.get_drawings("B"), [])
+
+    def test_malformed_packs_raise_value_error(self):
+        pack = converter.build_icon_pack([("A", [{'geometry': "M0 0L1 1", 'brush': "Black",
+                                                  'pen_brush': None, 'thickness': None}])])
+        damaged_key_range = bytearray(pack)
+        key_offset = converter._PACK_HEADER.unpack_from(pack, 0)[9]
+        damaged_key_range[key_offset + 2 + 1:key_offset + 2 + 1 + 4] = (5).to_bytes(4, 'little')
+        cases = {
+            "empty": b"",
+            "short header": pack[:10],
+            "wrong magic": b"XXXX" + pack[4:],
+            "wrong version": pack[:4] + (99).to_bytes(2, 'little') + pack[6:],
+            "truncated": pack[:-4],
+            "key range past the drawings": bytes(damaged_key_range),
+        }
+        for name, data in cases.items():
+            with self.subTest(name):
+                with self.assertRaises(ValueError):
+                    converter.IconPackReader(self.write_pack(data))
+
+    def test_verify_reports_a_damaged_pack(self):
+        output_dir = self.build_sample_outputs()
+        pack_path = os.path.join(output_dir, "MiiNose.iconpack")
+        with open(pack_path, 'r+b') as f:
+            f.truncate(40)
+        problems = converter.verify_icon_pack(pack_path, [os.path.join(output_dir, "MiiNose.axaml")])
+        self.assertEqual(len(problems), 1)
+        self.assertIn("truncated", problems[0])
+
+
+# --- Icon Rasterizer ---
+def decode_png(png):
+    """Returns (width, height, RGBA bytes) of a PNG as encode_png writes it (one IDAT chunk, no row filters)."""
+    width, height = struct.unpack('>II', png[16:24])
+    idat_length, kind = struct.unpack('>I4s', png[33:41])
+    assert kind == b'IDAT', kind
+    raw = zlib.decompress(png[41:41 + idat_length])
+    stride = width * 4 + 1
+    return width, height, b''.join(raw[row * stride + 1:(row + 1) * stride] for row in range(height))
+
+def alpha_rows(rgba, size):
+    """The alpha channel of a size x size RGBA image, one tuple per row."""
+    return [tuple(rgba[(row * size + column) * 4 + 3] for column in range(size)) for row in range(size)]
+
+class RasterizerTests(unittest.TestCase):
+    def test_pixel_aligned_squares_cover_whole_pixels(self):
+        coverage = converter.rasterize_polygons([[(1, 1), (3, 1), (3, 3), (1, 3)]], 4, 4)
+        self.assertEqual(coverage, [0, 0, 0, 0,
+                                    0, 1, 1, 0,
+                                    0, 1, 1, 0,
+                                    0, 0, 0, 0])
+
+    def test_partial_pixels_get_their_covered_area(self):
+        coverage = converter.rasterize_polygons([[(0, 0), (4, 0), (0, 4)]], 4, 4)
+        self.assertAlmostEqual(sum(coverage), 8.0)
+        self.assertAlmostEqual(coverage[0], 1.0)
+        self.assertAlmostEqual(coverage[3], 0.5) # The diagonal halves the corner pixel
+
+    def test_fill_rules(self):
+        squares = [[(0, 0), (4, 0), (4, 4), (0, 4)], [(1, 1), (3, 1), (3, 3), (1, 3)]] # Same orientation
+        self.assertEqual(converter.rasterize_polygons(squares, 4, 4)[5], 0) # Even-odd cuts a hole
+        self.assertEqual(converter.rasterize_polygons(squares, 4, 4, nonzero=True)[5], 1)
+
+    def test_drawings_are_fitted_uniformly_and_centered(self):
+        rgba = converter.rasterize_drawings([fill_drawing("M0 0 L2 0 L2 1 L0 1 Z")], 4, [])
+        self.assertEqual(alpha_rows(rgba, 4), [(0,) * 4, (255,) * 4, (255,) * 4, (0,) * 4])
+        self.assertEqual(rgba[16:20], b'\xff\x00\x00\xff')
+
+    def test_strokes_are_outlined_with_their_thickness(self):
+        stroke = {'geometry': "M0 2 L8 2", 'brush': None, 'pen_brush': "#0000FF", 'thickness': 2.0}
+        rgba = converter.rasterize_drawings([stroke], 8, [], bounds=(0, 0, 8, 8))
+        self.assertEqual(alpha_rows(rgba, 8), [(0,) * 8, (255,) * 8, (255,) * 8] + [(0,) * 8] * 5)
+
+    def test_later_drawings_are_painted_over_earlier_ones(self):
+        drawings = [fill_drawing("M0 0 L4 0 L4 4 L0 4 Z"), fill_drawing("M0 0 L2 0 L2 4 L0 4 Z", "#800000FF")]
+        rgba = converter.rasterize_drawings(drawings, 4, [])
+        self.assertEqual(rgba[12:16], b'\xff\x00\x00\xff')
+        red, green, blue, alpha = rgba[0:4]
+        self.assertEqual((green, alpha), (0, 255))
+        self.assertAlmostEqual(red, 127, delta=1)
+        self.assertAlmostEqual(blue, 128, delta=1)
+
+    def test_brush_colors(self):
+        self.assertEqual(converter.parse_brush_color("#80FF0000", []), (1.0, 0.0, 0.0, 128 / 255))
+        self.assertEqual(converter.parse_brush_color("#0F0", []), (0.0, 1.0, 0.0, 1.0))
+        self.assertEqual(converter.parse_brush_color("White", []), (1.0, 1.0, 1.0, 1.0))
+        self.assertEqual(converter.parse_brush_color("{DynamicResource TemplateColor2}", ["#000000", "#0000FF"]),
+                         (0.0, 0.0, 1.0, 1.0))
+        # Template colors without a given color fall back to the unmapped brush
+        self.assertEqual(converter.parse_brush_color("{StaticResource TemplateColor3}", []),
+                         converter.parse_brush_color(converter.DEFAULT_UNMAPPED_BRUSH, []))
+        self.assertIsNone(converter.parse_brush_color(None, []))
+        with self.assertRaises(ValueError):
+            converter.parse_brush_color("{StaticResource SomeBrush}", [])
+
+    def test_curves_and_arcs_stay_within_tolerance(self):
+        tolerance = 0.01
+        for path_data in ("M10 0 A10 10 0 0 1 -10 0", "M10 0 A10 10 0 1 1 0 -10", "M0 -10 C5.523 -10 10 -5.523 10 0"):
+            subpaths = converter.flatten_path_data(path_data, tolerance)
+            points = [point for subpath_points, _ in subpaths for point in subpath_points]
+            for (ax, ay), (bx, by) in zip(points, points[1:]):
+                self.assertLess(abs(math.hypot(ax, ay) - 10), 0.01, path_data) # Points on the circle
+                self.assertGreater(math.hypot((ax + bx) / 2, (ay + by) / 2), 10 - tolerance - 0.01, path_data)
+
+    def test_png_round_trip(self):
+        rgba = bytes(range(2 * 3 * 4))
+        png = converter.encode_png(2, 3, rgba)
+        self.assertTrue(png.startswith(b'\x89PNG\r\n\x1a\n'))
+        self.assertEqual(decode_png(png), (2, 3, rgba))
+
+    def test_atlases_place_every_tile_on_its_page(self):
+        tiles = [(f"Icon{index}", bytes([index]) * (4 * 4 * 4)) for index in range(1, 8)]
+        with mock.patch.object(converter, 'ATLAS_MAX_DIMENSION', 9): # Two columns and rows of 4 px tiles per page
+            pages, placements = converter.build_icon_atlases(tiles, 4)
+        self.assertEqual([page_index for page_index, _ in pages], [0, 1])
+        decoded = [decode_png(png) for _, png in pages]
+        self.assertEqual(decoded[0][:2], (9, 9))
+        for key, rgba in tiles:
+            page_index, x, y = placements[key]
+            width, _, pixels = decoded[page_index]
+            for row in range(4):
+                start = ((y + row) * width + x) * 4
+                self.assertEqual(pixels[start:start + 16], rgba[row * 16:(row + 1) * 16], key)
+
+    def test_batch_writes_atlases_and_their_index(self):
+        with tempfile.TemporaryDirectory() as root:
+            folder = write_sample_folder(root)
+            output_dir = os.path.join(root, "out")
+            success, output = run_quiet_batch([folder], output_dir, output_options=dict(
+                converter.DEFAULT_OUTPUT_OPTIONS, atlas_sizes=[16], atlas_colors=["#FF0000"]))
+            self.assertTrue(success, output)
+            with open(os.path.join(output_dir, "MiiNose.atlas.json")) as f:
+                index = json.load(f)
+            self.assertEqual(index['template_colors'][:2], ["#FF0000", converter.ATLAS_TEMPLATE_COLORS[1]])
+            icons = index['sizes']['16']['icons']
+            self.assertEqual(sorted(icons), ["MiiNose00", "MiiNose01", "MiiNose02"])
+            icon = icons["MiiNose01"]
+            with open(os.path.join(output_dir, icon['file']), 'rb') as f:
+                width, _, pixels = decode_png(f.read())
+            center = ((icon['y'] + 8) * width + icon['x'] + 8) * 4
+            self.assertEqual(pixels[center:center + 4], b'\x00\x00\xff\xff') # Inside the blue circle
+
+
+# --- Geometry Deduplication ---
+class SharedGeometryTests(unittest.TestCase):
+    OTHER_OUTLINE = "M2 2 " + " ".join(f"L{2 + (index * 5) % 17} {2 + index * .5}" for index in range(48)) + " Z"
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.output_dir = os.path.join(self.root, "out")
+        self.shared_path = os.path.join(self.output_dir, converter.SHARED_GEOMETRY_FILE_NAME)
+        # A and B share SHARED_OUTLINE, A and C share OTHER_OUTLINE
+        self.folders = {name: write_sample_folder(self.root, name, {
+            f"{name}{index}.svg": f'<svg xmlns="http://www.w3.org/2000/svg"><path d="{outline}" fill="#ff0000"/></svg>'
+            for index, outline in enumerate(outlines)})
+            for name, outlines in (("A", [SHARED_OUTLINE, self.OTHER_OUTLINE]), ("B", [SHARED_OUTLINE]),
+                                   ("C", [self.OTHER_OUTLINE]))}
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_dedup(self, names, **batch_options):
+        success, output = run_quiet_batch([self.folders[name] for name in names], self.output_dir,
+                                          cache_dir=os.path.join(self.output_dir, "cache"),
+                                          output_options=dict(converter.DEFAULT_OUTPUT_OPTIONS, dedup_geometry=True),
+                                          **batch_options)
+        self.assertTrue(success, output)
+        return output
+
+    def shared_keys(self):
+        return set(converter.read_generated_dictionary(self.shared_path)[1])
+
+    def test_missing_shared_dictionary_is_rebuilt(self):
+        self.run_dedup("ABC")
+        self.assertIn("Up to date", self.run_dedup("ABC"))
+        os.remove(self.shared_path)
+        output = self.run_dedup("ABC")
+        self.assertNotIn("Up to date", output)
+        self.assertEqual(len(self.shared_keys()), 2)
+
+    def test_other_runs_keep_the_geometries_they_reference(self):
+        self.run_dedup("ABC")
+        self.run_dedup("AB")
+        # OTHER_OUTLINE is only used by A in this run, but C.axaml of the first run still references it
+        with open(os.path.join(self.output_dir, "C.axaml"), encoding='utf-8') as f:
+            references = set(re.findall(r'\{StaticResource (SharedGeometry_\w+)\}', f.read()))
+        self.assertEqual(len(references), 1)
+        self.assertLessEqual(references, self.shared_keys())
+        self.assertEqual(len(self.shared_keys()), 2)
+
+    def test_folders_with_the_same_name_own_their_geometries(self):
+        def entries(outline):
+            return [(f"Icon{index}", [fill_drawing(outline)], None) for index in range(2)]
+        plan = converter.plan_geometry_dedup([("a/MiiNose", "MiiNose", entries(SHARED_OUTLINE)),
+                                              ("b/MiiNose", "MiiNose", entries(self.OTHER_OUTLINE))])
+        self.assertEqual(sorted(plan['resources']), ["a/MiiNose", "b/MiiNose"])
+        self.assertEqual(list(plan['keys']["a/MiiNose"]), [SHARED_OUTLINE])
+        self.assertEqual(list(plan['keys']["b/MiiNose"]), [self.OTHER_OUTLINE])
+
+    def test_no_shared_dictionary_without_shared_geometry(self):
+        self.run_dedup("BC")
+        self.assertFalse(os.path.exists(self.shared_path))
+
+
+# --- Output Assembly ---
+class ShardManifestTests(unittest.TestCase):
+    SHARDS = [("MiiNose_00.axaml", ["MiiNose00", "MiiNose01"]), ("MiiNose_01.axaml", ["MiiNose02"])]
+    GEOMETRY_FILES = [("MiiNose_Geometry.axaml", ["MiiNoseGeometry_1"]), ("SharedGeometry.axaml", ["SharedGeometry_2"])]
+
+    def test_csv_tells_geometry_and_icon_keys_apart(self):
+        manifest = converter.build_shard_manifest("MiiNose", 2, self.SHARDS, 'csv', self.GEOMETRY_FILES)
+        self.assertEqual(manifest.splitlines(), [
+            "key,shard,type",
+            "MiiNoseGeometry_1,MiiNose_Geometry.axaml,geometry",
+            "SharedGeometry_2,SharedGeometry.axaml,geometry",
+            "MiiNose00,MiiNose_00.axaml,icon",
+            "MiiNose01,MiiNose_00.axaml,icon",
+            "MiiNose02,MiiNose_01.axaml,icon",
+        ])
+
+    def test_json_keeps_geometry_keys_out_of_the_icon_keys(self):
+        manifest = json.loads(converter.build_shard_manifest("MiiNose", 2, self.SHARDS, 'json', self.GEOMETRY_FILES))
+        self.assertEqual(manifest['keys'], {"MiiNose00": "MiiNose_00.axaml", "MiiNose01": "MiiNose_00.axaml",
+                                            "MiiNose02": "MiiNose_01.axaml"})
+        self.assertEqual(manifest['geometry'], {"MiiNoseGeometry_1": "MiiNose_Geometry.axaml",
+                                                "SharedGeometry_2": "SharedGeometry.axaml"})
+        self.assertEqual(manifest['geometry_files'], ["MiiNose_Geometry.axaml", "SharedGeometry.axaml"])
+
+
+# --- Batch Mode ---
+class RebuildCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.folder = write_sample_folder(self.root)
+        self.output_dir = os.path.join(self.root, "out")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def build(self, **batch_options):
+        success, output = run_quiet_batch([self.folder], self.output_dir, cache_dir=os.path.join(self.root, "cache"),
+                                          **batch_options)
+        self.assertTrue(success, output)
+        return output
+
+    def test_unchanged_folders_are_skipped(self):
+        self.build()
+        self.assertIn(f"Up to date: {self.folder}", self.build())
+
+    def test_changed_svgs_are_converted_again(self):
+        self.build()
+        with open(os.path.join(self.folder, "MiiNose01.svg"), 'w', encoding='utf-8') as f:
+            f.write('<svg xmlns="http://www.w3.org/2000/svg"><rect width="4" height="4" fill="#ff0000"/></svg>')
+        self.assertIn("Reused 2 cached fragments, generated 1.", self.build())
+
+    def test_changed_options_convert_everything_again(self):
+        self.build()
+        output = self.build(options=dict(converter.DEFAULT_OPTIONS, minify_paths=True))
+        self.assertIn("Reused 0 cached fragments, generated 3.", output)
+
+    def test_changed_color_profiles_convert_everything_again(self):
+        self.build()
+        with mock.patch.dict(SAMPLE_COLOR_PROFILE, {"#0000ff": 3}):
+            output = self.build()
+        self.assertIn("Reused 0 cached fragments, generated 3.", output)
+
+    def test_folders_with_the_same_name_keep_separate_caches(self):
+        folders = [write_sample_folder(os.path.join(self.root, parent)) for parent in ("a", "b")]
+        with open(os.path.join(folders[1], "MiiNose01.svg"), 'w', encoding='utf-8') as f:
+            f.write('<svg xmlns="http://www.w3.org/2000/svg"><rect width="4" height="4" fill="#ff0000"/></svg>')
+        profile_path = os.path.join(self.root, "profile.json")
+        with open(profile_path, 'w', encoding='utf-8') as f:
+            json.dump(SAMPLE_COLOR_PROFILE, f)
+        for _ in range(2):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                success = converter.run_batch(folders, color_profile=profile_path, jobs=1, prompt=False,
+                                              cache_dir=os.path.join(self.root, "cache"))
+            self.assertTrue(success, output.getvalue())
+        for folder in folders:
+            self.assertIn(f"Up to date: {folder}", output.getvalue())
+
+
+class BatchDeterminismTests(unittest.TestCase):
+    def test_output_does_not_depend_on_the_number_of_jobs(self):
+        output_options = dict(converter.DEFAULT_OUTPUT_OPTIONS, pack=True, shard_size=2, dedup_geometry=True,
+                              slot_index=True)
+        with tempfile.TemporaryDirectory() as root:
+            folders = [write_sample_folder(os.path.join(root, "svgs"), name) for name in ("MiiNose", "MiiMouth", "MiiEye")]
+            outputs = []
+            for jobs in (1, 3):
+                output_dir = os.path.join(root, f"jobs{jobs}")
+                success, output = run_quiet_batch(folders, output_dir, jobs=jobs, output_options=output_options)
+                self.assertTrue(success, output)
+                files = {}
+                for filename in sorted(os.listdir(output_dir)):
+                    with open(os.path.join(output_dir, filename), 'rb') as f:
+                        files[filename] = f.read()
+                outputs.append(files)
+            self.assertEqual(outputs[0], outputs[1])
+
+
+# --- Watch Mode ---
+@mock.patch.multiple(converter, WATCH_POLL_INTERVAL=0.01, WATCH_DEBOUNCE_SECONDS=0.05)
+class WatchModeTests(unittest.TestCase):
+    def test_polling_sees_saves_made_after_the_snapshot(self):
+        with tempfile.TemporaryDirectory() as root:
+            folder = write_sample_folder(root)
+            snapshot = converter.snapshot_svg_folders([folder]) # Taken before the build
+            # A save while the build runs
+            os.utime(os.path.join(folder, "MiiNose00.svg"), ns=(0, 0))
+            settled = converter.wait_for_svg_changes([folder], snapshot=snapshot)
+            self.assertEqual(settled, converter.snapshot_svg_folders([folder]))
+
+    def test_events_during_the_debounce_trigger_another_rebuild(self):
+        handler = converter._SvgChangeHandler(threading.Event())
+        event = mock.Mock(is_directory=False, src_path="MiiNose00.svg", dest_path="")
+        handler.dispatch(event)
+        late_event = threading.Timer(0.02, handler.dispatch, [event])
+        late_event.start()
+        start = time.monotonic()
+        converter.wait_for_svg_changes([], handler)
+        late_event.join()
+        self.assertGreaterEqual(time.monotonic() - start, converter.WATCH_DEBOUNCE_SECONDS)
+        self.assertTrue(handler.changed.is_set())
+
+
+
+# --- Template Color Slot Index ---
+class SlotIndexTests(unittest.TestCase):
+    SVGS = dict(SAMPLE_SVGS, **{
+        # Two separate red squares (merged by --merge-drawings) under a green outline
+        "MiiNose03.svg": '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 32 32">'
+                         '<rect width="4" height="4" fill="#ff0000"/><rect x="10" width="4" height="4" fill="#ff0000"/>'
+                         '<line x1="0" y1="20" x2="30" y2="20" stroke="#00ff00" stroke-width="2"/></svg>'})
+
+    def build_slot_index(self, **options):
+        """Converts SVGS with --slot-index, returning (slot index, {key: drawings read back from the dictionary})."""
+        with tempfile.TemporaryDirectory() as root:
+            folder = write_sample_folder(root, "MiiNose", self.SVGS)
+            output_dir = os.path.join(root, "out")
+            success, output = run_quiet_batch(
+                [folder], output_dir, options=dict(converter.DEFAULT_OPTIONS, **options),
+                output_options=dict(converter.DEFAULT_OUTPUT_OPTIONS, slot_index=True))
+            self.assertTrue(success, output)
+            with open(os.path.join(output_dir, "MiiNose.slots.json"), encoding='utf-8') as f:
+                index = json.load(f)
+            images = converter.read_generated_dictionary(os.path.join(output_dir, "MiiNose.axaml"))[2]
+        return index, images
+
+    def assert_slots_match_dictionary(self, index, images):
+        self.assertEqual(list(index['icons']), list(images))
+        for key, drawings in images.items():
+            expected = [[converter.template_slot(drawing['brush']), converter.template_slot(drawing['pen_brush'])]
+                        for drawing in drawings]
+            self.assertEqual(index['icons'][key]['drawings'], expected, key)
+
+    def test_fill_and_pen_slots_of_every_drawing(self):
+        index, images = self.build_slot_index()
+        self.assert_slots_match_dictionary(index, images)
+        self.assertEqual(index['folder'], "MiiNose")
+        self.assertEqual(index['icons']["MiiNose00"], {'drawings': [[1, 0], [0, 2]], 'slots': [1, 2]})
+        self.assertEqual(index['icons']["MiiNose01"], {'drawings': [[0, 0], [1, 0]], 'slots': [1]})
+        self.assertEqual(index['icons']["MiiNose02"], {'drawings': [[0, 0]], 'slots': []})
+        self.assertEqual(index['icons']["MiiNose03"]['drawings'], [[1, 0], [1, 0], [0, 2]])
+
+    def test_merged_drawings_keep_one_slot_pair(self):
+        index, images = self.build_slot_index(merge_drawings=True)
+        self.assert_slots_match_dictionary(index, images)
+        self.assertEqual(index['icons']["MiiNose03"], {'drawings': [[1, 0], [0, 2]], 'slots': [1, 2]})
+
+
+# --- Profile Report ---
+class ProfileReportTests(unittest.TestCase):
+    def run_profiled(self, report_name):
+        """Profiles a batch of two sample folders, returning (report text, {key: DrawingImage fragment})."""
+        with tempfile.TemporaryDirectory() as root:
+            folders = [write_sample_folder(os.path.join(root, "svgs"), name) for name in ("MiiNose", "MiiEye")]
+            report_path = os.path.join(root, report_name)
+            success, output = run_quiet_batch(folders, os.path.join(root, "out"), profile_report=report_path)
+            self.assertTrue(success, output)
+            fragments = {}
+            for name in ("MiiNose", "MiiEye"):
+                with open(os.path.join(root, "out", f"{name}.axaml"), encoding='utf-8') as f:
+                    fragments.update(drawing_image_fragments(f.read()))
+            with open(report_path, encoding='utf-8') as f:
+                return f.read(), fragments
+
+    def test_json_report_breaks_costs_down_by_stage_icon_and_folder(self):
+        text, fragments = self.run_profiled("profile.json")
+        report = json.loads(text)
+        self.assertEqual(list(report['stages']), ["parse", "color_mapping", "generate", "write"])
+        self.assertTrue(all(seconds >= 0 for seconds in report['stages'].values()))
+
+        icons = {record['key']: record for record in report['icons']}
+        self.assertEqual(set(icons), set(fragments))
+        for key, record in icons.items():
+            self.assertEqual(record['output_bytes'], len(fragments[key].encode('utf-8')))
+            self.assertAlmostEqual(record['total_seconds'],
+                                   record['parse_seconds'] + record['normalize_seconds'] + record['emit_seconds'])
+        self.assertEqual((icons["MiiNose00"]['paths'], icons["MiiNose00"]['drawings']), (2, 2))
+        self.assertEqual(icons["MiiNose01"]['template_brushes'], 1) # The circle keeps its own color
+
+        self.assertEqual([(folder['folder'], folder['icons']) for folder in report['folders']],
+                         [("MiiNose", 3), ("MiiEye", 3)])
+        for field in ('output_bytes', 'commands', 'paths'):
+            self.assertEqual(sum(folder[field] for folder in report['folders']), report['totals'][field])
+        sizes = [record['output_bytes'] for record in report['heaviest']]
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+
+    def test_html_report_lists_stages_folders_and_icons(self):
+        text, fragments = self.run_profiled("profile.html")
+        self.assertTrue(text.startswith("<!DOCTYPE html>"))
+        for heading in ("<h2>Stages</h2>", "<h2>Folders</h2>", "<h2>Heaviest icons", "<h2>Slowest icons"):
+            self.assertIn(heading, text)
+        self.assertIn("<tr><td>generate</td>", text)
+        self.assertIn("<td>MiiEye</td><td>3</td>", text)
+        for key in fragments:
+            self.assertIn(f"<td>{key}</td>", text)
+
+
+# --- Output Validation ---
+class VerifyTests(unittest.TestCase):
+    def run_verified(self, tamper=None):
+        """Runs a --verify batch of the sample folder, tamper(text) edits the dictionary before it is verified."""
+        write_folder_outputs = converter.write_folder_outputs
+
+        def write_and_tamper(job, *args):
+            written_paths = write_folder_outputs(job, *args)
+            if tamper:
+                with open(job['output_path'], encoding='utf-8') as f:
+                    text = tamper(f.read())
+                with open(job['output_path'], 'w', encoding='utf-8') as f:
+                    f.write(text)
+            return written_paths
+
+        with tempfile.TemporaryDirectory() as root:
+            folder = write_sample_folder(root)
+            with mock.patch.object(converter, 'write_folder_outputs', write_and_tamper):
+                return run_quiet_batch([folder], root, verify=True)
+
+    def assert_verify_fails(self, tamper, message):
+        success, output = self.run_verified(tamper)
+        self.assertFalse(success, output)
+        self.assertIn(message, output)
+
+    def test_correct_batch_passes(self):
+        success, output = self.run_verified()
+        self.assertTrue(success, output)
+        self.assertIn("Verified 3 icons in 1 folders", output)
+
+    def test_duplicated_keys_fail(self):
+        def duplicate(text):
+            return text.replace("</ResourceDictionary>", drawing_image_fragments(text)["MiiNose02"] + "\n</ResourceDictionary>")
+        self.assert_verify_fails(duplicate, "x:Key 'MiiNose02' is defined more than once")
+
+    def test_undefined_template_colors_fail(self):
+        self.assert_verify_fails(lambda text: text.replace("TemplateColor2}", "TemplateColor13}"),
+                                 "TemplateColor13 is not defined in MultiIcons.axaml")
+
+    def test_dangling_geometry_references_fail(self):
+        self.assert_verify_fails(lambda text: text.replace('Geometry="M6 7h8v6H6Z"', 'Geometry="{StaticResource MissingGeometry}"'),
+                                 "icon 'MiiNose01' references unknown geometry 'MissingGeometry'")
+
+    def test_altered_drawings_fail(self):
+        self.assert_verify_fails(lambda text: text.replace("M6 7h8v6H6Z", "M6 7h8v12H6Z"),
+                                 "icon 'MiiNose01' differs from the plain conversion of MiiNose01.svg")
+
+    def test_raster_comparison_counts_differing_pixels(self):
+        transparent = bytes(4 * 4)
+        opaque_red = bytes([255, 0, 0, 255])
+        self.assertEqual(converter.compare_rasters(transparent, transparent), 0)
+        self.assertEqual(converter.compare_rasters(transparent, opaque_red + bytes(12)), 0.25)
+        # Colors of fully transparent pixels do not matter, only what is drawn
+        self.assertEqual(converter.compare_rasters(transparent, bytes([255, 255, 255, 0]) * 4), 0)
+
+if __name__ == '__main__':
+    unittest.main()